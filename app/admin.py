@@ -35,4 +35,57 @@ class AccountAdmin(BaseUserAdmin):
     def get_readonly_fields(self, request, obj=None):
         return ['username','email','date_joined']
     
-admin.site.register(models.Account, AccountAdmin)
\ No newline at end of file
+admin.site.register(models.Account, AccountAdmin)
+
+
+class ObjectMappingAdmin(admin.ModelAdmin):
+    list_display = ('portal', 'object_type', 'external_id', 'object_id', 'updated')
+    search_fields = ('external_id', 'object_id')
+    list_filter = ['portal', 'object_type']
+
+admin.site.register(models.ObjectMapping, ObjectMappingAdmin)
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'state', 'stage', 'processed', 'created', 'finished')
+    list_filter = ['kind', 'state']
+
+    def get_readonly_fields(self, request, obj=None):
+        return ['kind', 'processed', 'errors', 'result', 'worker', 'created', 'scheduled', 'started', 'finished', 'heartbeat']
+
+admin.site.register(models.Job, JobAdmin)
+
+
+class MetricSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('process', 'updated')
+
+    def get_readonly_fields(self, request, obj=None):
+        return ['process', 'data', 'updated']
+
+admin.site.register(models.MetricSnapshot, MetricSnapshotAdmin)
+
+
+class MigrationLedgerAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'state', 'runs', 'batches', 'records', 'skipped', 'failed', 'updated')
+
+    def get_readonly_fields(self, request, obj=None):
+        return ['runs', 'batches', 'records', 'skipped', 'failed', 'started', 'updated', 'finished']
+
+admin.site.register(models.MigrationLedger, MigrationLedgerAdmin)
+
+
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('object_type', 'external_id', 'received', 'claimed', 'attempts')
+    list_filter = ['object_type']
+    search_fields = ('external_id',)
+
+    def get_readonly_fields(self, request, obj=None):
+        return ['object_type', 'external_id', 'properties', 'occurred', 'received', 'claimed', 'claimed_at', 'attempts']
+
+admin.site.register(models.WebhookEvent, WebhookEventAdmin)
+
+
+class LockAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'expires')
+
+admin.site.register(models.Lock, LockAdmin)
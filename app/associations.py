@@ -0,0 +1,181 @@
+def _object_key(object_id):
+    """
+    Sort key for HubSpot object ids, numeric ids compare as numbers.
+
+    :param object_id: HubSpot object id.
+    :type object_id: str or int
+    :return: Key usable to order object ids deterministically.
+    :rtype: tuple
+    """
+    text = str(object_id)
+    return (0, int(text), text) if text.isdigit() else (1, 0, text)
+
+
+def _location_key(location_id):
+    """
+    Normalizes a location_id property so '12', 12 and ' 12 ' index the same company.
+
+    :param location_id: Raw location_id property from HubSpot.
+    :type location_id: str or int or None
+    :return: Normalized location key, None when the value is missing.
+    :rtype: str or None
+    """
+    if location_id is None:
+        return None
+    key = str(location_id).strip()
+    return key or None
+
+
+def index_companies(companies):
+    """
+    Indexes companies by location_id.
+
+    Records without a location_id are ignored. When several companies share the same
+    location_id the one with the lowest object id wins, regardless of the page order.
+
+    :param companies: Iterable of (company_id, location_id) pairs.
+    :type companies: iterable
+    :return: Dictionary mapping location_id to company id.
+    :rtype: dict
+    """
+    index = {}
+    for company_id, location_id in companies:
+        key = _location_key(location_id)
+        if key is None:
+            continue
+        current = index.get(key)
+        if current is None or _object_key(company_id) < _object_key(current):
+            index[key] = company_id
+    return index
+
+
+def join_associations(contacts, companies):
+    """
+    Matches contacts to companies on location_id in linear time.
+
+    :param contacts: Iterable of (contact_id, location_id) pairs.
+    :type contacts: iterable
+    :param companies: Iterable of (company_id, location_id) pairs.
+    :type companies: iterable
+    :return: List of (contact_id, company_id) pairs, one per matched contact.
+    :rtype: list
+    """
+    index = index_companies(companies)
+    pairs = {}
+    for contact_id, location_id in contacts:
+        key = _location_key(location_id)
+        if key is None or key not in index:
+            continue
+        pairs[contact_id] = index[key]
+    return list(pairs.items())
+
+
+def sort_rows(pairs):
+    """
+    Transforms (object_id, location_id) pairs into rows that sort like the company index:
+    by normalized location_id and then by object id.
+
+    :param pairs: Iterable of (object_id, location_id) pairs.
+    :type pairs: iterable
+    :return: Generator of (location_key, kind, number, object_id) rows, location_key None when missing.
+    :rtype: generator
+    """
+    for object_id, location_id in pairs:
+        kind, number, text = _object_key(object_id)
+        yield _location_key(location_id), kind, number, text
+
+
+def merge_join(contacts, companies):
+    """
+    Matches contacts to companies on location_id like join_associations, from two
+    streams sorted by location, holding a single company at a time.
+
+    :param contacts: Iterable of (location_key, contact_id) pairs sorted by location key,
+        the contacts without location (None) first.
+    :type contacts: iterable
+    :param companies: Iterable of (location_key, company_id) pairs sorted by location key
+        and then by object id, without the companies lacking a location.
+    :type companies: iterable
+    :return: Generator of (contact_id, company_id) pairs, company_id None for the contacts without a company.
+    :rtype: generator
+    """
+    companies = iter(companies)
+    current = next(companies, None)
+    for location, contact_id in contacts:
+        if location is None:
+            yield contact_id, None
+            continue
+        while current is not None and current[0] < location:
+            current = next(companies, None)
+        yield contact_id, (current[1] if current is not None and current[0] == location else None)
+
+
+def association_inputs(pairs):
+    """
+    Transforms (contact_id, company_id) pairs into HubSpot default association inputs.
+
+    :param pairs: Iterable of (contact_id, company_id) pairs.
+    :type pairs: iterable
+    :return: List of association inputs.
+    :rtype: list
+    """
+    return [{"from": {"id": contact_id}, "to": {"id": company_id}} for contact_id, company_id in pairs]
+
+
+def located_companies(companies):
+    """
+    Returns the ids of the companies that have a location_id.
+
+    :param companies: Iterable of (company_id, location_id) pairs.
+    :type companies: iterable
+    :rtype: set
+    """
+    return {str(company_id) for company_id, location_id in companies if _location_key(location_id) is not None}
+
+
+def diff_associations(pairs, existing, located):
+    """
+    Compares the desired (contact_id, company_id) pairs with the associations in HubSpot.
+
+    Only associations with companies that have a location_id are considered stale, the
+    ones with any other company were not made by the migration and are kept. Contacts
+    whose associations could not be read are missing from `existing`: their desired pair
+    is created again and nothing is archived for them.
+
+    :param pairs: Desired (contact_id, company_id) pairs, see join_associations.
+    :type pairs: iterable
+    :param existing: Dictionary mapping contact id to the set of company ids it is associated with.
+    :type existing: dict
+    :param located: Ids of the companies that have a location_id, see located_companies.
+    :type located: set
+    :return: Pairs to create and (contact_id, company_id) pairs to archive.
+    :rtype: tuple of (list, list)
+    """
+    desired = {str(contact_id): str(company_id) for contact_id, company_id in pairs}
+
+    missing = [
+        (contact_id, company_id) for contact_id, company_id in desired.items()
+        if company_id not in existing.get(contact_id, ())
+    ]
+    stale = [
+        (contact_id, company_id)
+        for contact_id, associated in existing.items()
+        for company_id in sorted(associated, key=_object_key)
+        if company_id in located and company_id != desired.get(contact_id)
+    ]
+    return missing, stale
+
+
+def archive_inputs(pairs):
+    """
+    Transforms (contact_id, company_id) pairs into HubSpot association archive inputs, one per contact.
+
+    :param pairs: Iterable of (contact_id, company_id) pairs.
+    :type pairs: iterable
+    :return: List of archive inputs.
+    :rtype: list
+    """
+    companies = {}
+    for contact_id, company_id in pairs:
+        companies.setdefault(contact_id, []).append({"id": company_id})
+    return [{"from": {"id": contact_id}, "to": to} for contact_id, to in companies.items()]
@@ -0,0 +1,135 @@
+import asyncio, json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.views import View
+
+from app.views import requestRM, CONTACT_PROPERTIES, COMPANY_PROPERTIES
+from app.jobs import enqueue, schedule
+
+# The HubSpot SDK and the ORM are blocking, their calls run on this pool while the event loop keeps serving requests.
+executor = ThreadPoolExecutor(max_workers=settings.ASYNC_IO_WORKERS, thread_name_prefix='async-io')
+
+
+def call(function, *args, **kwargs):
+    """
+    Runs a blocking call on a thread of the I/O pool, closing its database connection
+    around the call when broken or older than CONN_MAX_AGE, as Django does around a request.
+    """
+    close_old_connections()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run(function, *args, **kwargs):
+    """
+    Runs a blocking call on the I/O pool without blocking the event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(call, function, *args, **kwargs))
+
+
+class queueJob(View):
+    """
+    Async view queuing a background migration job, see app.jobs.
+
+    Attributes:
+    - kind: Kind of job queued by the view.
+    - debounced: Fold the requests into the job still queued, see app.jobs.schedule.
+    """
+    kind = None
+    debounced = False
+
+    async def post(self, request, *args, **kwargs):
+        if self.debounced:
+            job = await run(schedule, self.kind, settings.ASSOCIATIONS_DEBOUNCE, settings.ASSOCIATIONS_MAX_DELAY)
+        else:
+            job = await run(enqueue, self.kind)
+        return JsonResponse({'succes': 'The {} job has been queued.'.format(self.kind), 'job': job.id, 'scheduled': job.scheduled}, status=202)
+
+
+class requestContactsAsync(queueJob):
+    kind = 'contacts'
+
+
+class requestCompaniesAsync(queueJob):
+    kind = 'companies'
+
+
+class sourceHubspotAssociationsAsync(queueJob):
+    kind = 'associations-source'
+    debounced = True
+
+
+class mirrorHubspotAssociationsAsync(queueJob):
+    kind = 'associations-mirror'
+    debounced = True
+
+
+class mirrorHubspotAsync(View):
+    """
+    Async view mirroring a HubSpot record into the mirror portal, see requestRM.mirrorPayload.
+
+    The mirror runs on the I/O pool so a slow HubSpot call never blocks other webhooks;
+    a list payload is mirrored in bulk, see requestRM.mirrorBulk.
+
+    Attributes:
+    - object_type: 'contacts' or 'companies'.
+    """
+    object_type = None
+
+    async def post(self, request, *args, **kwargs):
+        view = requestRM()
+        response = view.checkSecret(request)
+        if response is None:
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                return JsonResponse({'error': 'Invalid JSON payload.'}, status=400)
+            response = await run(view.mirrorPayload, self.object_type, data, type(self).__name__)
+        return JsonResponse(response.data, status=response.status_code)
+
+
+class mirrorHubspotContactsAsync(mirrorHubspotAsync):
+    object_type = 'contacts'
+
+
+class mirrorHubspotCompaniesAsync(mirrorHubspotAsync):
+    object_type = 'companies'
+
+
+class ingestHubspotEventsAsync(View):
+    """
+    Async view queuing HubSpot webhook events, see requestRM.ingestEvents.
+
+    Attributes:
+    - object_type: 'contacts' or 'companies'.
+    - fields: Properties copied from each event.
+    """
+    object_type = None
+    fields = []
+
+    async def post(self, request, *args, **kwargs):
+        view = requestRM()
+        response = view.checkSecret(request)
+        if response is None:
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                return JsonResponse({'error': 'Invalid JSON payload.'}, status=400)
+            response = await run(view.ingestEvents, self.object_type, data, self.fields, type(self).__name__)
+        return JsonResponse(response.data, status=response.status_code)
+
+
+class ingestHubspotContactsAsync(ingestHubspotEventsAsync):
+    object_type = 'contacts'
+    fields = CONTACT_PROPERTIES
+
+
+class ingestHubspotCompaniesAsync(ingestHubspotEventsAsync):
+    object_type = 'companies'
+    fields = COMPANY_PROPERTIES
@@ -0,0 +1,183 @@
+import json, sqlite3, threading, time
+import ramapi
+
+from django.conf import settings
+
+from app.metrics import metrics
+
+
+class RamCache:
+    """
+    Persistent key/value cache backed by a local SQLite file.
+
+    Entries expire after `ttl` seconds and the least recently used ones are evicted once
+    the cache holds more than `max_entries`. Hit, miss and eviction counters are kept per
+    process.
+
+    :param path: Path of the SQLite file.
+    :type path: str
+    :param ttl: Seconds an entry stays valid, 0 disables the cache.
+    :type ttl: int
+    :param max_entries: Maximum number of entries kept.
+    :type max_entries: int
+    """
+    def __init__(self, path, ttl=86400, max_entries=10000):
+        self.path = str(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+        with self.lock, self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, key):
+        """
+        Returns the cached value of a key, or None when it is missing or expired.
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self.lock, self._connect() as db:
+            row = db.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """
+        Stores a JSON serializable value and evicts the least recently used entries over the limit.
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        with self.lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl, now)
+            )
+            excess = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                db.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                    (excess,)
+                )
+                self.evictions += excess
+
+    def invalidate(self, prefix=''):
+        """
+        Removes every entry whose key starts with `prefix`, everything by default.
+
+        :return: Number of removed entries.
+        :rtype: int
+        """
+        with self.lock, self._connect() as db:
+            cursor = db.execute("DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+            return cursor.rowcount
+
+    def stats(self):
+        with self.lock, self._connect() as db:
+            entries = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+_cache, _cache_lock = None, threading.Lock()
+
+def get_cache():
+    """
+    Returns the process-wide RAM API cache configured from settings.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RamCache(
+                settings.RAMAPI_CACHE_PATH,
+                ttl=settings.RAMAPI_CACHE_TTL,
+                max_entries=settings.RAMAPI_CACHE_MAX_ENTRIES
+            )
+        return _cache
+
+
+def _upstream(endpoint, call, *args):
+    """
+    Calls the RAM API past the cache, recording its latency and outcome.
+    """
+    status = 'error'
+    try:
+        with metrics.timer('ramapi_request_seconds', endpoint=endpoint):
+            data = call(*args)
+        status = 'ok' if data and 'error' not in data else 'error'
+        return data
+    finally:
+        metrics.inc('ramapi_requests_total', endpoint=endpoint, status=status)
+
+
+def get_character_page(page):
+    """
+    Cached version of ramapi.Character.get_page, error payloads are never cached.
+
+    :param page: Page number.
+    :type page: int
+    :return: Page payload with 'info' and 'results'.
+    :rtype: dict
+    """
+    with metrics.stage('ram_fetch'):
+        cache, key = get_cache(), 'character:page:{}'.format(page)
+        data = cache.get(key)
+        if data is None:
+            data = _upstream('character', ramapi.Character.get_page, page)
+            if 'results' in data:
+                cache.set(key, data)
+        return data
+
+
+def get_locations(ids):
+    """
+    Cached version of ramapi.Location.get for a list of ids.
+
+    Only the ids missing from the cache are requested upstream, in a single call.
+
+    :param ids: Location ids.
+    :type ids: list
+    :return: List of locations, in the order of `ids`.
+    :rtype: list
+    """
+    with metrics.stage('ram_fetch'):
+        cache, found, missing = get_cache(), {}, []
+        for location_id in ids:
+            data = cache.get('location:{}'.format(location_id))
+            if data is None:
+                missing.append(location_id)
+            else:
+                found[location_id] = data
+
+        if missing:
+            data = _upstream('location', ramapi.Location.get, missing)
+            for location in (data if isinstance(data, list) else [data]):
+                if 'id' in location:
+                    cache.set('location:{}'.format(location['id']), location)
+                    found[location['id']] = location
+
+        return [found[location_id] for location_id in ids if location_id in found]
@@ -0,0 +1,159 @@
+import threading, time
+from collections import OrderedDict
+
+import hubspot
+import pkg_resources
+
+from django.conf import settings
+
+from app.metrics import metrics
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of HubSpot clients keyed by access token.
+
+    The clients share one keep-alive urllib3 pool per token across every API package
+    (contacts, companies, associations...), and the generated API objects are built
+    once and reused. The registry is safe to share between threads; the least recently
+    used token is dropped once more than `max_tokens` are registered, so clients are
+    rebuilt after a token rotation without leaking pools.
+
+    :param pool_maxsize: Connections kept alive per host and token.
+    :type pool_maxsize: int
+    :param max_tokens: Maximum number of tokens kept in the registry.
+    :type max_tokens: int
+    :param host: Base url of the HubSpot API, None for the public one.
+    :type host: str or None
+    """
+    def __init__(self, pool_maxsize=10, max_tokens=4, host=None):
+        self.pool_maxsize = pool_maxsize
+        self.max_tokens = max_tokens
+        self.host = host
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.user_agent = "hubspot-api-client-python; {0}".format(pkg_resources.require("hubspot-api-client")[0].version)
+
+    def get(self, access_token):
+        """
+        Returns the shared client of an access token, building it on first use.
+
+        :param access_token: HubSpot access token.
+        :type access_token: str
+        :return: HubSpot client.
+        :rtype: hubspot.Client
+        """
+        with self.lock:
+            entry = self.entries.get(access_token)
+            if entry is None:
+                entry = {'apis': {}, 'pool_manager': None}
+                entry['client'] = hubspot.Client.create(access_token=access_token, api_factory=self._factory(access_token, entry))
+                self.entries[access_token] = entry
+                while len(self.entries) > self.max_tokens:
+                    self._close(self.entries.popitem(last=False)[1])
+            self.entries.move_to_end(access_token)
+            return entry['client']
+
+    def _factory(self, access_token, entry):
+        def api_factory(api_client_package, api_name, config):
+            key = (api_client_package.__name__, api_name)
+            with self.lock:
+                api = entry['apis'].get(key)
+                if api is None:
+                    configuration = api_client_package.Configuration()
+                    configuration.access_token = access_token
+                    configuration.connection_pool_maxsize = self.pool_maxsize
+                    if self.host:
+                        configuration.host = self.host
+                    if config.get("retry"):
+                        configuration.retries = config["retry"]
+                    api_client = api_client_package.ApiClient(configuration=configuration)
+                    api_client.user_agent = self.user_agent
+                    self._instrument(api_client, '...{}'.format(str(access_token)[-4:]))
+                    if entry['pool_manager'] is None:
+                        entry['pool_manager'] = api_client.rest_client.pool_manager
+                    else:
+                        api_client.rest_client.pool_manager = entry['pool_manager']
+                    api = entry['apis'][key] = getattr(api_client_package, api_name)(api_client=api_client)
+                return api
+        return api_factory
+
+    @staticmethod
+    def _instrument(api_client, token):
+        """
+        Records the latency, status and 429 answers of every call of an API client.
+        """
+        call_api = api_client.call_api
+
+        def timed(resource_path, method, *args, **kwargs):
+            start, status = time.perf_counter(), 'ok'
+            try:
+                return call_api(resource_path, method, *args, **kwargs)
+            except Exception as e:
+                status = getattr(e, 'status', None) or 'error'
+                if status == 429:
+                    metrics.inc('hubspot_rate_limited_total', token=token)
+                raise
+            finally:
+                labels = dict(endpoint=resource_path, method=method, token=token)
+                metrics.observe('hubspot_request_seconds', time.perf_counter() - start, **labels)
+                metrics.inc('hubspot_requests_total', status=status, **labels)
+
+        api_client.call_api = timed
+
+    @staticmethod
+    def _close(entry):
+        if entry['pool_manager'] is not None:
+            entry['pool_manager'].clear()
+
+    def invalidate(self, access_token=None):
+        """
+        Drops the client of a token, or every client, closing their pools.
+
+        :param access_token: HubSpot access token, None drops every client.
+        :type access_token: str or None
+        """
+        with self.lock:
+            tokens = list(self.entries) if access_token is None else [access_token]
+            for token in tokens:
+                entry = self.entries.pop(token, None)
+                if entry is not None:
+                    self._close(entry)
+
+    def stats(self):
+        """
+        Returns the connection pools of every registered token.
+
+        Tokens are masked to their last four characters.
+
+        :return: List of dictionaries with the pools per token.
+        :rtype: list
+        """
+        data = []
+        with self.lock:
+            for token, entry in self.entries.items():
+                pools = []
+                if entry['pool_manager'] is not None:
+                    for key, pool in list(entry['pool_manager'].pools._container.items()):
+                        pools.append({
+                            'host': '{}://{}:{}'.format(pool.scheme, pool.host, pool.port),
+                            'maxsize': pool.pool.maxsize,
+                            'available': pool.pool.qsize(),
+                            'connections': pool.num_connections,
+                            'requests': pool.num_requests,
+                        })
+                data.append({
+                    'token': '...{}'.format(str(token)[-4:]),
+                    'apis': len(entry['apis']),
+                    'pools': pools,
+                })
+        return data
+
+
+registry = ClientRegistry(pool_maxsize=settings.HUBSPOT_POOL_MAXSIZE, host=settings.HUBSPOT_API_HOST)
+
+def get_client(access_token):
+    """
+    Returns the shared HubSpot client of an access token.
+    """
+    return registry.get(access_token)
@@ -0,0 +1,103 @@
+import collections, time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics import metrics
+
+
+def fetch_page(get_page, page, retries=3, backoff=0.5):
+    """
+    Fetches a single page, retrying failed or malformed responses.
+
+    :param get_page: Callable returning the RAM API payload of a page number.
+    :type get_page: callable
+    :param page: Page number.
+    :type page: int
+    :param retries: Number of retries after the first attempt.
+    :type retries: int
+    :param backoff: Seconds to wait before the first retry, doubled on every retry.
+    :type backoff: float
+    :return: Page payload with 'info' and 'results'.
+    :rtype: dict
+    """
+    attempt = 0
+    while True:
+        try:
+            data = get_page(page)
+            if 'results' not in data:
+                raise ValueError("Page {} --> {}".format(page, data.get('error', 'missing results')))
+            return data
+        except Exception:
+            if attempt >= retries:
+                raise
+            metrics.inc('ramapi_retries_total')
+            time.sleep(backoff * 2 ** attempt)
+            attempt += 1
+
+
+def iter_pages(get_page, workers=1, retries=3, backoff=0.5, pending=None):
+    """
+    Yields every page of a paginated RAM API resource in page order.
+
+    The first page is fetched on its own to read 'info.pages'. With more than one worker
+    the remaining pages are fetched in parallel and handed back in order as soon as each
+    one is available, submitting a new page only once one is handed back so at most
+    workers + pending pages are held at once; with a single worker it follows 'info.next'
+    one page at a time.
+
+    :param get_page: Callable returning the RAM API payload of a page number.
+    :type get_page: callable
+    :param workers: Maximum number of pages fetched at once.
+    :type workers: int
+    :param retries: Retries per page.
+    :type retries: int
+    :param backoff: Base retry backoff in seconds.
+    :type backoff: float
+    :param pending: Pages fetched ahead of the one being consumed, beyond the workers; defaults to workers.
+    :type pending: int
+    :return: Generator of page payloads.
+    :rtype: generator
+    """
+    first = fetch_page(get_page, 1, retries, backoff)
+    yield first
+
+    pages = first['info'].get('pages') or 1
+    if workers <= 1:
+        page, data = 1, first
+        while data['info']['next']:
+            page += 1
+            data = fetch_page(get_page, page, retries, backoff)
+            yield data
+        return
+
+    remaining = iter(range(2, pages + 1))
+    ahead = workers + (workers if pending is None else pending)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = collections.deque()
+
+        def submit():
+            page = next(remaining, None)
+            if page is not None:
+                futures.append(executor.submit(fetch_page, get_page, page, retries, backoff))
+
+        try:
+            for _ in range(ahead):
+                submit()
+            while futures:
+                data = futures.popleft().result()
+                submit()
+                yield data
+        finally:
+            for future in futures:
+                future.cancel()
+
+def fetch_results(get_page, workers=1, retries=3, backoff=0.5):
+    """
+    Fetches every page of a paginated RAM API resource and joins the results.
+
+    :return: List with the results of every page, in page order.
+    :rtype: list
+    """
+    results = []
+    for data in iter_pages(get_page, workers=workers, retries=retries, backoff=backoff):
+        results.extend(data['results'])
+    return results
@@ -0,0 +1,199 @@
+import logging, os, socket, time, traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from app.models import Job
+from app.metrics import metrics
+from app.webhooks import flush_pending
+from app.locks import is_held
+
+logger = logging.getLogger(__name__)
+
+RUNNERS = {
+    'contacts': 'app.views.requestContacts',
+    'companies': 'app.views.requestCompanies',
+    'associations-source': 'app.views.sourceHubspotAssociations',
+    'associations-mirror': 'app.views.mirrorHubspotAssociations',
+    'sync-contacts': 'app.views.syncContacts',
+    'sync-companies': 'app.views.syncCompanies',
+}
+
+# Lock held by the runs of a kind while they work, see requestRM.makeAssociations and requestRM.migrationLock.
+LOCKED = {
+    'contacts': 'migration-contacts',
+    'companies': 'migration-companies',
+    'associations-source': 'associations-source',
+    'associations-mirror': 'associations-mirror',
+    'sync-contacts': 'migration-contacts',
+    'sync-companies': 'migration-companies',
+}
+
+
+def enqueue(kind):
+    """
+    Queues a migration job.
+
+    :param kind: One of Job.KINDS.
+    :type kind: str
+    :return: The queued job.
+    :rtype: app.models.Job
+    """
+    return Job.objects.create(kind=kind, stage='queued')
+
+
+def schedule(kind, delay, max_delay):
+    """
+    Queues a debounced job: requests arriving while a job of the kind is still queued
+    are folded into it, and each of them postpones it to `delay` seconds later, so a
+    burst of requests ends in a single run once it is quiet. The job is never postponed
+    past `max_delay` seconds after the first request.
+
+    :param kind: One of Job.KINDS.
+    :type kind: str
+    :param delay: Quiet seconds before the job runs.
+    :type delay: float
+    :param max_delay: Seconds after the first request the job runs at the latest.
+    :type max_delay: float
+    :return: The queued job, new or the one the request was folded into.
+    :rtype: app.models.Job
+    """
+    now = timezone.now()
+    job = Job.objects.filter(kind=kind, state='queued').order_by('created').first()
+    if job is not None:
+        scheduled = min(now + timedelta(seconds=delay), job.created + timedelta(seconds=max_delay))
+        if Job.objects.filter(pk=job.pk, state='queued').update(scheduled=scheduled):
+            job.scheduled = scheduled
+            return job
+    return Job.objects.create(kind=kind, stage='queued', scheduled=now + timedelta(seconds=delay))
+
+
+def set_stage(job, stage):
+    """
+    Records the stage a running job has reached.
+    """
+    Job.objects.filter(pk=job.pk).update(stage=stage, heartbeat=timezone.now())
+
+
+def advance(job, count):
+    """
+    Adds `count` records to the processed counter of a job; safe to call from several threads.
+    """
+    Job.objects.filter(pk=job.pk).update(processed=F('processed') + count, heartbeat=timezone.now())
+
+
+def add_errors(job, errors):
+    """
+    Appends errors to a job.
+    """
+    job.refresh_from_db(fields=['errors'])
+    job.errors = list(job.errors) + list(errors)
+    job.save(update_fields=['errors'])
+
+
+def throughput(job):
+    """
+    Records processed per second since the job started.
+
+    :rtype: float
+    """
+    if not job.started:
+        return 0.0
+    elapsed = ((job.finished or timezone.now()) - job.started).total_seconds()
+    return round(job.processed / elapsed, 2) if elapsed > 0 else 0.0
+
+
+def claim(worker):
+    """
+    Atomically takes the oldest queued job that is due, or a running job whose worker
+    stopped sending heartbeats for JOBS_STALE_AFTER seconds. Jobs whose lock (see LOCKED)
+    is held by a run elsewhere are left for later.
+
+    :param worker: Name of the worker claiming the job.
+    :type worker: str
+    :return: The claimed job, None when there is nothing to run.
+    :rtype: app.models.Job or None
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS_STALE_AFTER)
+    due = Q(scheduled__isnull=True) | Q(scheduled__lte=now)
+    runnable = Q(due, state='queued') | Q(state='running', heartbeat__lt=stale)
+    for job in Job.objects.filter(runnable).order_by('created')[:10]:
+        if job.kind in LOCKED and is_held(LOCKED[job.kind]):
+            continue
+        now = timezone.now()
+        claimed = Job.objects.filter(runnable, pk=job.pk).update(
+            state='running', stage='starting', worker=worker, started=now, heartbeat=now, processed=0
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run(job, **attributes):
+    """
+    Runs a claimed job through the migrate() method of its view and stores the outcome.
+
+    Responses with status 400 or above mark the job as failed; failed batches reported
+    with 207 are kept as errors of a finished job.
+
+    :param attributes: Attributes set on the view before it runs (dry_run, only_ids, workers, batch_size).
+    :type attributes: dict
+    """
+    try:
+        view = import_string(RUNNERS[job.kind])()
+        view.job = job
+        for name, value in attributes.items():
+            setattr(view, name, value)
+        response = view.migrate()
+        state = 'failed' if response.status_code >= 400 else 'done'
+        result = {'status': response.status_code, 'data': response.data}
+        errors = response.data.get('failed', []) if isinstance(response.data, dict) else []
+        if state == 'failed':
+            errors = errors + [response.data]
+    except Exception as e:
+        state, result, errors = 'failed', None, [{'error': str(e), 'traceback': traceback.format_exc()}]
+
+    if errors:
+        add_errors(job, errors)
+    Job.objects.filter(pk=job.pk).update(state=state, stage=state, result=result, finished=timezone.now(), heartbeat=timezone.now())
+    job.refresh_from_db()
+    metrics.flush()
+    return job
+
+
+def work(poll=2.0, once=False, stdout=None):
+    """
+    Worker loop, claims and runs jobs until interrupted.
+
+    While the queue is empty the worker also flushes the pending webhook events, so they
+    are mirrored even when no web process is left to flush them.
+
+    :param poll: Seconds to sleep when the queue is empty.
+    :type poll: float
+    :param once: Stop as soon as the queue is empty.
+    :type once: bool
+    """
+    worker = "{}:{}".format(socket.gethostname(), os.getpid())
+    while True:
+        close_old_connections()
+        job = claim(worker)
+        if job is None:
+            try:
+                flush_pending()
+            except Exception as e:
+                logger.error("Error: %s", e, extra={'event': 'flushWebhooks'})
+            if once:
+                return
+            time.sleep(poll)
+            continue
+        if stdout is not None:
+            stdout.write("{} running {}".format(worker, job))
+        job = run(job)
+        if stdout is not None:
+            stdout.write("{} {} --> {} records, {} rec/s".format(worker, job, job.processed, throughput(job)))
@@ -0,0 +1,118 @@
+from django.db.models import F
+from django.utils import timezone
+
+from app.models import MigrationLedger, ObjectMapping
+from app.mapping import portal_name, rebuild
+
+
+def open_ledger(kind, migrated, partial=False):
+    """
+    Returns the ledger of a migration, deciding whether the migration has to run.
+
+    A complete ledger whose records are still in HubSpot means there is nothing to do. A
+    complete ledger of a portal that has been emptied since starts over.
+
+    A partial run (a dry run, or one limited to some records) must not complete nor reset
+    the migration: it gets an unsaved ledger, which record_batch, uncommitted and
+    close_ledger leave out of the database.
+
+    :param kind: 'contacts' or 'companies'.
+    :type kind: str
+    :param migrated: Number of records of the kind found in HubSpot.
+    :type migrated: int
+    :param partial: The run does not cover the whole migration.
+    :type partial: bool
+    :return: The ledger, None when the migration is already complete.
+    :rtype: app.models.MigrationLedger or None
+    """
+    if partial:
+        ledger = MigrationLedger.objects.filter(kind=kind).first()
+        if ledger is not None and ledger.state == 'complete' and migrated > 0:
+            return None
+        return MigrationLedger(kind=kind, state='running', started=timezone.now())
+
+    ledger, _ = MigrationLedger.objects.get_or_create(kind=kind)
+    if ledger.state == 'complete' and migrated > 0:
+        return None
+    now = timezone.now()
+    if ledger.state == 'complete' or migrated == 0:
+        ledger.batches = ledger.records = 0
+    ledger.state, ledger.runs, ledger.skipped, ledger.failed = 'running', ledger.runs + 1, 0, 0
+    ledger.started, ledger.finished = now, None
+    ledger.save()
+    return ledger
+
+
+def committed_ids(access_token, object_type, migrated):
+    """
+    Returns the external ids already committed to HubSpot, from the local mapping index.
+
+    When HubSpot holds more records than the index knows (e.g. the run stopped between a
+    batch create and the write of its mappings, or predates the index) the index is
+    rebuilt from HubSpot first, so no record is created twice.
+
+    :param access_token: HubSpot access token of the portal.
+    :type access_token: str
+    :param object_type: 'contacts' or 'companies'.
+    :type object_type: str
+    :param migrated: Number of records of the kind found in HubSpot.
+    :type migrated: int
+    :return: Set of external ids, as strings.
+    :rtype: set
+    """
+    if migrated == 0:
+        return set()
+    mappings = ObjectMapping.objects.filter(portal=portal_name(access_token), object_type=object_type)
+    if mappings.count() < migrated:
+        rebuild(access_token, object_type)
+    return set(mappings.values_list('external_id', flat=True))
+
+
+def record_batch(ledger, size):
+    """
+    Records a batch committed to HubSpot; safe to call from several threads.
+    """
+    MigrationLedger.objects.filter(pk=ledger.pk).update(batches=F('batches') + 1, records=F('records') + size)
+
+
+def uncommitted(ledger, records, known, key):
+    """
+    Yields the records whose external id is not in `known`, counting the skipped ones
+    on the ledger once the stream is exhausted.
+
+    :param records: Iterable of RAM API records.
+    :type records: iterable
+    :param known: External ids already committed, see committed_ids.
+    :type known: set
+    :param key: Field of the record holding its external id ('id').
+    :type key: str
+    :return: Generator of records.
+    :rtype: generator
+    """
+    skipped = 0
+    for record in records:
+        if str(record[key]) in known:
+            skipped += 1
+            continue
+        yield record
+    MigrationLedger.objects.filter(pk=ledger.pk).update(skipped=skipped)
+
+
+def close_ledger(ledger, failed):
+    """
+    Marks the migration complete, or leaves it running for the next run to resume when
+    batches failed.
+
+    :param failed: Failed batches of the run.
+    :type failed: list
+    """
+    if ledger.pk is None:
+        ledger.failed = len(failed)
+        return ledger
+    MigrationLedger.objects.filter(pk=ledger.pk).update(
+        state='running' if failed else 'complete',
+        failed=len(failed),
+        finished=None if failed else timezone.now()
+    )
+    ledger.refresh_from_db()
+    return ledger
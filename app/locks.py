@@ -0,0 +1,113 @@
+import os, socket, threading, time, uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from app.models import Lock
+
+
+def owner():
+    """
+    New owner token for a run taking a lock, unique across hosts and processes.
+
+    The token, not the thread, identifies the holder: any thread of the run (e.g. the
+    upload pool) refreshes or releases the lock with it.
+    """
+    return "{}:{}:{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+
+
+def acquire(name, ttl):
+    """
+    Takes a lock shared by every process using the database, or one whose holder let it
+    expire (e.g. the process died).
+
+    :param name: Name of the lock.
+    :type name: str
+    :param ttl: Seconds the lock is held without being refreshed.
+    :type ttl: int
+    :return: Owner token of the run holding the lock, None when it was not taken.
+    :rtype: str or None
+    """
+    token, now = owner(), timezone.now()
+    expires = now + timedelta(seconds=ttl)
+    try:
+        with transaction.atomic():
+            Lock.objects.create(name=name, owner=token, expires=expires)
+        return token
+    except IntegrityError:
+        return token if Lock.objects.filter(name=name, expires__lt=now).update(owner=token, expires=expires) else None
+
+
+def refresh(name, token, ttl):
+    """
+    Extends a lock held by the run owning `token`, from any thread.
+
+    :return: Whether the lock is still held.
+    :rtype: bool
+    """
+    return bool(Lock.objects.filter(name=name, owner=token).update(expires=timezone.now() + timedelta(seconds=ttl)))
+
+
+class LockLost(Exception):
+    """
+    Raised when a run finds its lock taken over, e.g. it expired while the run was silent.
+    """
+
+
+def keeper(name, token, ttl):
+    """
+    Returns a callable extending the lock held by the run owning `token`, safe to call
+    as often as wanted from any thread: the database is only written once every third
+    of `ttl`.
+
+    :return: Callable raising LockLost once the run no longer holds the lock.
+    :rtype: callable
+    """
+    state = {'refreshed': time.monotonic()}
+    guard = threading.Lock()
+
+    def keepalive():
+        with guard:
+            if time.monotonic() - state['refreshed'] < ttl / 3:
+                return
+            if not refresh(name, token, ttl):
+                raise LockLost("The lock {} was taken over by another run.".format(name))
+            state['refreshed'] = time.monotonic()
+
+    return keepalive
+
+
+def release(name, token):
+    """
+    Releases a lock held by the run owning `token`.
+    """
+    Lock.objects.filter(name=name, owner=token).delete()
+
+
+def is_held(name):
+    """
+    Whether a lock is currently held by anyone.
+
+    :rtype: bool
+    """
+    return Lock.objects.filter(name=name, expires__gte=timezone.now()).exists()
+
+
+@contextmanager
+def held(name, ttl, poll=1.0):
+    """
+    Holds a lock for the body of a with block, waiting for it while another holder has it.
+
+    The wait is bounded by `ttl`: a holder that stops refreshing loses the lock once it expires.
+    The owner token is bound by the with block, for refresh().
+    """
+    token = acquire(name, ttl)
+    while token is None:
+        time.sleep(poll)
+        token = acquire(name, ttl)
+    try:
+        yield token
+    finally:
+        release(name, token)
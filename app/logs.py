@@ -0,0 +1,191 @@
+import json, logging, os, queue, sys, threading
+
+try:
+    import fcntl
+except ImportError:  # Windows, the rotation is then only safe with a single process.
+    fcntl = None
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has, anything else was passed through `extra` and is written as a field.
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line with the time, level, logger, message
+    and the fields passed through `extra` (e.g. extra={'event': 'fetchClients'}).
+    """
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['traceback'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class QueueFileHandler(logging.Handler):
+    """
+    Log handler writing to a file from a background thread.
+
+    emit() only formats the record and puts it on a bounded queue, so logging never
+    waits on disk. The writer thread takes up to `batch_size` records at once and writes
+    them with a single append, which keeps the lines of different processes sharing the
+    file from interleaving. The file is rotated once it reaches `max_bytes`, keeping
+    `backup_count` old files (core.log.1, core.log.2...) by one process at a time. When
+    the queue is full new records are dropped and counted, and records that could not be
+    written (e.g. a full disk) are counted as lost, the error going to stderr; both counts
+    are written to the file once it can be written again.
+
+    :param filename: Path of the log file, its directory is created when missing.
+    :type filename: str
+    :param max_bytes: Size at which the file is rotated, 0 never rotates it.
+    :type max_bytes: int
+    :param backup_count: Rotated files kept.
+    :type backup_count: int
+    :param capacity: Records held in memory at most.
+    :type capacity: int
+    :param batch_size: Records written per append at most.
+    :type batch_size: int
+    :param flush_interval: Seconds the writer waits for records before checking for shutdown.
+    :type flush_interval: float
+    """
+    def __init__(self, filename, max_bytes=5242880, backup_count=5, capacity=10000, batch_size=500, flush_interval=1.0):
+        super().__init__()
+        self.filename = os.fspath(filename)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=capacity)
+        self.dropped = self.lost = 0
+        self.error = None
+        self.writer = None
+        self.pid = None
+        self.closing = threading.Event()
+        self.start_lock = threading.Lock()
+
+    def _start(self):
+        # The writer is started on first use, and again in a forked child (e.g. gunicorn workers) that did not inherit it.
+        if self.pid != os.getpid():
+            with self.start_lock:
+                if self.pid != os.getpid():
+                    if self.pid is not None:
+                        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+                    self.writer = threading.Thread(target=self._write_forever, name='log-writer', daemon=True)
+                    self.writer.start()
+                    self.pid = os.getpid()
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self._start()
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_forever(self):
+        while not (self.closing.is_set() and self.queue.empty()):
+            try:
+                lines = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(lines) < self.batch_size:
+                try:
+                    lines.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            taken, dropped, lost = len(lines), self.dropped, self.lost
+            self.dropped = self.lost = 0
+            if dropped:
+                lines.append(self._notice('{} log records dropped, the queue was full.'.format(dropped)))
+            if lost:
+                lines.append(self._notice('{} log records lost, the log file could not be written: {}'.format(lost, self.error)))
+            if not self._write(lines):
+                self.dropped += dropped
+                self.lost += lost + taken
+            for _ in range(taken):
+                self.queue.task_done()
+
+    def _notice(self, message):
+        return json.dumps({'time': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3], 'level': 'WARNING', 'logger': __name__, 'message': message})
+
+    def _size(self):
+        try:
+            return os.path.getsize(self.filename)
+        except FileNotFoundError:
+            return 0
+
+    def _write(self, lines):
+        """
+        Appends lines to the file, rotating it first when they would not fit.
+
+        :return: Whether the lines were written. The error of a failed write is kept in
+            `error` and written to stderr once per run of failures.
+        :rtype: bool
+        """
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        try:
+            os.makedirs(os.path.dirname(self.filename) or '.', exist_ok=True)
+            if self.max_bytes and self._size() + len(data) > self.max_bytes:
+                self._rotate(len(data))
+            fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        except Exception as e:
+            if self.error is None:
+                sys.stderr.write('Could not write the log file {}: {}\n'.format(self.filename, e))
+            self.error = e
+            return False
+        self.error = None
+        return True
+
+    def _rotate(self, size):
+        """
+        Rotates the file under an exclusive lock on '<filename>.lock', shared by every process
+        writing it. The size is checked again once the lock is held: when another process
+        rotated the file meanwhile there is nothing left to do.
+        """
+        with open(self.filename + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            current = self._size()
+            if not current or current + size <= self.max_bytes:
+                return
+            if self.backup_count <= 0:
+                os.truncate(self.filename, 0)
+                return
+            for i in range(self.backup_count - 1, 0, -1):
+                try:
+                    os.replace('{}.{}'.format(self.filename, i), '{}.{}'.format(self.filename, i + 1))
+                except FileNotFoundError:
+                    pass
+            try:
+                os.replace(self.filename, self.filename + '.1')
+            except FileNotFoundError:
+                pass
+
+    def flush(self):
+        """
+        Waits until the queued records are written, when the writer is running.
+        """
+        if self.writer is not None and self.writer.is_alive() and self.pid == os.getpid():
+            self.queue.join()
+
+    def close(self):
+        self.closing.set()
+        if self.writer is not None and self.writer.is_alive() and self.pid == os.getpid():
+            self.writer.join(timeout=5)
+        super().close()
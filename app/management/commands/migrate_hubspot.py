@@ -0,0 +1,121 @@
+import argparse, os, socket, threading, time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from app.clients import registry
+from app.jobs import run, throughput
+from app.models import Job
+
+
+def parse_ids(value):
+    """
+    Parses --only-ids: IDs and ranges separated by commas ('1,7,20-30'), or '@path' to a
+    file holding them, separated by commas or whitespace.
+
+    :rtype: set
+    """
+    if value.startswith('@'):
+        try:
+            with open(value[1:]) as f:
+                value = f.read()
+        except OSError as e:
+            raise argparse.ArgumentTypeError(str(e))
+    ids = set()
+    for part in value.replace(',', ' ').split():
+        try:
+            if '-' in part:
+                first, last = part.split('-', 1)
+                ids.update(range(int(first), int(last) + 1))
+            else:
+                ids.add(int(part))
+        except ValueError:
+            raise argparse.ArgumentTypeError("invalid ID or range: {}".format(part))
+    if not ids:
+        raise argparse.ArgumentTypeError("no IDs given")
+    return ids
+
+
+class Command(BaseCommand):
+    help = "Runs a migration, delta sync or association run in this process, without going through the job queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=[kind for kind, _ in Job.KINDS])
+        parser.add_argument('--workers', type=int, default=settings.HUBSPOT_UPLOAD_WORKERS, help="Batches uploaded at the same time.")
+        parser.add_argument('--batch-size', type=int, default=settings.HUBSPOT_BATCH_SIZE, help="Records per HubSpot batch, 100 at most.")
+        parser.add_argument('--dry-run', action='store_true', help="Read everything but write nothing to HubSpot nor to the migration ledger.")
+        parser.add_argument('--only-ids', type=parse_ids, default=None, metavar='IDS', help="RAM API IDs to migrate ('1,7,20-30' or @file): character IDs for contacts and associations, location IDs for companies.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between two progress lines.")
+
+    def handle(self, *args, **options):
+        workers, size = options['workers'], options['batch_size']
+        if workers < 1:
+            raise CommandError("--workers must be at least 1.")
+        if not 1 <= size <= 100:
+            raise CommandError("--batch-size must be between 1 and 100, the HubSpot batch limit.")
+        # Clients created from now on keep a connection per worker alive.
+        registry.pool_maxsize = max(registry.pool_maxsize, workers)
+
+        now = timezone.now()
+        job = Job.objects.create(
+            kind=options['kind'], state='running', stage='starting',
+            worker="{}:{}".format(socket.gethostname(), os.getpid()), started=now, heartbeat=now
+        )
+        self.stdout.write("Running {} with {} workers, {} records per batch{}".format(
+            job, workers, size, ' (dry run)' if options['dry_run'] else ''
+        ))
+
+        stopped = threading.Event()
+        watcher = threading.Thread(target=self.watch, args=(job, options['interval'], options['verbosity'] > 0, stopped), daemon=True)
+        watcher.start()
+        try:
+            job = run(job, dry_run=options['dry_run'], only_ids=options['only_ids'], workers=workers, batch_size=size)
+        except KeyboardInterrupt:
+            Job.objects.filter(pk=job.pk).update(state='failed', stage='interrupted', finished=timezone.now())
+            raise CommandError("Interrupted, {} marked as failed.".format(job))
+        finally:
+            stopped.set()
+            watcher.join()
+
+        data = job.result['data'] if job.result and isinstance(job.result['data'], dict) else {}
+        message = data.get('succes') or data.get('details') or data.get('error') or ''
+        self.stdout.write("{} --> {} records in {:.1f}s, {} rec/s. {}".format(
+            job, job.processed, (job.finished - job.started).total_seconds(), throughput(job), message
+        ))
+        if options['dry_run']:
+            self.stdout.write("Dry run: nothing was written to HubSpot, the records above are the ones that would have been.")
+        if job.state == 'failed':
+            raise CommandError("{} failed: {}".format(job, job.errors[-1] if job.errors else message))
+        if job.errors:
+            raise CommandError("{} batches could not be written, see the errors of {}.".format(len(job.errors), job), returncode=2)
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def watch(self, job, interval, verbose, stopped):
+        """
+        Prints the stage, processed records and throughput of the job every `interval`
+        seconds and keeps its heartbeat fresh, so no runjobs worker takes it over.
+        """
+        ending = '\r' if self.stdout.isatty() else '\n'
+        processed, since, shown = 0, time.monotonic(), False
+        try:
+            while not stopped.wait(interval):
+                close_old_connections()
+                try:
+                    Job.objects.filter(pk=job.pk).update(heartbeat=timezone.now())
+                    current = Job.objects.get(pk=job.pk)
+                except Exception:
+                    continue
+                if not verbose:
+                    continue
+                now = time.monotonic()
+                rate = (current.processed - processed) / (now - since)
+                processed, since = current.processed, now
+                line = "{}: {} records, {:.1f} rec/s (overall {} rec/s)".format(current.stage, current.processed, rate, throughput(current))
+                self.stdout.write(line.ljust(79) if ending == '\r' else line, ending=ending)
+                shown = True
+        finally:
+            if shown and ending == '\r':
+                self.stdout.write('')
+            connection.close()
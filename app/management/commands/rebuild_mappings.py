@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.mapping import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the character_id/location_id -> HubSpot object id index from a full read of HubSpot."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--portal', choices=['source', 'mirror', 'all'], default='all')
+        parser.add_argument('--object-type', choices=['contacts', 'companies', 'all'], default='all')
+
+    def handle(self, *args, **options):
+        tokens = {'source': settings.HUBSOPT_SOURCE_KEY, 'mirror': settings.HUBSOPT_MIRROR_KEY}
+        portals = tokens if options['portal'] == 'all' else [options['portal']]
+        object_types = ['contacts', 'companies'] if options['object_type'] == 'all' else [options['object_type']]
+
+        for portal in portals:
+            for object_type in object_types:
+                total = rebuild(tokens[portal], object_type)
+                self.stdout.write(self.style.SUCCESS("{} {}: {} mappings".format(portal, object_type, total)))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app.jobs import work
+
+
+class Command(BaseCommand):
+    help = "Runs the queued migration jobs (request-contacts, request-companies and associations)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        work(poll=options['poll'], once=options['once'], stdout=self.stdout)
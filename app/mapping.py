@@ -0,0 +1,167 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from app.models import ObjectMapping
+from app.clients import get_client
+
+logger = logging.getLogger(__name__)
+
+EXTERNAL_PROPERTIES = {
+    'contacts': 'character_id',
+    'companies': 'location_id',
+}
+
+
+def portal_name(access_token):
+    """
+    Returns the portal name ('source' or 'mirror') of an access token.
+
+    :raises ValueError: When the token belongs to neither portal.
+    """
+    if access_token == settings.HUBSOPT_SOURCE_KEY:
+        return 'source'
+    if access_token == settings.HUBSOPT_MIRROR_KEY:
+        return 'mirror'
+    raise ValueError("Unknown HubSpot portal token.")
+
+
+def lookup(access_token, object_type, external_id, search=None):
+    """
+    Returns the HubSpot object id of a character_id/location_id.
+
+    The local index is read first; on a miss `search` is called and its result is stored.
+
+    :param access_token: HubSpot access token of the portal.
+    :type access_token: str
+    :param object_type: 'contacts' or 'companies'.
+    :type object_type: str
+    :param external_id: character_id or location_id.
+    :type external_id: str or int
+    :param search: Callable returning the object id from HubSpot, or None when not found.
+    :type search: callable or None
+    :return: HubSpot object id, None when unknown.
+    :rtype: str or None
+    """
+    if external_id in (None, ''):
+        return None
+    portal = portal_name(access_token)
+    object_id = ObjectMapping.objects.filter(
+        portal=portal, object_type=object_type, external_id=str(external_id)
+    ).values_list('object_id', flat=True).first()
+    if object_id is None and search is not None:
+        object_id = search()
+        if object_id is not None:
+            remember(access_token, object_type, [(external_id, object_id)])
+    return object_id
+
+
+def remember(access_token, object_type, pairs, digests=None):
+    """
+    Stores (external_id, object_id) pairs, replacing the previous object id of an external id.
+
+    Pairs without an external id are skipped.
+
+    :param digests: Hash of the properties synced per external id (see app.sync), None
+        keeps the stored hashes.
+    :type digests: dict or None
+    :return: Number of stored pairs.
+    :rtype: int
+    """
+    portal = portal_name(access_token)
+    mappings = {
+        str(external_id): ObjectMapping(
+            portal=portal, object_type=object_type, external_id=str(external_id), object_id=str(object_id),
+            digest=(digests or {}).get(str(external_id), '')
+        )
+        for external_id, object_id in pairs if external_id not in (None, '')
+    }
+    ObjectMapping.objects.bulk_create(
+        mappings.values(),
+        update_conflicts=True,
+        unique_fields=['portal', 'object_type', 'external_id'],
+        update_fields=['object_id', 'updated'] + (['digest'] if digests is not None else []),
+        batch_size=500
+    )
+    return len(mappings)
+
+
+def remember_results(access_token, object_type, response, digests=None):
+    """
+    Stores the mappings of the records returned by a HubSpot create/update call, and
+    applies the records to the CRM snapshots of the process (see app.snapshot).
+
+    The records already exist in HubSpot at this point, so a failure to store them is
+    logged instead of raised; the index is completed later by a search or a rebuild.
+
+    :param response: Batch response or single object returned by the HubSpot SDK.
+    :param digests: Hash of the properties sent per external id, see remember.
+    :type digests: dict or None
+    :return: The response, unchanged.
+    """
+    prop = EXTERNAL_PROPERTIES[object_type]
+    results = (response.results or []) if hasattr(response, 'results') else [response]
+    try:
+        remember(access_token, object_type, [(result.properties.get(prop), result.id) for result in results], digests)
+    except Exception as e:
+        logger.error("Error: %s", e, extra={'event': 'rememberResults'})
+    from app.snapshot import snapshots
+    snapshots.apply(access_token, object_type, [(result.id, result.properties) for result in results])
+    return response
+
+
+def forget(access_token, object_type, external_id):
+    """
+    Removes the mapping of an external id, e.g. after HubSpot reports its object as missing.
+    """
+    ObjectMapping.objects.filter(
+        portal=portal_name(access_token), object_type=object_type, external_id=str(external_id)
+    ).delete()
+
+
+def object_ids(access_token, object_type, external_ids):
+    """
+    Returns the HubSpot object ids of many external ids from the local index.
+
+    :return: Object id per external id, external ids missing from the index are left out.
+    :rtype: dict
+    """
+    mappings = ObjectMapping.objects.filter(
+        portal=portal_name(access_token), object_type=object_type, external_id__in=[str(i) for i in external_ids]
+    )
+    return dict(mappings.values_list('external_id', 'object_id'))
+
+
+def rebuild(access_token, object_type):
+    """
+    Rebuilds the index of a portal and object type from a full read of HubSpot.
+
+    When several records share the same external id the oldest one is kept. The hashes of
+    the records whose object id did not change are kept.
+
+    :return: Number of stored mappings.
+    :rtype: int
+    """
+    prop = EXTERNAL_PROPERTIES[object_type]
+    api = getattr(get_client(access_token).crm, object_type).basic_api
+    pairs, after = {}, None
+    while True:
+        response = api.get_page(properties=[prop], limit=100, archived=False, after=after)
+        for result in response.results:
+            external_id = result.properties.get(prop)
+            if external_id not in (None, '') and external_id not in pairs:
+                pairs[external_id] = result.id
+        if response.paging and response.paging.next:
+            after = response.paging.next.after
+        else:
+            break
+
+    with transaction.atomic():
+        mappings = ObjectMapping.objects.filter(portal=portal_name(access_token), object_type=object_type)
+        digests = {
+            external_id: digest for external_id, object_id, digest in mappings.values_list('external_id', 'object_id', 'digest')
+            if pairs.get(external_id) == object_id
+        }
+        mappings.delete()
+        return remember(access_token, object_type, pairs.items(), digests)
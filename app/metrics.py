@@ -0,0 +1,194 @@
+import os, socket, threading, time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRICS = {
+    'migration_stage_seconds': ('histogram', "Duration of the migration stages (ram_fetch, prime_filter, serialize, hubspot_read, association_join, batch_post, webhook_flush)."),
+    'hubspot_requests_total': ('counter', "HubSpot API calls by endpoint, method, token and status."),
+    'hubspot_request_seconds': ('histogram', "Latency of the HubSpot API calls by endpoint, method and token."),
+    'hubspot_rate_limited_total': ('counter', "HubSpot API calls answered with 429 by token."),
+    'upload_retries_total': ('counter', "Batch uploads retried by uploader and status."),
+    'upload_splits_total': ('counter', "Batches rejected as a whole and sent again in halves, by uploader and status."),
+    'ramapi_requests_total': ('counter', "RAM API calls made past the local cache by endpoint and status."),
+    'ramapi_request_seconds': ('histogram', "Latency of the RAM API calls by endpoint."),
+    'ramapi_retries_total': ('counter', "RAM API pages fetched again after a failure."),
+    'snapshot_reads_total': ('counter', "Reads of the CRM snapshots by object type and mode (full page, incremental search)."),
+    'associations_changes_total': ('counter', "Contact to company associations created and archived by the association runs, by portal."),
+    'webhook_events_total': ('counter', "Webhook events by object type and outcome (queued, coalesced, stale, dead)."),
+    'webhook_flushes_total': ('counter', "Batches of webhook events mirrored by object type and outcome (done, partial, failed)."),
+}
+
+
+class Metrics:
+    """
+    In-process counters and latency histograms, rendered in the Prometheus text format.
+
+    Each process publishes its values as a MetricSnapshot row every `interval` seconds
+    from a background thread, so the /metrics endpoint of any web worker also reports the
+    job workers and the other web workers sharing the database. Values of every process
+    are summed when rendered.
+
+    :param interval: Seconds between two snapshots of the process, 0 disables them.
+    :type interval: float
+    """
+    def __init__(self, interval=15):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.flusher = None
+
+    @property
+    def process(self):
+        return "{}:{}".format(socket.gethostname(), os.getpid())
+
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def inc(self, name, value=1, **labels):
+        """
+        Adds `value` to a counter.
+        """
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._start()
+
+    def observe(self, name, seconds, **labels):
+        """
+        Records a duration in a histogram.
+        """
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+        self._start()
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Times the body of a with block into a histogram, also when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def stage(self, stage):
+        """
+        Times a migration stage, see METRICS.
+        """
+        return self.timer('migration_stage_seconds', stage=stage)
+
+    def snapshot(self):
+        """
+        Returns the values of the process as a JSON serializable dict.
+        """
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), dict(h, buckets=list(h['buckets']))] for (name, labels), h in self.histograms.items()],
+            }
+
+    def _start(self):
+        if self.flusher is None and self.interval > 0:
+            with self.lock:
+                if self.flusher is None:
+                    self.flusher = threading.Thread(target=self._flush_forever, name='metrics-flush', daemon=True)
+                    self.flusher.start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+            close_old_connections()
+
+    def flush(self):
+        """
+        Publishes the snapshot of the process, errors are ignored (e.g. before migrations ran).
+        """
+        from app.models import MetricSnapshot
+        try:
+            MetricSnapshot.objects.update_or_create(process=self.process, defaults={'data': self.snapshot()})
+        except DatabaseError:
+            pass
+
+    def collect(self):
+        """
+        Sums the live values of the process with the published values of the others.
+
+        Snapshots not refreshed for METRICS_RETENTION seconds belong to processes that are
+        gone and are deleted.
+
+        :rtype: tuple of (counters, histograms) dicts
+        """
+        from app.models import MetricSnapshot
+        snapshots = [self.snapshot()]
+        try:
+            MetricSnapshot.objects.filter(updated__lt=timezone.now() - timedelta(seconds=settings.METRICS_RETENTION)).delete()
+            snapshots += list(MetricSnapshot.objects.exclude(process=self.process).values_list('data', flat=True))
+        except DatabaseError:
+            pass
+
+        counters, histograms = {}, {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot.get('counters', []):
+                key = (name, tuple(tuple(label) for label in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, data in snapshot.get('histograms', []):
+                key = (name, tuple(tuple(label) for label in labels))
+                total = histograms.setdefault(key, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], data['buckets'])]
+                total['sum'] += data['sum']
+                total['count'] += data['count']
+        return counters, histograms
+
+    def render(self):
+        """
+        Renders every process in the Prometheus text exposition format (version 0.0.4).
+
+        :rtype: str
+        """
+        def labels(pairs, extra=()):
+            pairs = list(pairs) + list(extra)
+            if not pairs:
+                return ''
+            escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            return '{' + ','.join('{}="{}"'.format(k, escape(v)) for k, v in pairs) + '}'
+
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            lines.append("# HELP {} {}".format(name, description))
+            lines.append("# TYPE {} {}".format(name, kind))
+            if kind == 'counter':
+                for (metric, pairs), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append("{}{} {}".format(name, labels(pairs), value))
+            else:
+                for (metric, pairs), data in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(BUCKETS, data['buckets']):
+                        lines.append("{}_bucket{} {}".format(name, labels(pairs, [('le', bound)]), count))
+                    lines.append("{}_bucket{} {}".format(name, labels(pairs, [('le', '+Inf')]), data['count']))
+                    lines.append("{}_sum{} {}".format(name, labels(pairs), round(data['sum'], 6)))
+                    lines.append("{}_count{} {}".format(name, labels(pairs), data['count']))
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics(interval=settings.METRICS_FLUSH_INTERVAL)
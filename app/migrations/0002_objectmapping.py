@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObjectMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('portal', models.CharField(choices=[('source', 'Source'), ('mirror', 'Mirror')], max_length=16, verbose_name='Portal')),
+                ('object_type', models.CharField(choices=[('contacts', 'Contacts'), ('companies', 'Companies')], max_length=16, verbose_name='Tipo')),
+                ('external_id', models.CharField(help_text='character_id / location_id', max_length=32, verbose_name='ID Externo')),
+                ('object_id', models.CharField(max_length=32, verbose_name='ID HubSpot')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Actualizado')),
+            ],
+            options={
+                'verbose_name': 'Mapeo',
+                'verbose_name_plural': 'Mapeos',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='objectmapping',
+            constraint=models.UniqueConstraint(fields=('portal', 'object_type', 'external_id'), name='unique_object_mapping'),
+        ),
+    ]
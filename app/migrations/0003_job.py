@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_objectmapping'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('contacts', 'Contacts'), ('companies', 'Companies'), ('associations-source', 'Source Associations'), ('associations-mirror', 'Mirror Associations')], max_length=32, verbose_name='Tipo')),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=16, verbose_name='Estado')),
+                ('stage', models.CharField(blank=True, default='', max_length=64, verbose_name='Etapa')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='Procesados')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Errores')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Resultado')),
+                ('worker', models.CharField(blank=True, default='', max_length=128, verbose_name='Worker')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Creado')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Finalizado')),
+                ('heartbeat', models.DateTimeField(blank=True, null=True, verbose_name='Heartbeat')),
+            ],
+            options={
+                'verbose_name': 'Tarea',
+                'verbose_name_plural': 'Tareas',
+                'indexes': [models.Index(fields=['state', 'created'], name='app_job_state_d9fd38_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('process', models.CharField(max_length=128, unique=True, verbose_name='Proceso')),
+                ('data', models.JSONField(default=dict, verbose_name='Datos')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Actualizado')),
+            ],
+            options={
+                'verbose_name': 'Métricas',
+                'verbose_name_plural': 'Métricas',
+            },
+        ),
+    ]
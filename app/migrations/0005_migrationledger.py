@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_metricsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MigrationLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('contacts', 'Contacts'), ('companies', 'Companies')], max_length=16, unique=True, verbose_name='Tipo')),
+                ('state', models.CharField(choices=[('running', 'Running'), ('complete', 'Complete')], default='running', max_length=16, verbose_name='Estado')),
+                ('runs', models.PositiveIntegerField(default=0, verbose_name='Ejecuciones')),
+                ('batches', models.PositiveIntegerField(default=0, verbose_name='Lotes')),
+                ('records', models.PositiveIntegerField(default=0, verbose_name='Registros')),
+                ('skipped', models.PositiveIntegerField(default=0, verbose_name='Omitidos')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Lotes Fallidos')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Actualizado')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Finalizado')),
+            ],
+            options={
+                'verbose_name': 'Migración',
+                'verbose_name_plural': 'Migraciones',
+            },
+        ),
+    ]
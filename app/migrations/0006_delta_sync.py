@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_migrationledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='objectmapping',
+            name='digest',
+            field=models.CharField(blank=True, default='', help_text='Hash of the properties last synced', max_length=64, verbose_name='Huella'),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('contacts', 'Contacts'), ('companies', 'Companies'), ('associations-source', 'Source Associations'), ('associations-mirror', 'Mirror Associations'), ('sync-contacts', 'Contacts Delta Sync'), ('sync-companies', 'Companies Delta Sync')], max_length=32, verbose_name='Tipo'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_delta_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('contacts', 'Contacts'), ('companies', 'Companies')], max_length=16, verbose_name='Tipo')),
+                ('external_id', models.CharField(help_text='character_id / location_id', max_length=32, verbose_name='ID Externo')),
+                ('properties', models.JSONField(default=dict, verbose_name='Propiedades')),
+                ('occurred', models.BigIntegerField(default=0, help_text='occurredAt of the event, epoch milliseconds', verbose_name='Ocurrido')),
+                ('received', models.DateTimeField(auto_now=True, verbose_name='Recibido')),
+                ('claimed', models.CharField(blank=True, default='', max_length=64, verbose_name='Reclamado por')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Reclamado')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+            ],
+            options={
+                'verbose_name': 'Evento',
+                'verbose_name_plural': 'Eventos',
+                'indexes': [models.Index(fields=['object_type', 'claimed', 'received'], name='app_webhook_object__b41ddf_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='webhookevent',
+            constraint=models.UniqueConstraint(fields=('object_type', 'external_id'), name='unique_webhook_event'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_webhook_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='Nombre')),
+                ('owner', models.CharField(max_length=128, verbose_name='Dueño')),
+                ('expires', models.DateTimeField(verbose_name='Expira')),
+            ],
+            options={
+                'verbose_name': 'Bloqueo',
+                'verbose_name_plural': 'Bloqueos',
+            },
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='scheduled',
+            field=models.DateTimeField(blank=True, help_text='Not run before this time', null=True, verbose_name='Programado'),
+        ),
+    ]
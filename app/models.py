@@ -9,4 +9,146 @@ class Account(AbstractUser):
     class Meta:
         indexes = [models.Index(fields=['username']),]
         verbose_name = _("Usuario")
-        verbose_name_plural = _("Usuarios")
\ No newline at end of file
+        verbose_name_plural = _("Usuarios")
+
+class ObjectMapping(models.Model):
+    PORTALS = (
+        ('source', _("Source")),
+        ('mirror', _("Mirror")),
+    )
+    OBJECT_TYPES = (
+        ('contacts', _("Contacts")),
+        ('companies', _("Companies")),
+    )
+
+    portal = models.CharField(_("Portal"), max_length=16, choices=PORTALS)
+    object_type = models.CharField(_("Tipo"), max_length=16, choices=OBJECT_TYPES)
+    external_id = models.CharField(_("ID Externo"), max_length=32, help_text=_("character_id / location_id"))
+    object_id = models.CharField(_("ID HubSpot"), max_length=32)
+    digest = models.CharField(_("Huella"), max_length=64, blank=True, default='', help_text=_("Hash of the properties last synced"))
+    updated = models.DateTimeField(_("Actualizado"), auto_now=True)
+
+    def __str__(self):
+        return "{} {} {} -> {}".format(self.portal, self.object_type, self.external_id, self.object_id)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['portal', 'object_type', 'external_id'], name='unique_object_mapping'),
+        ]
+        verbose_name = _("Mapeo")
+        verbose_name_plural = _("Mapeos")
+
+
+class Job(models.Model):
+    KINDS = (
+        ('contacts', _("Contacts")),
+        ('companies', _("Companies")),
+        ('associations-source', _("Source Associations")),
+        ('associations-mirror', _("Mirror Associations")),
+        ('sync-contacts', _("Contacts Delta Sync")),
+        ('sync-companies', _("Companies Delta Sync")),
+    )
+    STATES = (
+        ('queued', _("Queued")),
+        ('running', _("Running")),
+        ('done', _("Done")),
+        ('failed', _("Failed")),
+    )
+
+    kind = models.CharField(_("Tipo"), max_length=32, choices=KINDS)
+    state = models.CharField(_("Estado"), max_length=16, choices=STATES, default='queued')
+    stage = models.CharField(_("Etapa"), max_length=64, blank=True, default='')
+    processed = models.PositiveIntegerField(_("Procesados"), default=0)
+    errors = models.JSONField(_("Errores"), default=list, blank=True)
+    result = models.JSONField(_("Resultado"), null=True, blank=True)
+    worker = models.CharField(_("Worker"), max_length=128, blank=True, default='')
+    created = models.DateTimeField(_("Creado"), auto_now_add=True)
+    started = models.DateTimeField(_("Iniciado"), null=True, blank=True)
+    finished = models.DateTimeField(_("Finalizado"), null=True, blank=True)
+    heartbeat = models.DateTimeField(_("Heartbeat"), null=True, blank=True)
+    scheduled = models.DateTimeField(_("Programado"), null=True, blank=True, help_text=_("Not run before this time"))
+
+    def __str__(self):
+        return "{} #{} ({})".format(self.kind, self.pk, self.state)
+
+    class Meta:
+        indexes = [models.Index(fields=['state', 'created']),]
+        verbose_name = _("Tarea")
+        verbose_name_plural = _("Tareas")
+
+
+class MetricSnapshot(models.Model):
+    process = models.CharField(_("Proceso"), max_length=128, unique=True)
+    data = models.JSONField(_("Datos"), default=dict)
+    updated = models.DateTimeField(_("Actualizado"), auto_now=True)
+
+    def __str__(self):
+        return self.process
+
+    class Meta:
+        verbose_name = _("Métricas")
+        verbose_name_plural = _("Métricas")
+
+
+class MigrationLedger(models.Model):
+    KINDS = (
+        ('contacts', _("Contacts")),
+        ('companies', _("Companies")),
+    )
+    STATES = (
+        ('running', _("Running")),
+        ('complete', _("Complete")),
+    )
+
+    kind = models.CharField(_("Tipo"), max_length=16, choices=KINDS, unique=True)
+    state = models.CharField(_("Estado"), max_length=16, choices=STATES, default='running')
+    runs = models.PositiveIntegerField(_("Ejecuciones"), default=0)
+    batches = models.PositiveIntegerField(_("Lotes"), default=0)
+    records = models.PositiveIntegerField(_("Registros"), default=0)
+    skipped = models.PositiveIntegerField(_("Omitidos"), default=0)
+    failed = models.PositiveIntegerField(_("Lotes Fallidos"), default=0)
+    started = models.DateTimeField(_("Iniciado"), null=True, blank=True)
+    updated = models.DateTimeField(_("Actualizado"), auto_now=True)
+    finished = models.DateTimeField(_("Finalizado"), null=True, blank=True)
+
+    def __str__(self):
+        return "{} ({}, {} records)".format(self.kind, self.state, self.records)
+
+    class Meta:
+        verbose_name = _("Migración")
+        verbose_name_plural = _("Migraciones")
+
+
+class WebhookEvent(models.Model):
+    object_type = models.CharField(_("Tipo"), max_length=16, choices=ObjectMapping.OBJECT_TYPES)
+    external_id = models.CharField(_("ID Externo"), max_length=32, help_text=_("character_id / location_id"))
+    properties = models.JSONField(_("Propiedades"), default=dict)
+    occurred = models.BigIntegerField(_("Ocurrido"), default=0, help_text=_("occurredAt of the event, epoch milliseconds"))
+    received = models.DateTimeField(_("Recibido"), auto_now=True)
+    claimed = models.CharField(_("Reclamado por"), max_length=64, blank=True, default='')
+    claimed_at = models.DateTimeField(_("Reclamado"), null=True, blank=True)
+    attempts = models.PositiveIntegerField(_("Intentos"), default=0)
+
+    def __str__(self):
+        return "{} {}".format(self.object_type, self.external_id)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['object_type', 'external_id'], name='unique_webhook_event'),
+        ]
+        indexes = [models.Index(fields=['object_type', 'claimed', 'received']),]
+        verbose_name = _("Evento")
+        verbose_name_plural = _("Eventos")
+
+
+class Lock(models.Model):
+    name = models.CharField(_("Nombre"), max_length=64, unique=True)
+    owner = models.CharField(_("Dueño"), max_length=128)
+    expires = models.DateTimeField(_("Expira"))
+
+    def __str__(self):
+        return "{} ({})".format(self.name, self.owner)
+
+    class Meta:
+        verbose_name = _("Bloqueo")
+        verbose_name_plural = _("Bloqueos")
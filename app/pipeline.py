@@ -0,0 +1,112 @@
+from app.crawler import iter_pages
+from app.serializers import location_id
+from app.metrics import metrics
+
+
+def stream_characters(get_page, predicate, workers=1, retries=3):
+    """
+    Yields the characters of every RAM API page accepted by `predicate`, as pages arrive.
+
+    :param get_page: Callable returning the RAM API payload of a page number.
+    :type get_page: callable
+    :param predicate: Callable deciding whether a character is kept.
+    :type predicate: callable
+    :return: Generator of characters.
+    :rtype: generator
+    """
+    for data in iter_pages(get_page, workers=workers, retries=retries):
+        with metrics.stage('prime_filter'):
+            kept = [character for character in data['results'] if predicate(character)]
+        yield from kept
+
+
+def stream_locations(characters, get_locations, size=100):
+    """
+    Yields the locations of a stream of characters, each location once.
+
+    New location ids are fetched in chunks of `size` as soon as enough of them are
+    known, so locations flow while characters are still being crawled.
+
+    :param characters: Iterable of characters.
+    :type characters: iterable
+    :param get_locations: Callable returning the locations of a list of ids.
+    :type get_locations: callable
+    :param size: Number of location ids fetched per call.
+    :type size: int
+    :return: Generator of locations.
+    :rtype: generator
+    """
+    seen, pending = set(), []
+    for character in characters:
+        location_id = location_id_from_url(character.get('location', {}).get('url', ''))
+        if location_id is None or location_id in seen:
+            continue
+        seen.add(location_id)
+        pending.append(location_id)
+        if len(pending) >= size:
+            yield from get_locations(pending)
+            pending = []
+    if pending:
+        yield from get_locations(pending)
+
+
+def location_id_from_url(url):
+    """
+    Extracts the trailing numeric id of a RAM API url.
+
+    :return: Location id, None when the url has none.
+    :rtype: int or None
+    """
+    value = location_id(url or '')
+    return value if value != '' else None
+
+
+def serialize_batches(records, serializer_class, size=100):
+    """
+    Groups a stream of records into HubSpot batch inputs of at most `size` records.
+
+    :param records: Iterable of RAM API records.
+    :type records: iterable
+    :param serializer_class: Serializer producing the HubSpot properties of a record, its
+        transform() fast path is used when it has one.
+    :type serializer_class: rest_framework.serializers.Serializer
+    :param size: Records per batch.
+    :type size: int
+    :return: Generator of lists of {"properties": ...} inputs.
+    :rtype: generator
+    """
+    convert = getattr(serializer_class, 'transform', None) or (lambda batch: serializer_class(batch, many=True).data)
+
+    def transform(batch):
+        with metrics.stage('serialize'):
+            return [{"properties": item} for item in convert(batch)]
+
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield transform(batch)
+            batch = []
+    if batch:
+        yield transform(batch)
+
+
+def chunked(items, size):
+    """
+    Groups a stream into lists of at most `size` items, consuming it lazily.
+
+    :param items: Iterable of items.
+    :type items: iterable
+    :param size: Items per list.
+    :type size: int
+    :return: Generator of lists.
+    :rtype: generator
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -1,6 +1,42 @@
 import re
 from rest_framework import serializers
 
+LOCATION_ID = re.compile(r'/(\d+)$')
+
+
+def split_name(full_name):
+    """
+    Splits a full name into first name and last name.
+
+    :param full_name: Full name, e.g. 'Rick Sanchez'.
+    :type full_name: str
+    :return: Tuple with the first name and the rest of the name.
+    :rtype: tuple
+    """
+    names = full_name.split() if full_name else []
+    if not names:
+        return '', ''
+    return names[0], ' '.join(names[1:])
+
+
+def location_id(url):
+    """
+    Extracts the location ID from a RAM API location url.
+
+    :return: Location ID, '' when the url has none.
+    :rtype: int or str
+    """
+    match = LOCATION_ID.search(url)
+    return int(match.group(1)) if match else ''
+
+
+def _int(value):
+    return None if value is None else int(value)
+
+
+def _str(value):
+    return None if value is None else str(value)
+
 class CharacterSerializer(serializers.Serializer):
     character_id = serializers.IntegerField(source='id')
     firstname = serializers.SerializerMethodField()
@@ -19,11 +55,7 @@ class CharacterSerializer(serializers.Serializer):
         :return: Extracted first name.
         :rtype: str
         """
-        full_name = obj.get('name', '')
-        if full_name:
-            names = full_name.split()
-            return names[0] if names else ''
-        return ''
+        return split_name(obj.get('name', ''))[0]
 
     def get_lastname(self, obj):
         """
@@ -34,11 +66,7 @@ class CharacterSerializer(serializers.Serializer):
         :return: Extracted last name.
         :rtype: str
         """
-        full_name = obj.get('name', '')
-        if full_name:
-            names = full_name.split()
-            return ' '.join(names[1:]) if len(names) > 1 else ''
-        return ''
+        return split_name(obj.get('name', ''))[1]
 
     def get_location_id(self, obj):
         """
@@ -49,8 +77,32 @@ class CharacterSerializer(serializers.Serializer):
         :return: Extracted location ID.
         :rtype: int or str (in case ID is not found)
         """
-        location_id = re.search(r'/(\d+)$', obj.get('location', {}).get('url', ''))
-        return int(location_id.group(1)) if location_id else ''
+        return location_id(obj.get('location', {}).get('url', ''))
+
+    @staticmethod
+    def transform(objs):
+        """
+        Fast path producing the same properties as CharacterSerializer(objs, many=True).data
+        without going through the DRF field machinery.
+
+        :param objs: Characters from the RAM API.
+        :type objs: list
+        :return: List of HubSpot contact properties.
+        :rtype: list
+        """
+        data = []
+        for obj in objs:
+            firstname, lastname = split_name(obj.get('name', ''))
+            data.append({
+                'character_id': _int(obj['id']),
+                'firstname': firstname,
+                'lastname': lastname,
+                'status_character': _str(obj['status']),
+                'character_species': _str(obj['species']),
+                'character_gender': _str(obj['gender']),
+                'location_id': location_id(obj.get('location', {}).get('url', '')),
+            })
+        return data
 
 
 class LocationSerializer(serializers.Serializer):
@@ -59,3 +111,25 @@ class LocationSerializer(serializers.Serializer):
     location_type = serializers.CharField(source='type')
     dimension = serializers.CharField()
     creation_date = serializers.CharField(source='created')
+
+    @staticmethod
+    def transform(objs):
+        """
+        Fast path producing the same properties as LocationSerializer(objs, many=True).data
+        without going through the DRF field machinery.
+
+        :param objs: Locations from the RAM API.
+        :type objs: list
+        :return: List of HubSpot company properties.
+        :rtype: list
+        """
+        return [
+            {
+                'location_id': _int(obj['id']),
+                'name': _str(obj['name']),
+                'location_type': _str(obj['type']),
+                'dimension': _str(obj['dimension']),
+                'creation_date': _str(obj['created']),
+            }
+            for obj in objs
+        ]
@@ -0,0 +1,210 @@
+import threading, time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from hubspot.crm.contacts import PublicObjectSearchRequest
+
+from app.clients import get_client
+from app.mapping import portal_name
+from app.metrics import metrics
+
+# Property holding the last modification of a record, per object type.
+MODIFIED_PROPERTIES = {
+    'contacts': 'lastmodifieddate',
+    'companies': 'hs_lastmodifieddate',
+}
+
+# HubSpot search pages at most 200 records and 10000 results per query.
+SEARCH_LIMIT, SEARCH_MAX = 200, 10000
+
+
+def _millis(value):
+    """
+    Epoch milliseconds of a datetime or ISO 8601 string returned by HubSpot, 0 when missing.
+    """
+    if not value:
+        return 0
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+class Snapshot:
+    """
+    location_id of every record of an object type in a portal, as last read from HubSpot.
+
+    :param watermark: Latest modification seen, epoch milliseconds.
+    :type watermark: int
+    """
+    def __init__(self):
+        self.records = {}
+        self.watermark = 0
+        self.loaded = 0.0
+
+    def apply(self, object_id, location_id, modified=0):
+        self.records[str(object_id)] = location_id
+        self.watermark = max(self.watermark, modified)
+
+
+class SnapshotStore:
+    """
+    Per-process snapshots of the contacts and companies of each portal, read by the
+    association runs instead of paging HubSpot every time.
+
+    A snapshot is read in full when it is missing or older than `ttl` seconds. Otherwise
+    it is caught up with a search of the records modified since its watermark (minus
+    `overlap` seconds, the search index lags behind the writes), which costs a single call
+    when nothing changed, wherever the change was made. Writes of the process update the
+    snapshots in place through apply(). Once the snapshots hold more than `max_records`
+    records the least recently used ones are dropped.
+
+    Records deleted in HubSpot are only noticed by the next full read.
+
+    :param ttl: Seconds between two full reads of a snapshot, 0 disables the snapshots.
+    :type ttl: int
+    :param max_records: Records kept at most, across snapshots.
+    :type max_records: int
+    :param overlap: Seconds searched again before the watermark.
+    :type overlap: int
+    """
+    def __init__(self, ttl=3600, max_records=200000, overlap=60):
+        self.ttl = ttl
+        self.max_records = max_records
+        self.overlap = overlap
+        self.lock = threading.RLock()
+        self.snapshots = OrderedDict()
+        self.locks = {}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _key_lock(self, key):
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def locations(self, access_token, object_type, keepalive=None):
+        """
+        Returns the (object_id, location_id) pairs of every record of an object type.
+
+        :param access_token: HubSpot access token of the portal.
+        :type access_token: str
+        :param object_type: 'contacts' or 'companies'.
+        :type object_type: str
+        :param keepalive: Callable run before every page read from HubSpot, e.g. refreshing a lock.
+        :type keepalive: callable or None
+        :rtype: list
+        """
+        key = (portal_name(access_token), object_type)
+        api = getattr(get_client(access_token).crm, object_type)
+        with self._key_lock(key):
+            with self.lock:
+                snapshot = self.snapshots.get(key)
+            if snapshot is not None and time.monotonic() - snapshot.loaded <= self.ttl:
+                snapshot, mode = self._catch_up(api, object_type, snapshot, keepalive), 'incremental'
+            else:
+                snapshot = None
+            if snapshot is None:
+                snapshot, mode = self._read(api, object_type, keepalive), 'full'
+            metrics.inc('snapshot_reads_total', object_type=object_type, mode=mode)
+            with self.lock:
+                pairs = list(snapshot.records.items())
+                if self.enabled:
+                    self.snapshots[key] = snapshot
+                    self.snapshots.move_to_end(key)
+                    self._evict()
+            return pairs
+
+    def _read(self, api, object_type, keepalive=None):
+        snapshot, after = Snapshot(), None
+        snapshot.loaded = time.monotonic()
+        while True:
+            if keepalive is not None:
+                keepalive()
+            with metrics.stage('hubspot_read'):
+                response = api.basic_api.get_page(properties=['location_id'], limit=100, archived=False, after=after)
+            for result in response.results:
+                snapshot.apply(result.id, result.properties.get('location_id'), _millis(result.updated_at))
+            if response.paging and response.paging.next:
+                after = response.paging.next.after
+            else:
+                return snapshot
+
+    def _catch_up(self, api, object_type, snapshot, keepalive=None):
+        """
+        Applies the records modified since the watermark to a copy of the snapshot, None
+        when too many changed to be searched.
+        """
+        modified = MODIFIED_PROPERTIES[object_type]
+        since = max(snapshot.watermark - self.overlap * 1000, 0)
+        updated = Snapshot()
+        with self.lock:
+            updated.records, updated.watermark, updated.loaded = dict(snapshot.records), snapshot.watermark, snapshot.loaded
+        after = None
+        while True:
+            request = PublicObjectSearchRequest(
+                filter_groups=[{"filters": [{"propertyName": modified, "operator": "GTE", "value": since}]}],
+                sorts=[{"propertyName": modified, "direction": "ASCENDING"}],
+                properties=['location_id', modified], limit=SEARCH_LIMIT, after=after
+            )
+            if keepalive is not None:
+                keepalive()
+            with metrics.stage('hubspot_read'):
+                response = api.search_api.do_search(public_object_search_request=request)
+            if response.total > SEARCH_MAX:
+                return None
+            for result in response.results:
+                updated.apply(result.id, result.properties.get('location_id'), _millis(result.updated_at))
+            if response.paging and response.paging.next:
+                after = response.paging.next.after
+            else:
+                return updated
+
+    def _evict(self):
+        total = sum(len(snapshot.records) for snapshot in self.snapshots.values())
+        while total > self.max_records and len(self.snapshots) > 1:
+            _, snapshot = self.snapshots.popitem(last=False)
+            total -= len(snapshot.records)
+        if total > self.max_records:
+            self.snapshots.clear()
+
+    def apply(self, access_token, object_type, records):
+        """
+        Updates a loaded snapshot in place with records written by the process.
+
+        :param records: Iterable of (object_id, properties) pairs.
+        :type records: iterable
+        """
+        try:
+            key = (portal_name(access_token), object_type)
+        except ValueError:
+            return
+        with self.lock:
+            snapshot = self.snapshots.get(key)
+            if snapshot is None:
+                return
+            for object_id, properties in records:
+                if 'location_id' in (properties or {}):
+                    snapshot.records[str(object_id)] = properties['location_id']
+
+    def invalidate(self):
+        with self.lock:
+            self.snapshots.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'ttl': self.ttl,
+                'max_records': self.max_records,
+                'snapshots': {'{}:{}'.format(*key): len(snapshot.records) for key, snapshot in self.snapshots.items()},
+            }
+
+
+snapshots = SnapshotStore(
+    ttl=settings.HUBSPOT_SNAPSHOT_TTL,
+    max_records=settings.HUBSPOT_SNAPSHOT_MAX_RECORDS,
+    overlap=settings.HUBSPOT_SNAPSHOT_OVERLAP
+)
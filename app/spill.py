@@ -0,0 +1,129 @@
+import os, sqlite3, tempfile
+from itertools import islice
+
+from app.associations import sort_rows, merge_join
+
+# Rows written per statement while spilling a stream.
+SPILL_CHUNK = 1000
+
+
+class SpillStore:
+    """
+    Temporary SQLite file holding the (location_id, object_id) pairs of a portal, so
+    the association join runs in constant memory whatever the size of the portal.
+
+    Contacts and companies are appended while they are paged, indexed once complete and
+    read back sorted by location for app.associations.merge_join. The pairs to create and
+    to archive are spilled as well and streamed to the uploads. Every method opens its
+    own connection, so the two object types can be spilled from different threads.
+
+    :param directory: Directory of the file, the system temporary directory by default.
+    :type directory: str or None
+    """
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(prefix='associations-', suffix='.sqlite3', dir=directory or None)
+        os.close(fd)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode = WAL")
+            for table in ('contacts', 'companies'):
+                db.execute("CREATE TABLE {} (location TEXT, kind INTEGER, number INTEGER, id TEXT)".format(table))
+            for table in ('creates', 'archives'):
+                db.execute("CREATE TABLE {} (contact TEXT, company TEXT)".format(table))
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=60)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def spill(self, table, pairs):
+        """
+        Appends a stream of (object_id, location_id) pairs to 'contacts' or 'companies'.
+
+        :return: Number of rows written.
+        :rtype: int
+        """
+        rows, count = sort_rows(pairs), 0
+        with self._connect() as db:
+            while True:
+                chunk = list(islice(rows, SPILL_CHUNK))
+                if not chunk:
+                    break
+                db.executemany("INSERT INTO {} VALUES (?, ?, ?, ?)".format(table), chunk)
+                db.commit()
+                count += len(chunk)
+        return count
+
+    def index(self):
+        """
+        Indexes the spilled object types, once both are complete.
+        """
+        with self._connect() as db:
+            db.execute("CREATE INDEX contacts_location ON contacts (location, kind, number, id)")
+            db.execute("CREATE INDEX companies_location ON companies (location, kind, number, id)")
+            db.execute("CREATE INDEX companies_id ON companies (id)")
+
+    def join(self):
+        """
+        Yields (contact_id, company_id) for every contact, company_id None when no company
+        shares its location, see app.associations.merge_join.
+        """
+        contacts, companies = self._connect(), self._connect()
+        try:
+            yield from merge_join(
+                contacts.execute("SELECT location, id FROM contacts ORDER BY location, kind, number, id"),
+                companies.execute("SELECT location, id FROM companies WHERE location IS NOT NULL ORDER BY location, kind, number, id"),
+            )
+        finally:
+            contacts.close()
+            companies.close()
+
+    def located(self, company_ids):
+        """
+        Returns the companies of `company_ids` that have a location_id.
+
+        :rtype: set
+        """
+        company_ids = list(company_ids)
+        found = set()
+        with self._connect() as db:
+            for i in range(0, len(company_ids), 500):
+                chunk = company_ids[i:i+500]
+                found.update(row[0] for row in db.execute(
+                    "SELECT id FROM companies WHERE location IS NOT NULL AND id IN ({})".format(','.join('?' * len(chunk))), chunk
+                ))
+        return found
+
+    def add(self, table, pairs):
+        """
+        Appends (contact_id, company_id) pairs to 'creates' or 'archives'.
+        """
+        with self._connect() as db:
+            db.executemany("INSERT INTO {} VALUES (?, ?)".format(table), pairs)
+
+    def count(self, table):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM {}".format(table)).fetchone()[0]
+
+    def rows(self, table):
+        """
+        Streams the (contact_id, company_id) pairs of 'creates' or 'archives', grouped by contact.
+        """
+        db = self._connect()
+        try:
+            yield from db.execute("SELECT contact, company FROM {} ORDER BY contact".format(table))
+        finally:
+            db.close()
+
+    def close(self):
+        """
+        Deletes the file.
+        """
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
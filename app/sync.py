@@ -0,0 +1,63 @@
+import hashlib, json
+
+from app.models import ObjectMapping
+from app.mapping import EXTERNAL_PROPERTIES, portal_name
+
+
+def digest(properties):
+    """
+    Hash of the HubSpot properties of a record, independent of the order of the keys.
+
+    :param properties: Serialized properties, as sent to HubSpot.
+    :type properties: dict
+    :rtype: str
+    """
+    data = json.dumps(properties, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def digests(inputs, object_type):
+    """
+    Hashes of a batch of {"properties": ...} inputs per external id.
+
+    :rtype: dict
+    """
+    prop = EXTERNAL_PROPERTIES[object_type]
+    return {str(item['properties'][prop]): digest(item['properties']) for item in inputs}
+
+
+def plan(access_token, object_type, batches):
+    """
+    Compares serialized records with the hashes last synced to a portal.
+
+    Records missing from the local index are new, records whose hash differs from the
+    stored one have changed; records synced before hashes were stored have no hash and
+    count as changed once.
+
+    :param access_token: HubSpot access token of the portal.
+    :type access_token: str
+    :param object_type: 'contacts' or 'companies'.
+    :type object_type: str
+    :param batches: Iterable of lists of {"properties": ...} inputs, see app.pipeline.serialize_batches.
+    :type batches: iterable
+    :return: Inputs to create, inputs to update (with their HubSpot "id") and the number of unchanged records.
+    :rtype: tuple of (list, list, int)
+    """
+    prop = EXTERNAL_PROPERTIES[object_type]
+    synced = {
+        external_id: (object_id, stored)
+        for external_id, object_id, stored in ObjectMapping.objects.filter(
+            portal=portal_name(access_token), object_type=object_type
+        ).values_list('external_id', 'object_id', 'digest')
+    }
+    creates, updates, unchanged = [], [], 0
+    for batch in batches:
+        for item in batch:
+            known = synced.get(str(item['properties'][prop]))
+            if known is None:
+                creates.append(item)
+            elif known[1] != digest(item['properties']):
+                updates.append({"id": known[0], "properties": item['properties']})
+            else:
+                unchanged += 1
+    return creates, updates, unchanged
@@ -0,0 +1,302 @@
+import collections, io, json, logging, os, random, tempfile, threading, time
+from types import SimpleNamespace
+from unittest import mock
+
+import ramapi
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+
+import app.cache as ramcache
+from app.associations import archive_inputs, diff_associations, join_associations, located_companies
+from app.crawler import fetch_results, iter_pages
+from app.logs import QueueFileHandler
+from app.mapping import remember
+from app.serializers import CharacterSerializer, LocationSerializer
+from app.spill import SpillStore
+from app.sync import digests
+from app.views import requestRM, syncContacts
+from benchmarks.stub_ramapi import synthetic_characters, synthetic_locations
+
+EDGE_CHARACTERS = [
+    {'id': 1, 'name': 'Rick Sanchez', 'status': 'Alive', 'species': 'Human', 'gender': 'Male',
+     'location': {'name': 'Earth', 'url': 'https://rickandmortyapi.com/api/location/3'}},
+    {'id': 2, 'name': '  Morty   Smith  Jr ', 'status': 'Alive', 'species': 'Human', 'gender': 'Male',
+     'location': {'name': 'Earth', 'url': 'https://rickandmortyapi.com/api/location/20'}},
+    {'id': '3', 'name': 'Summer', 'status': None, 'species': 'Human', 'gender': 'Female',
+     'location': {'name': 'unknown', 'url': ''}},
+    {'id': 5, 'name': '', 'status': 'Dead', 'species': 'Alien', 'gender': 'unknown', 'location': {}},
+    {'id': 7, 'name': None, 'status': 'unknown', 'species': 'Robot', 'gender': 'Genderless'},
+    {'id': 11, 'name': 'Albert Einstein', 'status': 'Dead', 'species': 'Human', 'gender': 'Male',
+     'location': {'name': 'Earth', 'url': 'https://rickandmortyapi.com/api/location/20/'}},
+    {'id': 13, 'name': 'Señor Ñoño', 'status': 'Alive', 'species': 7, 'gender': 'Male',
+     'location': {'name': 'Earth', 'url': 'https://rickandmortyapi.com/api/location/abc'}},
+]
+
+EDGE_LOCATIONS = [
+    {'id': 1, 'name': 'Earth (C-137)', 'type': 'Planet', 'dimension': 'Dimension C-137', 'created': '2017-11-10T12:42:04.162Z'},
+    {'id': '2', 'name': 'Abadango', 'type': 'Cluster', 'dimension': 'unknown', 'created': '2017-11-10T13:06:38.182Z'},
+    {'id': 3, 'name': '', 'type': None, 'dimension': '', 'created': None},
+]
+
+
+class SerializerParityTests(SimpleTestCase):
+    """
+    The transform fast paths must give exactly what the DRF serializers give: same keys,
+    in the same order, with values of the same type.
+    """
+    def assertParity(self, serializer_class, records):
+        drf = [dict(item) for item in serializer_class(records, many=True).data]
+        fast = serializer_class.transform(records)
+        self.assertEqual(len(drf), len(fast))
+        for expected, got in zip(drf, fast):
+            with self.subTest(record=expected):
+                self.assertEqual(expected, got)
+                self.assertEqual(list(expected), list(got))
+                self.assertEqual([type(v) for v in expected.values()], [type(v) for v in got.values()])
+
+    def test_characters(self):
+        self.assertParity(CharacterSerializer, EDGE_CHARACTERS + synthetic_characters(1000, 126))
+
+    def test_locations(self):
+        self.assertParity(LocationSerializer, EDGE_LOCATIONS + list(synthetic_locations(1000).values()))
+
+
+class FakePages:
+    """
+    In-memory paginated RAM API resource: `count` results split in pages of 20, each page
+    answered after a random delay and failing the first `failures[page]` times.
+    """
+    def __init__(self, count, failures=None, delay=0.0):
+        self.results = [{'id': i} for i in range(1, count + 1)]
+        self.pages = (count + 19) // 20
+        self.failures = collections.Counter(failures or {})
+        self.delay = delay
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, page):
+        with self.lock:
+            self.calls[page] += 1
+            failing = self.calls[page] <= self.failures[page]
+        time.sleep(random.Random(page).random() * self.delay)
+        if failing:
+            return {'error': 'stub failure'}
+        return {
+            'info': {'count': len(self.results), 'pages': self.pages, 'next': page + 1 if page < self.pages else None},
+            'results': self.results[(page - 1) * 20:page * 20],
+        }
+
+
+class CrawlerTests(SimpleTestCase):
+    """
+    The pages fetched concurrently must be joined in page order, and failed pages retried.
+    """
+    def test_order(self):
+        for workers in (1, 4, 16):
+            with self.subTest(workers=workers):
+                get_page = FakePages(826, delay=0.01)
+                self.assertEqual([item['id'] for item in fetch_results(get_page, workers=workers)], list(range(1, 827)))
+                self.assertEqual(set(get_page.calls.values()), {1})
+
+    def test_retries(self):
+        get_page = FakePages(100, failures={1: 1, 3: 2})
+        self.assertEqual(len(fetch_results(get_page, workers=4, retries=2, backoff=0)), 100)
+        self.assertEqual(get_page.calls[3], 3)
+
+    def test_retries_exhausted(self):
+        get_page = FakePages(100, failures={3: 3})
+        with self.assertRaises(ValueError):
+            fetch_results(get_page, workers=4, retries=2, backoff=0)
+
+    def test_pages_in_flight(self):
+        get_page = FakePages(400)
+        for page, data in enumerate(iter_pages(get_page, workers=2, pending=1), 1):
+            self.assertEqual(data['results'][0]['id'], (page - 1) * 20 + 1)
+            self.assertLessEqual(max(get_page.calls), page + 3)
+            time.sleep(0.005)
+        self.assertEqual(page, 20)
+
+
+class AssociationsDiffTests(SimpleTestCase):
+    """
+    The associations reconciliation only writes what changed: it never archives what it
+    could not read, nor the associations with companies the migration did not make.
+    """
+    contacts = [('1', '10'), ('2', '20'), ('3', '10'), ('4', None)]
+    companies = [('101', '10'), ('102', '20'), ('103', None), ('104', '')]
+
+    def setUp(self):
+        self.pairs = join_associations(self.contacts, self.companies)
+        self.located = located_companies(self.companies)
+
+    def test_steady_state(self):
+        existing = {'1': {'101'}, '2': {'102'}, '3': {'101'}, '4': set()}
+        self.assertEqual(diff_associations(self.pairs, existing, self.located), ([], []))
+
+        client = mock.MagicMock()
+        with mock.patch('app.views.get_client', return_value=client):
+            self.assertEqual(requestRM().pushAssociations('token', [], []), [])
+        client.crm.associations.v4.batch_api.create_default.assert_not_called()
+        client.crm.associations.v4.batch_api.archive.assert_not_called()
+
+    def test_failed_read(self):
+        existing = {'1': {'101'}, '3': {'102'}, '4': set()}
+        missing, stale = diff_associations(self.pairs, existing, self.located)
+        self.assertEqual(missing, [('2', '102'), ('3', '101')])
+        self.assertEqual(stale, [('3', '102')])
+
+    def test_companies_without_location(self):
+        self.assertEqual(self.located, {'101', '102'})
+        existing = {'1': {'101', '103'}, '2': {'102', '104'}, '3': {'101'}, '4': {'103', '101'}}
+        missing, stale = diff_associations(self.pairs, existing, self.located)
+        self.assertEqual((missing, stale), ([], [('4', '101')]))
+        self.assertEqual(archive_inputs([('4', '101'), ('1', '102'), ('4', '102')]), [
+            {'from': {'id': '4'}, 'to': [{'id': '101'}, {'id': '102'}]},
+            {'from': {'id': '1'}, 'to': [{'id': '102'}]},
+        ])
+
+    def test_associations_over_several_pages(self):
+        def result(contact_id, company_ids, more=False):
+            return SimpleNamespace(
+                _from=SimpleNamespace(id=contact_id),
+                to=[SimpleNamespace(to_object_id=company_id) for company_id in company_ids],
+                paging=SimpleNamespace(next=SimpleNamespace(after='1')) if more else None,
+            )
+
+        client = mock.MagicMock()
+        client.crm.associations.v4.batch_api.get_page.return_value = SimpleNamespace(results=[
+            result('1', ['101']), result('2', ['102', '101'], more=True), result('3', ['102']),
+        ])
+        with mock.patch('app.views.get_client', return_value=client):
+            existing, failed = requestRM().readAssociations('token', ['1', '2', '3', '4'])
+        self.assertEqual((existing, failed), ({'1': {'101'}, '3': {'102'}, '4': set()}, []))
+
+        missing, stale = diff_associations(self.pairs, existing, self.located)
+        self.assertEqual(missing, [('2', '102'), ('3', '101')])
+        self.assertEqual(stale, [('3', '102')])
+
+
+class JoinParityTests(SimpleTestCase):
+    """
+    The on-disk merge join must match exactly what join_associations gives in memory,
+    whatever the order the pages were read in.
+    """
+    contacts = [(1, 10), ('2', ' 10 '), (3, '20'), (4, None), (5, ''), (6, '99'), ('7', 'abc'), ('x8', 20), (9, '1e1')]
+    companies = [('105', 10), (12, '10'), ('9', ' 10'), ('101', '20'), ('100', '20'), ('abc', '20'), (7, None), ('8', ''), ('z1', 'abc'), ('3', 'abc')]
+
+    def assertParity(self, contacts, companies):
+        expected = {(str(contact_id), str(company_id)) for contact_id, company_id in join_associations(contacts, companies)}
+        with SpillStore() as store:
+            store.spill('contacts', contacts)
+            store.spill('companies', companies)
+            store.index()
+            joined = list(store.join())
+        self.assertEqual(len(joined), len(contacts))
+        self.assertEqual({(contact_id, company_id) for contact_id, company_id in joined if company_id is not None}, expected)
+        return expected
+
+    def test_edge_cases(self):
+        pairs = dict(self.assertParity(self.contacts, self.companies))
+        self.assertEqual(pairs, {'1': '9', '2': '9', '3': '100', 'x8': '100', '7': '3'})
+
+    def test_duplicates_are_deterministic(self):
+        expected = self.assertParity(self.contacts, self.companies)
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                companies = list(self.companies)
+                random.Random(seed).shuffle(companies)
+                self.assertEqual(self.assertParity(self.contacts, companies), expected)
+
+    def test_synthetic(self):
+        rng = random.Random(0)
+        locations = [None, ''] + [str(i) for i in range(50)] + ['loc-{}'.format(i) for i in range(5)]
+        contacts = [(i if rng.random() < 0.5 else str(i), rng.choice(locations)) for i in range(1, 2000)]
+        companies = [(rng.choice([rng.randrange(1, 10 ** 6), 'c{}'.format(rng.randrange(10 ** 6))]), rng.choice(locations)) for _ in range(300)]
+        self.assertParity(contacts, companies)
+
+
+class DeltaSyncTests(TestCase):
+    """
+    A delta sync compares what the RAM API serves now, whatever the RAM API cache holds.
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = ramcache.RamCache(os.path.join(directory.name, 'cache.sqlite3'), ttl=86400)
+        patcher = mock.patch.object(ramcache, '_cache', cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.characters = synthetic_characters(40, 5)
+        patcher = mock.patch.object(ramapi.Character, 'get_page', lambda page: {
+            'info': {'count': 40, 'pages': 2, 'next': page + 1 if page < 2 else None},
+            'results': self.characters[(page - 1) * 20:page * 20],
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_changed_character_is_updated(self):
+        creates, updates, unchanged = syncContacts().planDelta()
+        self.assertEqual((updates, unchanged), ([], 0))
+        synced = digests(creates, 'contacts')
+        remember(settings.HUBSOPT_SOURCE_KEY, 'contacts', [(item['properties']['character_id'], 1000 + i) for i, item in enumerate(creates)], synced)
+
+        self.characters[1]['name'] = 'Renamed Smith'
+        creates, updates, unchanged = syncContacts().planDelta()
+        self.assertEqual((creates, unchanged), ([], len(synced) - 1))
+        self.assertEqual([item['properties']['character_id'] for item in updates], [2])
+        self.assertEqual(updates[0]['properties']['firstname'], 'Renamed')
+
+
+class MirrorPayloadTests(SimpleTestCase):
+    """
+    Payloads that are not JSON objects, or lists of them, are rejected before any HubSpot call.
+    """
+    def test_non_object_records(self):
+        for data in ([{'character_id': 1}, 3], ['x'], 'x', 5, None):
+            with self.subTest(data=data), mock.patch('app.views.get_client') as get_client:
+                response = requestRM().mirrorPayload('contacts', data, 'MirrorPayloadTests')
+                self.assertEqual(response.status_code, 400)
+                get_client.assert_not_called()
+
+
+class QueueFileHandlerTests(SimpleTestCase):
+    """
+    Records the handler cannot write are counted and reported, never silently dropped.
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_lost_records_are_reported(self):
+        blocker = os.path.join(self.directory, 'logs')
+        open(blocker, 'w').close()
+        handler = QueueFileHandler(os.path.join(blocker, 'core.log'), flush_interval=0.1)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        record = lambda message: logging.LogRecord('test', logging.ERROR, __file__, 0, message, (), None)
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            handler.emit(record('"a"'))
+            handler.emit(record('"b"'))
+            handler.flush()
+        self.assertIn('Could not write the log file', stderr.getvalue())
+
+        os.remove(blocker)
+        handler.emit(record('{"message": "c"}'))
+        handler.flush()
+        handler.close()
+        with open(os.path.join(blocker, 'core.log')) as f:
+            lines = [json.loads(line)['message'] for line in f]
+        self.assertEqual(lines[0], 'c')
+        self.assertTrue(lines[1].startswith('2 log records lost'), lines)
+
+    def test_rotation_rotated_by_another_process(self):
+        filename = os.path.join(self.directory, 'core.log')
+        handler = QueueFileHandler(filename, max_bytes=10, backup_count=2)
+        self.assertTrue(handler._write(['0123456789']))
+        os.replace(filename, filename + '.1')
+        self.assertTrue(handler._write(['abcdefghij']))
+        with open(filename) as f:
+            self.assertEqual(f.read(), 'abcdefghij\n')
+        with open(filename + '.1') as f:
+            self.assertEqual(f.read(), '0123456789\n')
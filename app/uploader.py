@@ -0,0 +1,344 @@
+import json, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from app.metrics import metrics
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Failures hinting at a batch too large for the endpoint (payload, timeouts, server errors), None for network errors.
+SHRINK_STATUSES = {None, 408, 413, 500, 502, 503, 504}
+
+# Failures of the whole portal or token, which no smaller batch would avoid.
+NO_SPLIT_STATUSES = {401, 403, 429}
+
+
+class TokenBucket:
+    """
+    Token bucket allowing at most `limit` calls in any rolling window of `period` seconds.
+
+    The bucket holds up to `burst` tokens and refills at (limit - burst) / period, so a
+    full burst followed by a steady refill never goes over the limit of the window.
+
+    :param limit: Calls allowed per period.
+    :type limit: int
+    :param period: Length of the period in seconds.
+    :type period: float
+    :param burst: Calls allowed at once, a tenth of the limit by default.
+    :type burst: int or None
+    """
+    def __init__(self, limit=100, period=10.0, burst=None):
+        self.limit = limit
+        self.period = period
+        self.capacity = burst if burst is not None else max(1, limit // 10)
+        self.rate = max(limit - self.capacity, 1) / period
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a call is allowed.
+
+        :return: Seconds spent waiting.
+        :rtype: float
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+_buckets, _buckets_lock = {}, threading.Lock()
+
+def get_bucket(access_token):
+    """
+    Returns the process-wide token bucket of an access token, sized from settings.
+    """
+    with _buckets_lock:
+        bucket = _buckets.get(access_token)
+        if bucket is None:
+            bucket = _buckets[access_token] = TokenBucket(settings.HUBSPOT_RATE_LIMIT, settings.HUBSPOT_RATE_PERIOD)
+        return bucket
+
+
+class BatchSizer:
+    """
+    Size of the batches sent to one HubSpot endpoint, adapted from the calls made to it.
+
+    Starts at `maximum`, the API maximum. Every call failing with a status of
+    SHRINK_STATUSES halves the size; a call slower than `target` seconds brings it down
+    to the size that call would have needed to take `target` seconds; a successful call
+    of a full batch grows it back by a tenth of the maximum (smaller batches, e.g. the
+    halves of a split one, tell nothing about larger ones). The size also keeps the
+    payload, estimated from the average bytes of a record, under `max_bytes`. Rejected
+    records (4xx) and 429 answers do not change it.
+
+    :param maximum: Largest batch.
+    :type maximum: int
+    :param target: Seconds a call should take at most.
+    :type target: float
+    :param max_bytes: Largest payload in bytes.
+    :type max_bytes: int
+    """
+    def __init__(self, maximum=100, target=5.0, max_bytes=1000000):
+        self.maximum = max(maximum, 1)
+        self.target = target
+        self.max_bytes = max_bytes
+        self.current = float(self.maximum)
+        self.record_bytes = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def size(self):
+        with self.lock:
+            return max(int(self.current), 1)
+
+    def resize(self, maximum):
+        """
+        Changes the largest batch, e.g. when a run sets its own batch size.
+        """
+        with self.lock:
+            self.maximum = max(maximum, 1)
+            self.current = min(self.current, self.maximum)
+
+    def observe(self, batch, seconds, status_code=None, ok=True):
+        """
+        Adapts the size from a call sending `batch`, see the class.
+        """
+        if not ok and status_code not in SHRINK_STATUSES:
+            return
+        payload = len(json.dumps(batch, default=str)) / max(len(batch), 1)
+        with self.lock:
+            self.record_bytes = payload if not self.record_bytes else 0.8 * self.record_bytes + 0.2 * payload
+            if not ok:
+                self.current /= 2
+            elif seconds > self.target:
+                self.current = min(self.current, len(batch) * self.target / seconds)
+            elif len(batch) >= int(self.current):
+                self.current += self.maximum / 10
+            self.current = max(1.0, min(self.current, self.maximum, self.max_bytes / max(self.record_bytes, 1.0)))
+
+
+_sizers, _sizers_lock = {}, threading.Lock()
+
+def get_sizer(name, maximum):
+    """
+    Returns the process-wide batch sizer of an endpoint, named after its uploader.
+    """
+    with _sizers_lock:
+        sizer = _sizers.get(name)
+        if sizer is None:
+            sizer = _sizers[name] = BatchSizer(maximum, settings.HUBSPOT_BATCH_TARGET_SECONDS, settings.HUBSPOT_BATCH_MAX_BYTES)
+        elif sizer.maximum != maximum:
+            sizer.resize(maximum)
+        return sizer
+
+
+def resized(batches, size):
+    """
+    Regroups a stream of batches into batches of `size()` items, read again for every batch.
+
+    :param batches: Iterable of batches.
+    :type batches: iterable
+    :param size: Callable returning the size of the next batch.
+    :type size: callable
+    :return: Generator of lists.
+    :rtype: generator
+    """
+    pending = []
+    for batch in batches:
+        pending.extend(batch)
+        while pending and len(pending) >= size():
+            count = size()
+            yield pending[:count]
+            pending = pending[count:]
+    while pending:
+        count = size()
+        yield pending[:count]
+        pending = pending[count:]
+
+
+def retry_after(error):
+    """
+    Reads the Retry-After header of a HubSpot ApiException, in seconds.
+
+    :return: Seconds to wait, None when the header is missing or not numeric.
+    :rtype: float or None
+    """
+    headers = getattr(error, 'headers', None) or {}
+    value = headers.get('Retry-After') if hasattr(headers, 'get') else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class BatchUploader:
+    """
+    Uploads batches to a HubSpot batch endpoint concurrently.
+
+    Every call takes a token from `bucket` first. Calls answered with 429 or a 5xx are
+    retried after the Retry-After header, or an exponential backoff with jitter when
+    the header is missing. Batches still failing after `retries` are reported instead
+    of stopping the upload.
+
+    With a `sizer` the batches are regrouped to its current size as they are sent, and
+    every call is reported to it. With `split`, a batch rejected as a whole (a 4xx other
+    than NO_SPLIT_STATUSES, e.g. one invalid record) is sent again in halves until the
+    records at fault are isolated; only those are reported as rejected. When both halves
+    of a part are rejected with the same error, the cause applies to every record (e.g.
+    an undefined property) and the part is rejected without splitting further, so such a
+    batch costs 3 calls instead of one per record.
+
+    :param push: Callable sending a single batch to HubSpot.
+    :type push: callable
+    :param bucket: Token bucket shared by every call to the same portal.
+    :type bucket: TokenBucket or None
+    :param workers: Number of batches uploaded at once.
+    :type workers: int
+    :param retries: Retries per batch.
+    :type retries: int
+    :param backoff: Base backoff in seconds.
+    :type backoff: float
+    :param name: Name of the uploader in the metrics.
+    :type name: str
+    :param sizer: Sizer of the batches of the endpoint.
+    :type sizer: BatchSizer or None
+    :param split: Split the batches rejected as a whole.
+    :type split: bool
+    """
+    def __init__(self, push, bucket=None, workers=4, retries=5, backoff=1.0, name='batch', sizer=None, split=False):
+        self.push = push
+        self.name = name
+        self.bucket = bucket
+        self.workers = max(workers, 1)
+        self.retries = retries
+        self.backoff = backoff
+        self.sizer = sizer
+        self.split = split
+        self.throttled = 0
+
+    def send(self, index, batch):
+        """
+        Sends one batch with rate limiting, retries and, when enabled, splitting.
+
+        :return: Result of the batch with its index, size, attempts, rejected records and error if any.
+        :rtype: dict
+        """
+        attempts, e = self.attempt(batch)
+        rejected, error = 0, None
+        failures = [] if e is None else [(batch, e)]
+        while failures:
+            part, e = failures.pop()
+            if self.splittable(part, e):
+                metrics.inc('upload_splits_total', uploader=self.name, status=e.status)
+                half = len(part) // 2
+                halves = []
+                for piece in (part[:half], part[half:]):
+                    tries, piece_error = self.attempt(piece)
+                    attempts += tries
+                    if piece_error is not None:
+                        halves.append((piece, piece_error))
+                uniform = len(halves) == 2 and all(self.splittable(*failure) for failure in halves) and self.reason(halves[0][1]) == self.reason(halves[1][1])
+                if not uniform:
+                    failures += reversed(halves)
+                    continue
+                e = halves[-1][1]
+            rejected += len(part)
+            error = ' '.join(str(e).split())
+        return {'batch': index, 'size': len(batch), 'attempts': attempts, 'rejected': rejected, 'ok': error is None, 'error': error}
+
+    def splittable(self, part, error):
+        """
+        Whether a failed part is split, see the class.
+        """
+        status_code = getattr(error, 'status', None)
+        return self.split and len(part) > 1 and status_code is not None and 400 <= status_code < 500 and status_code not in NO_SPLIT_STATUSES
+
+    @staticmethod
+    def reason(error):
+        """
+        Body of a HubSpot error, which unlike its text holds no per-response headers.
+        """
+        return getattr(error, 'body', None) or str(error)
+
+    def attempt(self, batch):
+        """
+        Sends one batch with rate limiting and retries.
+
+        :return: Calls made and the error of the last one, None when the batch was sent.
+        :rtype: tuple of (int, Exception or None)
+        """
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            started = time.monotonic()
+            try:
+                with metrics.stage('batch_post'):
+                    self.push(batch)
+                if self.sizer is not None:
+                    self.sizer.observe(batch, time.monotonic() - started)
+                return attempt + 1, None
+            except Exception as e:
+                status_code = getattr(e, 'status', None)
+                if self.sizer is not None:
+                    self.sizer.observe(batch, time.monotonic() - started, status_code, ok=False)
+                if status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return attempt + 1, e
+                if status_code == 429:
+                    self.throttled += 1
+                metrics.inc('upload_retries_total', uploader=self.name, status=status_code)
+                wait = retry_after(e)
+                if wait is None:
+                    wait = self.backoff * 2 ** attempt
+                time.sleep(wait + random.uniform(0, self.backoff))
+                attempt += 1
+
+    def upload(self, batches, pending=2):
+        """
+        Uploads a stream of batches, consuming it only as fast as uploads complete.
+
+        At most `workers + pending` batches are held in memory at once, so the batches
+        may come from a generator that is still fetching data.
+
+        :param batches: Iterable of batches.
+        :type batches: iterable
+        :param pending: Batches buffered on top of the ones being uploaded.
+        :type pending: int
+        :return: Results of every batch, in batch order.
+        :rtype: list
+        """
+        slots = threading.BoundedSemaphore(self.workers + max(pending, 0))
+        futures = []
+        if self.sizer is not None:
+            batches = resized(batches, lambda: self.sizer.size)
+
+        def release(future):
+            slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for index, batch in enumerate(batches):
+                slots.acquire()
+                future = executor.submit(self.send, index, batch)
+                future.add_done_callback(release)
+                futures.append(future)
+
+        return [future.result() for future in futures]
+
+
+def failed_batches(results):
+    """
+    Filters the failed batches out of the results of BatchUploader.upload.
+    """
+    return [result for result in results if not result['ok']]
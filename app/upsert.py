@@ -0,0 +1,83 @@
+import json, logging
+
+from hubspot.crm.contacts import ApiException
+
+from app.clients import get_client
+from app.mapping import EXTERNAL_PROPERTIES, remember
+from app.snapshot import snapshots
+
+logger = logging.getLogger(__name__)
+
+
+class UpsertError(ApiException):
+    """
+    Records of a batch upsert rejected by HubSpot (207 Multi-Status).
+
+    :param results: Records written by the same call, see batch_upsert.
+    :type results: list
+    :param errors: Errors reported by HubSpot, with their category, message and context.
+    :type errors: list
+    """
+    def __init__(self, results, errors):
+        super().__init__(status=207, reason='; '.join(str(error.get('message', error)) for error in errors))
+        self.results = results
+        self.errors = errors
+
+
+def batch_upsert(access_token, object_type, records):
+    """
+    Creates or updates records in one call, keyed on character_id / location_id.
+
+    HubSpot decides on its side whether each record is new, so no search is needed
+    first. The properties must be defined with unique values in the portal. The SDK in
+    use has no upsert endpoint, the call goes through the API client of the shared
+    registry (same pool, auth and metrics as the generated endpoints).
+
+    Records repeated in `records` are sent once, with their last properties. The object
+    ids returned are stored in the local index, a failure to store them is logged, and
+    the records are applied to the CRM snapshots of the process.
+
+    :param access_token: HubSpot access token of the portal.
+    :type access_token: str
+    :param object_type: 'contacts' or 'companies'.
+    :type object_type: str
+    :param records: List of HubSpot properties, at most 100 distinct records.
+    :type records: list
+    :return: One dictionary per record with its 'id', 'properties' and 'new' (created) flag.
+    :rtype: list
+    :raises ApiException: When HubSpot rejects the call.
+    :raises UpsertError: When HubSpot rejects some of the records, after the others were stored.
+    """
+    prop = EXTERNAL_PROPERTIES[object_type]
+    inputs = {}
+    for properties in records:
+        if properties.get(prop) not in (None, ''):
+            inputs[str(properties[prop])] = {"idProperty": prop, "id": str(properties[prop]), "properties": properties}
+    if not inputs:
+        return []
+
+    api_client = getattr(get_client(access_token).crm, object_type).batch_api.api_client
+    response = api_client.call_api(
+        '/crm/v3/objects/{}/batch/upsert'.format(object_type), 'POST',
+        header_params={'Accept': 'application/json', 'Content-Type': 'application/json'},
+        body={"inputs": list(inputs.values())},
+        auth_settings=['oauth2'],
+        _preload_content=False,
+    )
+    try:
+        data = json.loads(response.data or b'{}')
+    finally:
+        response.release_conn()
+
+    results = [
+        {'id': result['id'], 'properties': result.get('properties', {}), 'new': result.get('new', False)}
+        for result in data.get('results', [])
+    ]
+    try:
+        remember(access_token, object_type, [(result['properties'].get(prop), result['id']) for result in results])
+    except Exception as e:
+        logger.error("Error: %s", e, extra={'event': 'batchUpsert'})
+    snapshots.apply(access_token, object_type, [(result['id'], result['properties']) for result in results])
+    if data.get('errors'):
+        raise UpsertError(results, data['errors'])
+    return results
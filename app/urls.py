@@ -1,5 +1,7 @@
 from django.urls import path
+from django.views.decorators.csrf import csrf_exempt
 import app.views as view
+import app.async_views as async_view
 
 urlpatterns = [
     path('request-contacts/', view.requestContacts.as_view(), name='request-contacts'),
@@ -8,4 +10,20 @@ urlpatterns = [
     path('mirror-hubspot-contacts/', view.mirrorHubspotContacts.as_view(), name='mirror-hubspot-contacts'),
     path('mirror-hubspot-companies/', view.mirrorHubspotCompanies.as_view(), name='mirror-hubspot-companies'),
     path('mirror-hubspot-associations/', view.mirrorHubspotAssociations.as_view(), name='mirror-hubspot-associations'),
+    path('ingest-hubspot-contacts/', view.ingestHubspotContacts.as_view(), name='ingest-hubspot-contacts'),
+    path('ingest-hubspot-companies/', view.ingestHubspotCompanies.as_view(), name='ingest-hubspot-companies'),
+    path('ramapi-cache/', view.ramapiCache.as_view(), name='ramapi-cache'),
+    path('hubspot-pools/', view.hubspotPools.as_view(), name='hubspot-pools'),
+    path('jobs/<int:pk>/', view.jobStatus.as_view(), name='job-status'),
+    path('sync-contacts/', view.syncContacts.as_view(), name='sync-contacts'),
+    path('sync-companies/', view.syncCompanies.as_view(), name='sync-companies'),
+    path('metrics/', view.metricsView.as_view(), name='metrics'),
+    path('async/request-contacts/', csrf_exempt(async_view.requestContactsAsync.as_view()), name='async-request-contacts'),
+    path('async/request-companies/', csrf_exempt(async_view.requestCompaniesAsync.as_view()), name='async-request-companies'),
+    path('async/request-associations/', csrf_exempt(async_view.sourceHubspotAssociationsAsync.as_view()), name='async-request-associations'),
+    path('async/mirror-hubspot-contacts/', csrf_exempt(async_view.mirrorHubspotContactsAsync.as_view()), name='async-mirror-hubspot-contacts'),
+    path('async/mirror-hubspot-companies/', csrf_exempt(async_view.mirrorHubspotCompaniesAsync.as_view()), name='async-mirror-hubspot-companies'),
+    path('async/mirror-hubspot-associations/', csrf_exempt(async_view.mirrorHubspotAssociationsAsync.as_view()), name='async-mirror-hubspot-associations'),
+    path('async/ingest-hubspot-contacts/', csrf_exempt(async_view.ingestHubspotContactsAsync.as_view()), name='async-ingest-hubspot-contacts'),
+    path('async/ingest-hubspot-companies/', csrf_exempt(async_view.ingestHubspotCompaniesAsync.as_view()), name='async-ingest-hubspot-companies'),
 ]
\ No newline at end of file
@@ -1,21 +1,56 @@
-import os, ramapi, hubspot, re
-from ramapi import *
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
-from django.utils import timezone
 
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
 from rest_framework.response import Response
-from hubspot.crm.contacts import BatchInputSimplePublicObjectInputForCreate, PublicObjectSearchRequest, SimplePublicObjectInputForCreate, SimplePublicObjectInput, ApiException
-from hubspot.crm.associations.v4 import BatchInputPublicDefaultAssociationMultiPost, ApiException
+from django.http import HttpResponse
+from hubspot.crm.contacts import BatchInputSimplePublicObjectInputForCreate, BatchInputSimplePublicObjectBatchInput, PublicObjectSearchRequest, SimplePublicObjectInputForCreate, SimplePublicObjectInput
+from hubspot.crm.contacts import ApiException as ContactsApiException
+from hubspot.crm.companies import ApiException as CompaniesApiException
+from hubspot.crm.associations.v4 import BatchInputPublicDefaultAssociationMultiPost, BatchInputPublicFetchAssociationsBatchRequest, BatchInputPublicAssociationMultiArchive
+from hubspot.crm.associations.v4 import ApiException as AssociationsApiException
 
 from app.serializers import CharacterSerializer, LocationSerializer
+from app.associations import join_associations, association_inputs, located_companies, diff_associations, archive_inputs
+from app.pipeline import stream_characters, stream_locations, serialize_batches, location_id_from_url, chunked
+from app.spill import SpillStore
+import app.cache as ramcache
+from app.clients import get_client, registry
+from app.uploader import BatchUploader, get_bucket, get_sizer, failed_batches
+from app.mapping import EXTERNAL_PROPERTIES, lookup, remember_results, forget, object_ids, portal_name
+from app.sync import plan, digests
+from app.upsert import batch_upsert, UpsertError
+from app.webhooks import ingest, occurred_at, flusher
+from app.snapshot import snapshots
+from app.jobs import enqueue, schedule, set_stage, advance, throughput
+from app.locks import held, keeper
+from app.ledger import open_ledger, committed_ids, uncommitted, record_batch, close_ledger
+from app.models import Job
+from app.metrics import metrics
 
 HUBSOPT_SOURCE_KEY = settings.HUBSOPT_SOURCE_KEY
 HUBSOPT_MIRROR_KEY = settings.HUBSOPT_MIRROR_KEY
 
+logger = logging.getLogger(__name__)
+
+# Contacts whose associations are read per call, the HubSpot maximum.
+ASSOCIATIONS_READ_SIZE = 1000
+
+CONTACT_PROPERTIES = ["character_id", "firstname", "lastname", "status_character", "character_species", "character_gender", "location_id"]
+COMPANY_PROPERTIES = ["location_id", "name", "location_type", "dimension", "creation_date"]
+
+# Properties mirrored per object type, and the name of one of its records in the responses.
+MIRROR_PROPERTIES = {'contacts': CONTACT_PROPERTIES, 'companies': COMPANY_PROPERTIES}
+MIRROR_NOUNS = {'contacts': 'contact', 'companies': 'company'}
+
+# Errors returned by HubSpot, every API of the SDK raises its own ApiException.
+HUBSPOT_ERRORS = (ContactsApiException, CompaniesApiException, AssociationsApiException)
+
 
 class requestRM(generics.GenericAPIView):
     """
@@ -28,7 +63,121 @@ class requestRM(generics.GenericAPIView):
     - getClients: Fetches client information from HubSpot using the provided access token.
     - getCompanies: Fetches company information from HubSpot using the provided access token.
     - makeAssociations: Creates associations between clients and companies based on matching location IDs.
+    - progress / advance: Report the stage and processed records of the background job running the view.
+    - selected / selectedContacts: Keep the records picked with only_ids.
+
+    Attributes set by the migrate_hubspot management command:
+    - dry_run: Read everything but write nothing to HubSpot nor to the migration ledger.
+    - only_ids: Set of the RAM API IDs to migrate, every record when None.
+    - workers: Batches uploaded at the same time, HUBSPOT_UPLOAD_WORKERS when None.
+    - batch_size: Records per HubSpot batch, HUBSPOT_BATCH_SIZE when None.
     """
+    job = None
+    lease = None
+    dry_run = False
+    only_ids = None
+    workers = None
+    batch_size = None
+
+    def progress(self, stage):
+        """
+        Records the current stage on the background job running the view, if any.
+        """
+        self.keepalive()
+        if self.job is not None:
+            set_stage(self.job, stage)
+
+    def advance(self, count):
+        """
+        Adds processed records to the background job running the view, if any.
+        """
+        if self.job is not None:
+            advance(self.job, count)
+
+    def keepalive(self):
+        """
+        Extends the lock held by the run, if any, see holding.
+
+        :raises app.locks.LockLost: The lock was taken over, the run must stop writing.
+        """
+        if self.lease is not None:
+            self.lease()
+
+    @contextmanager
+    def holding(self, lock, ttl):
+        """
+        Holds a lock for the body of a with block, waiting while another run holds it.
+
+        The lock is extended on every stage, batch and page read of the run (see keepalive),
+        which stops with LockLost as soon as it finds the lock taken over.
+        """
+        with held(lock, ttl) as token:
+            previous, self.lease = self.lease, keeper(lock, token, ttl)
+            try:
+                yield
+            finally:
+                self.lease = previous
+
+    def migrationLock(self, object_type):
+        """
+        Holds the lock 'migration-<object_type>' for the body of a with block, see holding:
+        migrations and delta syncs of an object type never overlap, in any process, so no
+        run creates records another one is creating.
+        """
+        self.progress('waiting for the migration lock')
+        return self.holding('migration-{}'.format(object_type), settings.MIGRATION_LOCK_TIMEOUT)
+
+    @property
+    def uploadWorkers(self):
+        """
+        Batches uploaded at the same time by the run.
+        """
+        return self.workers or settings.HUBSPOT_UPLOAD_WORKERS
+
+    @property
+    def batchSize(self):
+        """
+        Records per HubSpot batch of the run.
+        """
+        return self.batch_size or settings.HUBSPOT_BATCH_SIZE
+
+    @property
+    def partial(self):
+        """
+        Whether the run leaves out records or writes, and so must not close the migration ledger.
+        """
+        return self.dry_run or self.only_ids is not None
+
+    def selected(self, records):
+        """
+        Keeps the RAM API records whose ID was picked with `only_ids`, all of them when it is not set.
+
+        :param records: Iterable of RAM API records.
+        :type records: iterable
+        :return: Iterable of records.
+        :rtype: iterable
+        """
+        if self.only_ids is None:
+            return records
+        return (record for record in records if record['id'] in self.only_ids)
+
+    def selectedContacts(self, access_token, contacts):
+        """
+        Keeps the (contact_id, location_id) pairs of the contacts whose character_id was
+        picked with `only_ids`, resolved through the local index; all of them when it is not set.
+
+        :param access_token: HubSpot access token of the portal.
+        :type access_token: str
+        :param contacts: Iterable of (contact_id, location_id) pairs.
+        :type contacts: iterable
+        :return: Iterable of (contact_id, location_id) pairs.
+        :rtype: iterable
+        """
+        if self.only_ids is None:
+            return contacts
+        picked = set(object_ids(access_token, 'contacts', self.only_ids).values())
+        return (pair for pair in contacts if str(pair[0]) in picked)
+
     def isPrime(self, n):
         """
         Check if a number is prime n (int).
@@ -40,6 +189,29 @@ class requestRM(generics.GenericAPIView):
                 return False
         return True
 
+    def stream_characters(self):
+        """
+        Streams characters from the RAM API as pages arrive, filtering by prime IDs.
+
+        :return: Generator of characters with prime IDs.
+        :rtype: generator
+        """
+        return stream_characters(
+            ramcache.get_character_page,
+            lambda character: self.isPrime(character['id']),
+            workers=settings.RAMAPI_FETCH_WORKERS,
+            retries=settings.RAMAPI_FETCH_RETRIES
+        )
+
+    def stream_locations(self):
+        """
+        Streams the locations associated with prime ID characters, each location once.
+
+        :return: Generator of locations.
+        :rtype: generator
+        """
+        return stream_locations(self.stream_characters(), ramcache.get_locations, size=self.batchSize)
+
     def get_characters(self):
         """
         Retrieves characters from the RAM API, filtering by prime IDs.
@@ -47,15 +219,7 @@ class requestRM(generics.GenericAPIView):
         :return: List of characters with prime IDs.
         :rtype: list
         """
-        characters, page = [], 1
-        while True:
-            characters_data = ramapi.Character.get_page(page)
-            characters.extend(characters_data['results'])
-            if not characters_data['info']['next']:
-                break
-            page += 1
-        data = [character for character in characters if self.isPrime(character['id'])]
-        return data
+        return list(self.stream_characters())
 
     def get_locations(self):
         """
@@ -64,166 +228,753 @@ class requestRM(generics.GenericAPIView):
         :return: List of locations.
         :rtype: list
         """
-        characters = self.get_characters()
-        idLocations = []
-        for item in characters:
-            match = re.search(r'/(\d+)$', item['location']['url'])
-            if match:
-                idLocations.append(int(match.group(1)))
-        idLocations = sorted(set(idLocations))
-        data = ramapi.Location.get(idLocations)
-        return data
+        return sorted(self.stream_locations(), key=lambda location: location['id'])
+
+
+    def pageObjects(self, access_token, object_type, properties, keepalive=None):
+        """
+        Pages contacts or companies from HubSpot, 100 at a time, yielding each record as its page arrives.
+
+        :param access_token: HubSpot access token for authentication.
+        :type access_token: str
+        :param object_type: 'contacts' or 'companies'.
+        :type object_type: str
+        :param properties: Properties requested, only these are transferred.
+        :type properties: list
+        :param keepalive: Callable run before every page, e.g. refreshing a lock.
+        :type keepalive: callable or None
+        :return: Generator of dictionaries with the 'id' and 'properties' of every record.
+        :rtype: generator
+        """
+        api = getattr(get_client(access_token).crm, object_type)
+        after = None
+        while True:
+            if keepalive is not None:
+                keepalive()
+            with metrics.stage('hubspot_read'):
+                response = api.basic_api.get_page(properties=properties, limit=100, archived=False, after=after)
+
+            for result in response.results:
+                yield {
+                    'id': result.id,
+                    'properties': result.properties,
+                }
+
+            if response.paging and response.paging.next:
+                after = response.paging.next.after
+            else:
+                break
 
 
-    def getClients(self, access_token):
+    def getClients(self, access_token, properties=None):
         """
         Fetches client information from HubSpot using the provided access token.
 
         :param access_token: HubSpot access token for authentication.
         :type access_token: str
+        :param properties: Properties requested, every mirrored property by default.
+        :type properties: list or None
         :return: List of dictionaries containing client information.
         :rtype: list
         """
         try:
-            client = hubspot.Client.create(access_token=access_token)
-
-            clients_data, after = [], None
-            while True:
-                response = client.crm.contacts.basic_api.get_page(
-                    properties=[
-                        "character_id",
-                        "firstname",
-                        "lastname",
-                        "status_character",
-                        "character_species",
-                        "character_gender",
-                        "location_id"
-                    ], 
-                    limit=100, archived=False, after=after
-                )
-                
-                for result in response.results:
-                    client_info = {
-                        'id': result.id,
-                        'properties': result.properties,
-                    }
-                    clients_data.append(client_info)
-
-                if response.paging and response.paging.next:
-                    after = response.paging.next.after
-                else:
-                    break
-
-            return clients_data
+            return list(self.pageObjects(access_token, 'contacts', properties or CONTACT_PROPERTIES))
 
         except Exception as e:
-            date = timezone.now().strftime("%Y-%m-%d %H:%M")
-            with open(os.path.join(settings.BASE_DIR, 'logs/core.log'), 'a') as f:
-                f.write("fetchClients {} --> Error: {}\n".format(date, str(e)))
+            logger.error("Error: %s", e, extra={'event': 'fetchClients'})
 
 
-    def getCompanies(self, access_token):
+    def getCompanies(self, access_token, properties=None):
         """
         Fetches company information from HubSpot using the provided access token.
 
         :param access_token: HubSpot access token for authentication.
         :type access_token: str
+        :param properties: Properties requested, every mirrored property by default.
+        :type properties: list or None
         :return: List of dictionaries containing company information.
         :rtype: list
         """
         try:
-            client = hubspot.Client.create(access_token=access_token)
-
-            data, after = [], None
-            while True:
-                response = client.crm.companies.basic_api.get_page(
-                    properties=[
-                        "location_id",
-                        "name",
-                        "location_type",
-                        "dimension",
-                        "creation_date"
-                    ], 
-                    limit=100, archived=False, after=after
-                )
-                
-                for result in response.results:
-                    client_info = {
-                        'id': result.id,
-                        'properties': result.properties,
-                    }
-                    data.append(client_info)
-
-                if response.paging and response.paging.next:
-                    after = response.paging.next.after
-                else:
-                    break
-
-            return data
+            return list(self.pageObjects(access_token, 'companies', properties or COMPANY_PROPERTIES))
 
         except Exception as e:
-            date = timezone.now().strftime("%Y-%m-%d %H:%M")
-            with open(os.path.join(settings.BASE_DIR, 'logs/core.log'), 'a') as f:
-                f.write("fetchClients {} --> Error: {}\n".format(date, str(e)))
+            logger.error("Error: %s", e, extra={'event': 'fetchCompanies'})
+
+
+    def uploadBatches(self, access_token, batches, push, name, track=True, writes=True):
+        """
+        Uploads batches concurrently within the rate limit of the portal, logging the failed ones.
+
+        Batches that write to HubSpot are regrouped to the size adapted to the endpoint
+        (see app.uploader.BatchSizer, batchSize at most) and the ones rejected as
+        a whole are split to isolate the records at fault. On a dry run they are only counted.
+
+        :param access_token: HubSpot access token of the portal.
+        :type access_token: str
+        :param batches: Iterable of batch inputs.
+        :type batches: iterable
+        :param push: Callable sending one batch to HubSpot.
+        :type push: callable
+        :param name: Name used in the log lines and the metrics, one per endpoint as it also keys the batch sizer.
+        :type name: str
+        :param track: Count the records of every batch as processed by the job.
+        :type track: bool
+        :param writes: The batches write to HubSpot, False for reads.
+        :type writes: bool
+        :return: List of failed batches with their index, size and error.
+        :rtype: list
+        """
+        def kept(batches):
+            for inputs in batches:
+                self.keepalive()
+                yield inputs
+
+        batches = kept(batches)
+        if self.dry_run and writes:
+            for inputs in batches:
+                if track:
+                    self.advance(len(inputs))
+            return []
+
+        def tracked(inputs):
+            response = push(inputs)
+            if track:
+                self.advance(len(inputs))
+            return response
+
+        uploader = BatchUploader(
+            tracked,
+            bucket=get_bucket(access_token),
+            workers=self.uploadWorkers,
+            retries=settings.HUBSPOT_UPLOAD_RETRIES,
+            name=name,
+            sizer=get_sizer(name, self.batchSize) if writes and settings.HUBSPOT_ADAPTIVE_BATCHES else None,
+            split=writes
+        )
+        failed = failed_batches(uploader.upload(batches, pending=settings.PIPELINE_QUEUE_SIZE))
+        for result in failed:
+            logger.error("Batch %s (%s of %s records) Error: %s", result['batch'], result['rejected'], result['size'], result['error'], extra={'event': name, 'batch': result['batch'], 'size': result['size']})
+        return failed
 
 
     def makeAssociations(self, access_token):
         """
         Creates associations between clients and companies based on matching location IDs.
 
+        Runs of the same portal never overlap, in any process: a run waits for the lock
+        'associations-<portal>' while another run holds it, see holding.
+
+        :param access_token: HubSpot access token for authentication.
+        :type access_token: str
+        :return: List of the association batches that could not be created.
+        :rtype: list
+        """
+        lock, ttl = 'associations-{}'.format(portal_name(access_token)), settings.ASSOCIATIONS_LOCK_TIMEOUT
+        self.progress('waiting for the associations lock')
+        with self.holding(lock, ttl):
+            return self.reconcileAssociations(access_token, self.keepalive)
+
+
+    def reconcileAssociations(self, access_token, keepalive):
+        """
+        Reads both object types and creates the associations, see makeAssociations.
+
+        Contacts and companies are read at the same time, from the snapshots of the portal
+        (see app.snapshot) which only page HubSpot again when they expire.
+
+        :param keepalive: Callable run between stages and on every page read, refreshing the lock.
+        :type keepalive: callable
+        """
+        if settings.ASSOCIATIONS_OUT_OF_CORE:
+            return self.reconcileAssociationsOnDisk(access_token, keepalive)
+
+        self.progress('reading contacts and companies')
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='association-read') as executor:
+            reading = executor.submit(snapshots.locations, access_token, 'companies', keepalive)
+            contacts = list(self.selectedContacts(access_token, snapshots.locations(access_token, 'contacts', keepalive)))
+            companies = reading.result()
+
+        keepalive()
+        self.progress('joining associations')
+        with metrics.stage('association_join'):
+            pairs = join_associations(contacts, companies)
+
+        stale, failed = [], []
+        if settings.ASSOCIATIONS_DIFF:
+            keepalive()
+            self.progress('reading associations')
+            existing, failed = self.readAssociations(access_token, [contact_id for contact_id, _ in contacts])
+            with metrics.stage('association_join'):
+                pairs, stale = diff_associations(pairs, existing, located_companies(companies))
+        metrics.inc('associations_changes_total', len(pairs), portal=portal_name(access_token), action='created')
+        metrics.inc('associations_changes_total', len(stale), portal=portal_name(access_token), action='archived')
+
+        keepalive()
+        return failed + self.pushAssociations(access_token, pairs, stale)
+
+
+    def reconcileAssociationsOnDisk(self, access_token, keepalive):
+        """
+        Out-of-core version of reconcileAssociations, for portals that do not fit in memory.
+
+        Contacts and companies are paged straight into a temporary SQLite file (see
+        app.spill) and merge-joined from it sorted by location_id. The existing associations
+        are read and compared a slice of contacts at a time, and the pairs to create and to
+        archive are spilled as well before being uploaded, so memory stays flat whatever
+        the size of the portal. The snapshots are not used.
+
+        :param keepalive: Callable run between stages and on every page read, refreshing the lock.
+        :type keepalive: callable
+        """
+        def spill(store, object_type):
+            pairs = (
+                (record['id'], record['properties'].get('location_id', None))
+                for record in self.pageObjects(access_token, object_type, ['location_id'], keepalive)
+            )
+            return store.spill(object_type, self.selectedContacts(access_token, pairs) if object_type == 'contacts' else pairs)
+
+        failed = []
+        with SpillStore(settings.ASSOCIATIONS_SPILL_DIR) as store:
+            self.progress('reading contacts and companies')
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix='association-read') as executor:
+                reading = executor.submit(spill, store, 'companies')
+                spill(store, 'contacts')
+                reading.result()
+            store.index()
+
+            keepalive()
+            self.progress('joining associations')
+            for chunk in chunked(store.join(), ASSOCIATIONS_READ_SIZE * self.uploadWorkers):
+                pairs = [(contact_id, company_id) for contact_id, company_id in chunk if company_id is not None]
+                stale = []
+                if settings.ASSOCIATIONS_DIFF:
+                    existing, errors = self.readAssociations(access_token, [contact_id for contact_id, _ in chunk])
+                    failed += errors
+                    located = store.located({company_id for associated in existing.values() for company_id in associated})
+                    with metrics.stage('association_join'):
+                        pairs, stale = diff_associations(pairs, existing, located)
+                store.add('creates', pairs)
+                store.add('archives', stale)
+                keepalive()
+
+            metrics.inc('associations_changes_total', store.count('creates'), portal=portal_name(access_token), action='created')
+            metrics.inc('associations_changes_total', store.count('archives'), portal=portal_name(access_token), action='archived')
+            return failed + self.pushAssociations(access_token, store.rows('creates'), store.rows('archives'))
+
+
+    def pushAssociations(self, access_token, pairs, stale):
+        """
+        Creates the missing associations and archives the stale ones, in batches.
+
         :param access_token: HubSpot access token for authentication.
         :type access_token: str
+        :param pairs: Iterable of (contact_id, company_id) pairs to create.
+        :type pairs: iterable
+        :param stale: Iterable of (contact_id, company_id) pairs to archive.
+        :type stale: iterable
+        :return: List of the batches that could not be created or archived.
+        :rtype: list
+        """
+        client = get_client(access_token)
+        size = self.batchSize
+
+        def push(batch):
+            client.crm.associations.v4.batch_api.create_default(
+                from_object_type="contacts",
+                to_object_type="companies",
+                batch_input_public_default_association_multi_post=BatchInputPublicDefaultAssociationMultiPost(inputs=association_inputs(batch))
+            )
+
+        def archive(batch):
+            client.crm.associations.v4.batch_api.archive(
+                from_object_type="contacts",
+                to_object_type="companies",
+                batch_input_public_association_multi_archive=BatchInputPublicAssociationMultiArchive(inputs=archive_inputs(batch))
+            )
+
+        self.progress('uploading associations')
+        failed = self.uploadBatches(access_token, chunked(pairs, size), push, 'makeAssociations')
+        self.progress('archiving associations')
+        return failed + self.uploadBatches(access_token, chunked(stale, size), archive, 'archiveAssociations')
+
+
+    def readAssociations(self, access_token, contact_ids):
+        """
+        Batch-reads the companies every contact is associated with.
+
+        Contacts of a batch that could not be read, or with more associations than a
+        single page holds, are left out of the result, see diff_associations.
+
+        :param access_token: HubSpot access token for authentication.
+        :type access_token: str
+        :param contact_ids: HubSpot IDs of the contacts.
+        :type contact_ids: list
+        :return: Dictionary mapping contact id to the set of company ids, and the failed read batches.
+        :rtype: tuple of (dict, list)
+        """
+        client = get_client(access_token)
+        existing = {}
+
+        def read(inputs):
+            with metrics.stage('hubspot_read'):
+                response = client.crm.associations.v4.batch_api.get_page(
+                    from_object_type="contacts",
+                    to_object_type="companies",
+                    batch_input_public_fetch_associations_batch_request=BatchInputPublicFetchAssociationsBatchRequest(inputs=inputs)
+                )
+            found = {str(item['id']): set() for item in inputs}
+            for result in response.results:
+                contact_id = str(result._from.id)
+                if result.paging and result.paging.next:
+                    found.pop(contact_id, None)
+                elif contact_id in found:
+                    found[contact_id].update(str(to.to_object_id) for to in result.to)
+            existing.update(found)
+
+        inputs = [{"id": str(contact_id)} for contact_id in contact_ids]
+        size = ASSOCIATIONS_READ_SIZE
+        failed = self.uploadBatches(access_token, (inputs[i:i+size] for i in range(0, len(inputs), size)), read, 'readAssociations', track=False, writes=False)
+        return existing, failed
+
+
+    def findCompany(self, access_token, location_id):
+        """
+        Returns the HubSpot ID of the company of a location ID, from the local index or a search.
+
+        When several companies share the location ID the oldest one is used, like in makeAssociations.
+
+        :param access_token: HubSpot access token for authentication.
+        :type access_token: str
+        :param location_id: Location ID of the company.
+        :type location_id: str or int
+        :return: HubSpot ID of the company, None when there is no such company.
+        :rtype: str or None
+        """
+        if location_id in (None, ''):
+            return None
+
+        client = get_client(access_token)
+
+        def search():
+            public_object_search_request = PublicObjectSearchRequest(
+                properties=["hs_object_id"],
+                filter_groups=[{"filters":[{"propertyName":"location_id","value":location_id,"operator":"EQ"}]}],
+                sorts=[{"propertyName":"hs_object_id","direction":"ASCENDING"}],
+                limit=1
+            )
+            response = client.crm.companies.search_api.do_search(public_object_search_request=public_object_search_request)
+            return response.results[0].id if response.results else None
+
+        return lookup(access_token, 'companies', location_id, search)
+
+
+    def associateContact(self, access_token, contact_id, location_id):
+        """
+        Associates a single contact with the company sharing its location ID.
+
+        When several companies share the location ID the oldest one is used, like in makeAssociations.
+
+        :param access_token: HubSpot access token for authentication.
+        :type access_token: str
+        :param contact_id: HubSpot ID of the contact.
+        :type contact_id: str
+        :param location_id: Location ID of the contact.
+        :type location_id: str or int
+        :return: HubSpot ID of the associated company, None when there is no such company.
+        :rtype: str or None
+        """
+        companyID = self.findCompany(access_token, location_id)
+        if companyID is None:
+            return None
+
+        client = get_client(access_token)
+        client.crm.associations.v4.basic_api.create_default(
+            from_object_type="contacts",
+            from_object_id=contact_id,
+            to_object_type="companies",
+            to_object_id=companyID
+        )
+        return companyID
+
+
+    def associateCompany(self, access_token, company_id, location_id):
+        """
+        Associates every contact sharing its location ID with a single company.
+
+        :param access_token: HubSpot access token for authentication.
+        :type access_token: str
+        :param company_id: HubSpot ID of the company.
+        :type company_id: str
+        :param location_id: Location ID of the company.
+        :type location_id: str or int
+        :return: List of the association batches that could not be created.
+        :rtype: list
+        """
+        if location_id in (None, ''):
+            return []
+
+        client = get_client(access_token)
+        contacts, after = [], None
+        while True:
+            public_object_search_request = PublicObjectSearchRequest(
+                properties=["hs_object_id"],
+                filter_groups=[{"filters":[{"propertyName":"location_id","value":location_id,"operator":"EQ"}]}],
+                limit=100,
+                after=after
+            )
+            response = client.crm.contacts.search_api.do_search(public_object_search_request=public_object_search_request)
+            contacts.extend(result.id for result in response.results)
+            if response.paging and response.paging.next:
+                after = response.paging.next.after
+            else:
+                break
+
+        data = association_inputs((contact_id, company_id) for contact_id in contacts)
+        batches = (data[i:i+self.batchSize] for i in range(0, len(data), self.batchSize))
+        return self.uploadBatches(
+            access_token,
+            batches,
+            lambda inputs: client.crm.associations.v4.batch_api.create_default(
+                from_object_type="contacts",
+                to_object_type="companies",
+                batch_input_public_default_association_multi_post=BatchInputPublicDefaultAssociationMultiPost(inputs=inputs)
+            ),
+            'associateCompany'
+        )
+
+
+    def mirrorAssociations(self, associate, object_id, location_id, name):
+        """
+        Associates a single mirrored record in the mirror portal, logging instead of failing the webhook.
+
+        When the association fails a mirror reconciliation is scheduled, debounced so a
+        burst of failures ends in a single run.
+
+        :param associate: associateContact or associateCompany.
+        :type associate: callable
+        :param object_id: HubSpot ID of the mirrored record.
+        :type object_id: str
+        :param location_id: Location ID of the mirrored record.
+        :type location_id: str or int
+        :param name: Name used in the log lines.
+        :type name: str
         :return: None
         """
-        data_clients = self.getClients(access_token=access_token)
-        dict_clients = [
-            {
-                'client': client['id'],
-                'location_id': client['properties'].get('location_id', None),
-            }
-            for client in data_clients
-        ]
-
-        data_companies = self.getCompanies(access_token=access_token)
-        dict_companies = [
-            {
-                'companie': client['id'],
-                'location_id': client['properties'].get('location_id', None),
-            }
-            for client in data_companies
-        ]
-
-        associations = {}
-        for d1 in dict_clients:
-            for d2 in dict_companies:
-                if d1["location_id"] == d2["location_id"]:
-                    associations[d1["client"]] = d2["companie"]
-
-
-        data = []
-        for key, value in associations.items():
-            elemento_transformado = {"from": {"id": key},"to": {"id": value}}
-            data.append(elemento_transformado)
-
-
-        batch = 50
-        batchLocations = [data[i:i+batch] for i in range(0, len(data), batch)]
         try:
-            client = hubspot.Client.create(access_token=access_token)
-            for batch in batchLocations:
-                batch_input_public_default_association_multi_post = BatchInputPublicDefaultAssociationMultiPost(
-                    inputs=batch
-                )
-                client.crm.associations.v4.batch_api.create_default(
+            associate(HUBSOPT_MIRROR_KEY, object_id, location_id)
+        except Exception as e:
+            logger.error("Error: %s", e, extra={'event': name})
+            try:
+                schedule('associations-mirror', settings.ASSOCIATIONS_DEBOUNCE, settings.ASSOCIATIONS_MAX_DELAY)
+            except Exception as e:
+                logger.error("Error: %s", e, extra={'event': name})
+
+
+    def mirrorBulk(self, object_type, records, name):
+        """
+        Mirrors many records at once through batch upsert, then associates them, see mirrorRecords.
+
+        :param object_type: 'contacts' or 'companies'.
+        :type object_type: str
+        :param records: List of HubSpot properties.
+        :type records: list
+        :param name: Name used in the log lines.
+        :type name: str
+        :return: Response with the number of created, updated and rejected records.
+        :rtype: rest_framework.response.Response
+        """
+        results, failed, rejected = self.mirrorRecords(object_type, records, name)
+        data = {'created': sum(1 for result in results if result['new']), 'updated': sum(1 for result in results if not result['new']), 'rejected': len(rejected)}
+        if failed:
+            return Response(dict(data, error='Some batches of {} could not be mirrored.'.format(object_type), failed=failed), status=status.HTTP_207_MULTI_STATUS)
+        return Response(dict(data, succes='The {} have been mirrored.'.format(object_type)), status=status.HTTP_200_OK)
+
+
+    def checkSecret(self, request):
+        """
+        Checks the HubSpotSecret header of a webhook sent by the source portal.
+
+        :param request: HTTP request, from a DRF or a plain Django view.
+        :return: Response rejecting the request, None when it is authenticated.
+        :rtype: rest_framework.response.Response or None
+        """
+        hubspot_secret = request.headers.get('HubSpotSecret')
+
+        if not hubspot_secret:
+            return Response({'error': 'HubSpotSecret not Found'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if hubspot_secret != HUBSOPT_SOURCE_KEY:
+            return Response({'error': 'Authentication failed: X-HubSpot-Secret mismatch.'}, status=status.HTTP_401_UNAUTHORIZED)
+        return None
+
+
+    def mirrorPayload(self, object_type, data, name):
+        """
+        Mirrors the payload of a webhook: a single record (mirrorRecord) or a list of them (mirrorBulk).
+
+        :param object_type: 'contacts' or 'companies'.
+        :type object_type: str
+        :param data: Parsed JSON payload.
+        :type data: dict or list
+        :param name: Name of the view, used in the log lines.
+        :type name: str
+        :return: Response of the mirror.
+        :rtype: rest_framework.response.Response
+        """
+        records = data if isinstance(data, list) else [data]
+        if not all(isinstance(record, dict) for record in records):
+            return Response({'error': 'Records must be JSON objects.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = MIRROR_PROPERTIES[object_type]
+        records = [{field: record.get(field, '') for field in fields} for record in records]
+        if isinstance(data, list):
+            return self.mirrorBulk(object_type, records, name)
+        return self.mirrorRecord(object_type, records[0], name)
+
+
+    def mirrorRecord(self, object_type, properties, name):
+        """
+        Mirrors a single record into the mirror portal and associates it.
+
+        A known record is updated, and associated once the update succeeded; a record
+        unknown to the index, or deleted from HubSpot since, is upserted (HUBSPOT_MIRROR_UPSERT)
+        or created. Errors returned by HubSpot answer 403, any other error is raised.
+
+        :param object_type: 'contacts' or 'companies'.
+        :type object_type: str
+        :param properties: HubSpot properties of the record.
+        :type properties: dict
+        :param name: Name of the view, used in the log lines.
+        :type name: str
+        :return: Response indicating the success or failure of the operation.
+        :rtype: rest_framework.response.Response
+        """
+        prop, noun = EXTERNAL_PROPERTIES[object_type], MIRROR_NOUNS[object_type]
+        externalID = properties[prop]
+        if settings.HUBSPOT_MIRROR_UPSERT and externalID in (None, ''):
+            return Response({'error': '{} is required.'.format(prop)}, status=status.HTTP_400_BAD_REQUEST)
+
+        api = getattr(get_client(HUBSOPT_MIRROR_KEY).crm, object_type)
+        associate = self.associateContact if object_type == 'contacts' else self.associateCompany
+        event = '{}-{}'.format(associate.__name__, name)
+
+        def search():
+            public_object_search_request = PublicObjectSearchRequest(properties=["hs_object_id"], filter_groups=[{"filters":[{"propertyName":prop,"value":externalID,"operator":"EQ"}]}],limit=1)
+            response = api.search_api.do_search(public_object_search_request=public_object_search_request)
+            return response.results[0].properties.get('hs_object_id', None) if response.total > 0 else None
+
+        try:
+            objectID = lookup(HUBSOPT_MIRROR_KEY, object_type, externalID, None if settings.HUBSPOT_MIRROR_UPSERT else search)
+            if objectID is not None:
+                try:
+                    api.basic_api.update(objectID, SimplePublicObjectInput(properties=properties))
+                except HUBSPOT_ERRORS as e:
+                    if e.status != 404:
+                        raise
+                    forget(HUBSOPT_MIRROR_KEY, object_type, externalID)
+                else:
+                    snapshots.apply(HUBSOPT_MIRROR_KEY, object_type, [(objectID, properties)])
+                    self.mirrorAssociations(associate, objectID, properties["location_id"], event)
+                    return Response({'succes': 'The {} has been update.'.format(noun)}, status=status.HTTP_200_OK)
+
+            if settings.HUBSPOT_MIRROR_UPSERT:
+                try:
+                    record = batch_upsert(HUBSOPT_MIRROR_KEY, object_type, [properties])[0]
+                except UpsertError as e:
+                    return Response({'error': 'HubSpot rejected the {}.'.format(noun), 'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+                self.mirrorAssociations(associate, record['id'], properties["location_id"], event)
+                if not record['new']:
+                    return Response({'succes': 'The {} has been update.'.format(noun)}, status=status.HTTP_200_OK)
+                return Response({'succes': 'The {} has been created.'.format(noun)}, status=status.HTTP_201_CREATED)
+
+            simple_public_object_input_for_create = SimplePublicObjectInputForCreate(properties=properties)
+            record = remember_results(HUBSOPT_MIRROR_KEY, object_type, api.basic_api.create(simple_public_object_input_for_create=simple_public_object_input_for_create))
+            self.mirrorAssociations(associate, record.id, properties["location_id"], event)
+            return Response({'succes': 'The {} has been created.'.format(noun)}, status=status.HTTP_201_CREATED)
+
+        except HUBSPOT_ERRORS as e:
+            logger.error("Error: %s", e, extra={'event': name})
+            return Response({'error': 'Failed to update/created {}.'.format(noun)}, status=status.HTTP_403_FORBIDDEN)
+
+
+    def ingestEvents(self, object_type, data, fields, name):
+        """
+        Validates webhook events and queues them for the flusher, see app.webhooks.
+
+        :param object_type: 'contacts' or 'companies'.
+        :type object_type: str
+        :param data: Parsed JSON payload, one event or a list of them.
+        :type data: dict or list
+        :param fields: Properties copied from each event.
+        :type fields: list
+        :param name: Name of the view, used in the log lines.
+        :type name: str
+        :return: Response with the number of events received and records pending.
+        :rtype: rest_framework.response.Response
+        """
+        events = data if isinstance(data, list) else [data]
+        if not all(isinstance(event, dict) for event in events):
+            return Response({'error': 'Events must be JSON objects.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            for event in events:
+                occurred_at(event)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            pending = ingest(object_type, events, fields)
+        except Exception as e:
+            logger.error("Error: %s", e, extra={'event': name})
+            return Response({'error': 'The events could not be queued.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        flusher.notify(pending)
+        return Response({'succes': 'The events have been queued.', 'received': len(events), 'pending': pending}, status=status.HTTP_202_ACCEPTED)
+
+
+    def mirrorRecords(self, object_type, records, name):
+        """
+        Mirrors many records at once through batch upsert, then associates them.
+
+        Contacts are associated in batches with the companies of their location IDs;
+        every company is associated with the contacts sharing its location ID. When an
+        association batch fails a mirror reconciliation is scheduled, like in mirrorAssociations.
+
+        :param object_type: 'contacts' or 'companies'.
+        :type object_type: str
+        :param records: List of HubSpot properties.
+        :type records: list
+        :param name: Name used in the log lines and the metrics, one per object type as it also keys the batch sizer.
+        :type name: str
+        :return: Records written (see batch_upsert), failed batches and errors of the records HubSpot rejected.
+        :rtype: tuple of (list, list, list)
+        """
+        prop, size = EXTERNAL_PROPERTIES[object_type], self.batchSize
+        records = list({str(record[prop]): record for record in records if record.get(prop) not in (None, '')}.values())
+        results, rejected = [], []
+
+        def push(batch):
+            try:
+                results.extend(batch_upsert(HUBSOPT_MIRROR_KEY, object_type, batch))
+            except UpsertError as e:
+                results.extend(e.results)
+                rejected.extend(e.errors)
+
+        failed = self.uploadBatches(HUBSOPT_MIRROR_KEY, (records[i:i+size] for i in range(0, len(records), size)), push, name)
+        for error in rejected:
+            logger.error("Error: %s", error.get('message', error), extra={'event': name})
+        failed += [{'error': error.get('message', ''), 'category': error.get('category', ''), 'context': error.get('context', {})} for error in rejected]
+
+        if object_type == 'contacts':
+            locations = {str(result['properties'].get('location_id')) for result in results if result['properties'].get('location_id') not in (None, '')}
+            companies = {location: self.findCompany(HUBSOPT_MIRROR_KEY, location) for location in locations}
+            data = association_inputs(
+                (result['id'], companies[str(result['properties'].get('location_id'))]) for result in results
+                if companies.get(str(result['properties'].get('location_id'))) is not None
+            )
+            client = get_client(HUBSOPT_MIRROR_KEY)
+            unassociated = self.uploadBatches(
+                HUBSOPT_MIRROR_KEY,
+                (data[i:i+size] for i in range(0, len(data), size)),
+                lambda inputs: client.crm.associations.v4.batch_api.create_default(
                     from_object_type="contacts",
                     to_object_type="companies",
-                    batch_input_public_default_association_multi_post=batch_input_public_default_association_multi_post
-                )            
+                    batch_input_public_default_association_multi_post=BatchInputPublicDefaultAssociationMultiPost(inputs=inputs)
+                ),
+                'makeAssociations-{}'.format(name)
+            )
+            if unassociated:
+                try:
+                    schedule('associations-mirror', settings.ASSOCIATIONS_DEBOUNCE, settings.ASSOCIATIONS_MAX_DELAY)
+                except Exception as e:
+                    logger.error("Error: %s", e, extra={'event': name})
+            failed += unassociated
+        else:
+            for result in results:
+                self.mirrorAssociations(self.associateCompany, result['id'], result['properties'].get('location_id'), name)
 
-        except Exception as e:
-            date = timezone.now().strftime("%Y-%m-%d %H:%M")
-            with open(os.path.join(settings.BASE_DIR, 'logs/core.log'), 'a') as f:
-                f.write("fetchClients {} --> Error: {}\n".format(date, str(e)))
+        return results, failed, rejected
+
+
+    def pushDelta(self, access_token, object_type, creates, updates, name):
+        """
+        Creates the new records and updates the changed ones through the HubSpot batch endpoints.
+
+        The hashes of the records are stored with their mappings once HubSpot accepted them.
+        Records HubSpot no longer has are dropped from the index, so the next sync creates them.
+
+        :param access_token: HubSpot access token of the portal.
+        :type access_token: str
+        :param object_type: 'contacts' or 'companies'.
+        :type object_type: str
+        :param creates: Inputs to create, see app.sync.plan.
+        :type creates: list
+        :param updates: Inputs to update, with their HubSpot "id".
+        :type updates: list
+        :param name: Name used in the log lines.
+        :type name: str
+        :return: List of the batches that could not be created or updated.
+        :rtype: list
+        """
+        api = getattr(get_client(access_token).crm, object_type).batch_api
+        size = self.batchSize
+
+        def create(inputs):
+            return remember_results(access_token, object_type, api.create(
+                batch_input_simple_public_object_input_for_create=BatchInputSimplePublicObjectInputForCreate(inputs=inputs)
+            ), digests(inputs, object_type))
+
+        def update(inputs):
+            response = remember_results(access_token, object_type, api.update(
+                batch_input_simple_public_object_batch_input=BatchInputSimplePublicObjectBatchInput(inputs=inputs)
+            ), digests(inputs, object_type))
+            # Only the records HubSpot no longer has are dropped; rejected updates keep their ID
+            # and, their hash not being stored, are sent again by the next sync.
+            missing = set()
+            for error in getattr(response, 'errors', None) or []:
+                if error.category == 'OBJECT_NOT_FOUND':
+                    missing.update(str(id) for id in (error.context or {}).get('ids', []))
+                else:
+                    logger.error("Error: %s %s", error.message, error.context, extra={'event': name})
+            for item in inputs:
+                if str(item['id']) in missing:
+                    forget(access_token, object_type, item['properties'][EXTERNAL_PROPERTIES[object_type]])
+                    logger.error("Object %s not found, dropped from the index.", item['id'], extra={'event': name})
+            return response
+
+        failed = self.uploadBatches(access_token, (creates[i:i+size] for i in range(0, len(creates), size)), create, name)
+        failed += self.uploadBatches(access_token, (updates[i:i+size] for i in range(0, len(updates), size)), update, 'update-{}'.format(name))
+        return failed
+
+
+    def syncAssociations(self, access_token, pairs, name):
+        """
+        Associates contacts and companies given by their character_id and location_id,
+        resolving both through the local index instead of reading HubSpot.
+
+        :param pairs: Iterable of (character_id, location_id) pairs.
+        :type pairs: iterable
+        :return: List of the association batches that could not be created.
+        :rtype: list
+        """
+        pairs = [(str(character), str(location)) for character, location in pairs if character not in (None, '') and location not in (None, '')]
+        contacts = object_ids(access_token, 'contacts', {character for character, _ in pairs})
+        companies = object_ids(access_token, 'companies', {location for _, location in pairs})
+        data = association_inputs(
+            (contacts[character], companies[location]) for character, location in pairs
+            if character in contacts and location in companies
+        )
+        client, size = get_client(access_token), self.batchSize
+        return self.uploadBatches(
+            access_token,
+            (data[i:i+size] for i in range(0, len(data), size)),
+            lambda inputs: client.crm.associations.v4.batch_api.create_default(
+                from_object_type="contacts",
+                to_object_type="companies",
+                batch_input_public_default_association_multi_post=BatchInputPublicDefaultAssociationMultiPost(inputs=inputs)
+            ),
+            name
+        )
 
 
 class requestContacts(requestRM):
@@ -239,55 +990,65 @@ class requestContacts(requestRM):
 
     def post(self, request, *args, **kwargs):
         """
-        Handles POST requests to create batches of contacts in HubSpot.
+        Handles POST requests queuing the migration of contacts to HubSpot as a background job.
 
         :param request: HTTP request.
         :type request: rest_framework.request.Request
+        :return: Response with the ID of the queued job.
+        :rtype: rest_framework.response.Response
+        """
+        job = enqueue('contacts')
+        return Response({'succes': 'The migration of contacts has been queued.', 'job': job.id}, status=status.HTTP_202_ACCEPTED)
+
+    def migrate(self):
+        """
+        Creates batches of contacts in HubSpot, run by the background job worker.
+
+        A run stopped halfway is resumed from the migration ledger (app.ledger): only the
+        contacts not committed to HubSpot yet are created. Runs never overlap, see migrationLock.
+
         :return: Response indicating the success or failure of the batch creation.
         :rtype: rest_framework.response.Response
         """
         try:
-            client = hubspot.Client.create(access_token=HUBSOPT_SOURCE_KEY)
-            public_object_search_request = PublicObjectSearchRequest(properties=["hs_object_id"], filter_groups=[{"filters":[{"propertyName":"character_id","value":1,"operator":"GTE"}]}],limit=1)
-            response = client.crm.contacts.search_api.do_search(public_object_search_request=public_object_search_request)
-            if response.total >= 1:
-                return Response({'details': 'The migrations have already been carried out, you cannot do it again'}, status=status.HTTP_208_ALREADY_REPORTED)
+            with self.migrationLock('contacts'):
+                client = get_client(HUBSOPT_SOURCE_KEY)
+                public_object_search_request = PublicObjectSearchRequest(properties=["hs_object_id"], filter_groups=[{"filters":[{"propertyName":"character_id","value":1,"operator":"GTE"}]}],limit=1)
+                response = client.crm.contacts.search_api.do_search(public_object_search_request=public_object_search_request)
+                ledger = open_ledger('contacts', response.total, partial=self.partial)
+                if ledger is None:
+                    return Response({'details': 'The migrations have already been carried out, you cannot do it again'}, status=status.HTTP_208_ALREADY_REPORTED)
 
-            data = self.get_characters()
-            size = 50
-            batchCharacters = [data[i:i+size] for i in range(0, len(data), size)]
+                known = committed_ids(HUBSOPT_SOURCE_KEY, 'contacts', response.total)
+                self.progress('resuming contacts' if known else 'fetching and uploading contacts')
+                batches = serialize_batches(uncommitted(ledger, self.selected(self.stream_characters()), known, 'id'), self.serializer_class, size=self.batchSize)
 
-            
-            for batch in batchCharacters:
-                serializer = self.serializer_class(batch, many=True)
-                dataInput = [{"properties": item} for item in serializer.data]
+                def push(inputs):
+                    remember_results(HUBSOPT_SOURCE_KEY, 'contacts', client.crm.contacts.batch_api.create(
+                        batch_input_simple_public_object_input_for_create=BatchInputSimplePublicObjectInputForCreate(inputs=inputs)
+                    ), digests(inputs, 'contacts'))
+                    record_batch(ledger, len(inputs))
 
-                batch_input_simple_public_object_input_for_create = BatchInputSimplePublicObjectInputForCreate(
-                    inputs=dataInput
-                )
-
-                client.crm.contacts.batch_api.create(
-                    batch_input_simple_public_object_input_for_create=batch_input_simple_public_object_input_for_create
-                )
+                failed = self.uploadBatches(HUBSOPT_SOURCE_KEY, batches, push, 'requestCharacters')
+                close_ledger(ledger, failed)
 
 
             public_object_search_request = PublicObjectSearchRequest(properties=["hs_object_id"], filter_groups=[{"filters":[{"propertyName":"location_id","value":1,"operator":"GTE"}]}],limit=1)
             response = client.crm.companies.search_api.do_search(public_object_search_request=public_object_search_request)
+            message = 'The batches of clients have been created.'
             if response.total >= 1:
                 try:
                     self.makeAssociations(access_token=HUBSOPT_SOURCE_KEY)
-                    return Response({'succes': 'the batches of clients have been created and associated.'}, status=status.HTTP_201_CREATED)
+                    message = 'the batches of clients have been created and associated.'
                 except Exception as e:
-                    date = timezone.now().strftime("%Y-%m-%d %H:%M")
-                    with open(os.path.join(settings.BASE_DIR, 'logs/core.log'), 'a') as f:
-                        f.write("makeAssociations-requestContacts {} --> Error: {}\n".format(date, str(e)))
+                    logger.error("Error: %s", e, extra={'event': 'makeAssociations-requestContacts'})
 
-            return Response({'succes': 'The batches of clients have been created.'}, status=status.HTTP_201_CREATED)
+            if failed:
+                return Response({'error': 'Some batches of clients could not be created.', 'failed': failed}, status=status.HTTP_207_MULTI_STATUS)
+            return Response({'succes': message}, status=status.HTTP_201_CREATED)
 
         except Exception as e:
-            date = timezone.now().strftime("%Y-%m-%d %H:%M")
-            with open(os.path.join(settings.BASE_DIR, 'logs/core.log'), 'a') as f:
-                f.write("requestCharacters {} --> Error: {}\n".format(date, str(e)))
+            logger.error("Error: %s", e, extra={'event': 'requestCharacters'})
             return Response({'error': 'Error fetching characters.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
@@ -305,59 +1066,215 @@ class requestCompanies(requestRM):
 
     def post(self, request, *args, **kwargs):
         """
-        Handles POST requests to create batches of companies in HubSpot.
+        Handles POST requests queuing the migration of companies to HubSpot as a background job.
 
         :param request: HTTP request.
         :type request: rest_framework.request.Request
-        :return: Response indicating the success or failure of the batch creation.
+        :return: Response with the ID of the queued job.
         :rtype: rest_framework.response.Response
         """
-        try:
+        job = enqueue('companies')
+        return Response({'succes': 'The migration of companies has been queued.', 'job': job.id}, status=status.HTTP_202_ACCEPTED)
 
-            client = hubspot.Client.create(access_token=HUBSOPT_SOURCE_KEY)
-            public_object_search_request = PublicObjectSearchRequest(properties=["hs_object_id"], filter_groups=[{"filters":[{"propertyName":"location_id","value":1,"operator":"GTE"}]}],limit=1)
-            response = client.crm.companies.search_api.do_search(public_object_search_request=public_object_search_request)
-            if response.total >= 1:
-                return Response({'details': 'The migrations have already been carried out, you cannot do it again'}, status=status.HTTP_208_ALREADY_REPORTED)
+    def selectedContacts(self, access_token, contacts):
+        """
+        Keeps the contacts of the locations picked with `only_ids`, all of them when it is not set.
+        """
+        if self.only_ids is None:
+            return contacts
+        picked = {str(location_id) for location_id in self.only_ids}
+        return (pair for pair in contacts if str(pair[1]) in picked)
 
-            data = self.get_locations()
+    def migrate(self):
+        """
+        Creates batches of companies in HubSpot, run by the background job worker.
 
-            size = 50
-            batchLocations = [data[i:i+size] for i in range(0, len(data), size)]
+        A run stopped halfway is resumed from the migration ledger (app.ledger): only the
+        companies not committed to HubSpot yet are created. Runs never overlap, see migrationLock.
 
-            
-            for batch in batchLocations:
-                serializer = self.serializer_class(batch, many=True)
-                dataInput = [{"properties": item} for item in serializer.data]
+        :return: Response indicating the success or failure of the batch creation.
+        :rtype: rest_framework.response.Response
+        """
+        try:
 
-                batch_input_simple_public_object_input_for_create = BatchInputSimplePublicObjectInputForCreate(
-                    inputs=dataInput
-                )
+            with self.migrationLock('companies'):
+                client = get_client(HUBSOPT_SOURCE_KEY)
+                public_object_search_request = PublicObjectSearchRequest(properties=["hs_object_id"], filter_groups=[{"filters":[{"propertyName":"location_id","value":1,"operator":"GTE"}]}],limit=1)
+                response = client.crm.companies.search_api.do_search(public_object_search_request=public_object_search_request)
+                ledger = open_ledger('companies', response.total, partial=self.partial)
+                if ledger is None:
+                    return Response({'details': 'The migrations have already been carried out, you cannot do it again'}, status=status.HTTP_208_ALREADY_REPORTED)
 
-                client.crm.companies.batch_api.create(
-                    batch_input_simple_public_object_input_for_create=batch_input_simple_public_object_input_for_create
-                )
+                known = committed_ids(HUBSOPT_SOURCE_KEY, 'companies', response.total)
+                self.progress('resuming companies' if known else 'fetching and uploading companies')
+                batches = serialize_batches(uncommitted(ledger, self.selected(self.stream_locations()), known, 'id'), self.serializer_class, size=self.batchSize)
+
+                def push(inputs):
+                    remember_results(HUBSOPT_SOURCE_KEY, 'companies', client.crm.companies.batch_api.create(
+                        batch_input_simple_public_object_input_for_create=BatchInputSimplePublicObjectInputForCreate(inputs=inputs)
+                    ), digests(inputs, 'companies'))
+                    record_batch(ledger, len(inputs))
+
+                failed = self.uploadBatches(HUBSOPT_SOURCE_KEY, batches, push, 'requestLocations')
+                close_ledger(ledger, failed)
 
             public_object_search_request = PublicObjectSearchRequest(properties=["hs_object_id"], filter_groups=[{"filters":[{"propertyName":"character_id","value":1,"operator":"GTE"}]}],limit=1)
             response = client.crm.contacts.search_api.do_search(public_object_search_request=public_object_search_request)
+            message = 'The batches of companies have been created.'
             if response.total >= 1:
                 try:
                     self.makeAssociations(access_token=HUBSOPT_SOURCE_KEY)
-                    return Response({'succes': 'the batches of companies have been created and associated.'}, status=status.HTTP_201_CREATED)
+                    message = 'the batches of companies have been created and associated.'
                 except Exception as e:
-                    date = timezone.now().strftime("%Y-%m-%d %H:%M")
-                    with open(os.path.join(settings.BASE_DIR, 'logs/core.log'), 'a') as f:
-                        f.write("makeAssociations-requestCompanies {} --> Error: {}\n".format(date, str(e)))
+                    logger.error("Error: %s", e, extra={'event': 'makeAssociations-requestCompanies'})
 
-            return Response({'succes': 'The batches of companies have been created.'}, status=status.HTTP_201_CREATED)
+            if failed:
+                return Response({'error': 'Some batches of companies could not be created.', 'failed': failed}, status=status.HTTP_207_MULTI_STATUS)
+            return Response({'succes': message}, status=status.HTTP_201_CREATED)
 
         except Exception as e:
-            date = timezone.now().strftime("%Y-%m-%d %H:%M")
-            with open(os.path.join(settings.BASE_DIR, 'logs/core.log'), 'a') as f:
-                f.write("requestLocations {} --> Error: {}\n".format(date, str(e)))
+            logger.error("Error: %s", e, extra={'event': 'requestLocations'})
             return Response({'error': 'Error fetching locations.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class syncContacts(requestContacts):
+    """
+    API view refreshing the contacts of HubSpot from the RAM API (delta sync).
+
+    Attributes:
+    - permission_classes: List of permission classes, allowing any user to access.
+    - serializer_class: Serializer class for character information.
+    """
+    def post(self, request, *args, **kwargs):
+        """
+        Handles POST requests queuing the delta sync of contacts as a background job.
+        """
+        job = enqueue('sync-contacts')
+        return Response({'succes': 'The sync of contacts has been queued.', 'job': job.id}, status=status.HTTP_202_ACCEPTED)
+
+    def planDelta(self):
+        """
+        Compares the contacts of the RAM API with the ones last synced, see app.sync.plan.
+
+        The characters are read past the RAM API cache (app.cache), which they refresh, so
+        the sync compares what the RAM API serves now and not a catalogue cached up to
+        RAMAPI_CACHE_TTL seconds ago.
+
+        :return: Inputs to create, inputs to update and the number of unchanged contacts.
+        :rtype: tuple of (list, list, int)
+        """
+        ramcache.get_cache().invalidate('character:')
+        return plan(HUBSOPT_SOURCE_KEY, 'contacts', serialize_batches(self.selected(self.stream_characters()), self.serializer_class, size=self.batchSize))
+
+    def migrate(self):
+        """
+        Creates the new contacts and updates the changed ones only, comparing the hash of
+        their properties with the one last synced; new and changed contacts are associated
+        with their company.
+
+        :return: Response with the number of created, updated and unchanged contacts.
+        :rtype: rest_framework.response.Response
+        """
+        try:
+            with self.migrationLock('contacts'):
+                client = get_client(HUBSOPT_SOURCE_KEY)
+                public_object_search_request = PublicObjectSearchRequest(properties=["hs_object_id"], filter_groups=[{"filters":[{"propertyName":"character_id","value":1,"operator":"GTE"}]}],limit=1)
+                response = client.crm.contacts.search_api.do_search(public_object_search_request=public_object_search_request)
+                committed_ids(HUBSOPT_SOURCE_KEY, 'contacts', response.total)
+
+                self.progress('comparing contacts')
+                creates, updates, unchanged = self.planDelta()
+
+                self.progress('uploading contacts')
+                failed = self.pushDelta(HUBSOPT_SOURCE_KEY, 'contacts', creates, updates, 'syncCharacters')
+
+                self.progress('uploading associations')
+                failed += self.syncAssociations(
+                    HUBSOPT_SOURCE_KEY,
+                    ((item['properties']['character_id'], item['properties']['location_id']) for item in creates + updates),
+                    'syncAssociations-syncContacts'
+                )
+
+                data = {'created': len(creates), 'updated': len(updates), 'unchanged': unchanged}
+                if failed:
+                    return Response(dict(data, error='Some batches of clients could not be synced.', failed=failed), status=status.HTTP_207_MULTI_STATUS)
+                return Response(dict(data, succes='The clients have been synced.'), status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error("Error: %s", e, extra={'event': 'syncCharacters'})
+            return Response({'error': 'Error syncing characters.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class syncCompanies(requestCompanies):
+    """
+    API view refreshing the companies of HubSpot from the RAM API (delta sync).
+
+    Attributes:
+    - permission_classes: List of permission classes, allowing any user to access.
+    - serializer_class: Serializer class for location information.
+    """
+    def post(self, request, *args, **kwargs):
+        """
+        Handles POST requests queuing the delta sync of companies as a background job.
+        """
+        job = enqueue('sync-companies')
+        return Response({'succes': 'The sync of companies has been queued.', 'job': job.id}, status=status.HTTP_202_ACCEPTED)
+
+    def planDelta(self):
+        """
+        Compares the companies of the RAM API with the ones last synced, see app.sync.plan.
+
+        Characters and locations are read past the RAM API cache, see syncContacts.planDelta.
+
+        :return: Inputs to create, inputs to update and the number of unchanged companies.
+        :rtype: tuple of (list, list, int)
+        """
+        cache = ramcache.get_cache()
+        cache.invalidate('character:')
+        cache.invalidate('location:')
+        return plan(HUBSOPT_SOURCE_KEY, 'companies', serialize_batches(self.selected(self.stream_locations()), self.serializer_class, size=self.batchSize))
+
+    def migrate(self):
+        """
+        Creates the new companies and updates the changed ones only, comparing the hash of
+        their properties with the one last synced; new companies are associated with the
+        contacts sharing their location.
+
+        :return: Response with the number of created, updated and unchanged companies.
+        :rtype: rest_framework.response.Response
+        """
+        try:
+            with self.migrationLock('companies'):
+                client = get_client(HUBSOPT_SOURCE_KEY)
+                public_object_search_request = PublicObjectSearchRequest(properties=["hs_object_id"], filter_groups=[{"filters":[{"propertyName":"location_id","value":1,"operator":"GTE"}]}],limit=1)
+                response = client.crm.companies.search_api.do_search(public_object_search_request=public_object_search_request)
+                committed_ids(HUBSOPT_SOURCE_KEY, 'companies', response.total)
+
+                self.progress('comparing companies')
+                creates, updates, unchanged = self.planDelta()
+
+                self.progress('uploading companies')
+                failed = self.pushDelta(HUBSOPT_SOURCE_KEY, 'companies', creates, updates, 'syncLocations')
+
+                created = {str(item['properties']['location_id']) for item in creates}
+                if created:
+                    self.progress('uploading associations')
+                    failed += self.syncAssociations(
+                        HUBSOPT_SOURCE_KEY,
+                        ((character['id'], location_id_from_url(character.get('location', {}).get('url', ''))) for character in self.stream_characters()
+                         if str(location_id_from_url(character.get('location', {}).get('url', ''))) in created),
+                        'syncAssociations-syncCompanies'
+                    )
+
+                data = {'created': len(creates), 'updated': len(updates), 'unchanged': unchanged}
+                if failed:
+                    return Response(dict(data, error='Some batches of companies could not be synced.', failed=failed), status=status.HTTP_207_MULTI_STATUS)
+                return Response(dict(data, succes='The companies have been synced.'), status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error("Error: %s", e, extra={'event': 'syncLocations'})
+            return Response({'error': 'Error syncing locations.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 
         
 
@@ -379,53 +1296,10 @@ class mirrorHubspotContacts(requestRM):
         :return: Response indicating the success or failure of the operation.
         :rtype: rest_framework.response.Response
         """
-        hubspot_secret = request.headers.get('HubSpotSecret')
-
-        if not hubspot_secret:
-            return Response({'error': 'HubSpotSecret not Found'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if hubspot_secret != HUBSOPT_SOURCE_KEY:
-            return Response({'error': 'Authentication failed: X-HubSpot-Secret mismatch.'}, status=status.HTTP_401_UNAUTHORIZED)
-
-        try:
-            client = hubspot.Client.create(access_token=HUBSOPT_MIRROR_KEY)
-            
-            data = request.data
-            characterID = data.get('character_id', '')
-
-            properties = {
-                "character_id": data.get('character_id', ''),
-                "firstname": data.get('firstname', ''),
-                "lastname": data.get('lastname', ''),
-                "status_character": data.get('status_character', ''),
-                "character_species": data.get('character_species', ''),
-                "character_gender": data.get('character_gender', ''),
-                "location_id": data.get('location_id', '')
-            }
-
-
-            public_object_search_request = PublicObjectSearchRequest(properties=["hs_object_id"], filter_groups=[{"filters":[{"propertyName":"character_id","value":characterID,"operator":"EQ"}]}],limit=1)
-            response = client.crm.contacts.search_api.do_search(public_object_search_request=public_object_search_request)
-            if response.total > 0:
-                contactID = response.results[0].properties.get('hs_object_id', None)
-                simple_public_object_input = SimplePublicObjectInput(properties=properties)
-                client.crm.contacts.basic_api.update(contact_id=contactID, simple_public_object_input=simple_public_object_input)
-                
-                try:
-                    self.makeAssociations(access_token=HUBSOPT_MIRROR_KEY)
-                except Exception as e:
-                    date = timezone.now().strftime("%Y-%m-%d %H:%M")
-                    with open(os.path.join(settings.BASE_DIR, 'logs/core.log'), 'a') as f:
-                        f.write("makeAssociations-mirrorHubspotContacts {} --> Error: {}\n".format(date, str(e)))
-
-                return Response({'succes': 'The contact has been update.'}, status=status.HTTP_200_OK)
-
-            simple_public_object_input_for_create = SimplePublicObjectInputForCreate(properties=properties)
-            client.crm.contacts.basic_api.create(simple_public_object_input_for_create=simple_public_object_input_for_create)
-            return Response({'succes': 'The contact has been created.'}, status=status.HTTP_201_CREATED)
-
-        except ApiException as e:
-            return Response({'error': 'Failed to update/created client.'}, status=status.HTTP_403_FORBIDDEN)
+        rejected = self.checkSecret(request)
+        if rejected is not None:
+            return rejected
+        return self.mirrorPayload('contacts', request.data, 'mirrorHubspotContacts')
 
 
 
@@ -448,51 +1322,10 @@ class mirrorHubspotCompanies(requestRM):
         :return: Response indicating the success or failure of the operation.
         :rtype: rest_framework.response.Response
         """
-        hubspot_secret = request.headers.get('HubSpotSecret')
-
-        if not hubspot_secret:
-            return Response({'error': 'HubSpotSecret not Found'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if hubspot_secret != HUBSOPT_SOURCE_KEY:
-            return Response({'error': 'Authentication failed: X-HubSpot-Secret mismatch.'}, status=status.HTTP_401_UNAUTHORIZED)
-
-        try:
-            client = hubspot.Client.create(access_token=HUBSOPT_MIRROR_KEY)
-            
-            data = request.data
-            locationID = data.get('location_id', '')
-
-            properties = {
-                "location_id": data.get('location_id', ''),
-                "name": data.get('name', ''),
-                "location_type": data.get('location_type', ''),
-                "dimension": data.get('dimension', ''),
-                "creation_date": data.get('creation_date', '')
-            }
-
-
-            public_object_search_request = PublicObjectSearchRequest(properties=["hs_object_id"], filter_groups=[{"filters":[{"propertyName":"location_id","value":locationID,"operator":"EQ"}]}],limit=1)
-            response = client.crm.companies.search_api.do_search(public_object_search_request=public_object_search_request)
-            if response.total > 0:
-                companyID = response.results[0].properties.get('hs_object_id', None)
-                simple_public_object_input = SimplePublicObjectInput(properties=properties)
-                client.crm.companies.basic_api.update(company_id=companyID, simple_public_object_input=simple_public_object_input)
-                
-                try:
-                    self.makeAssociations(access_token=HUBSOPT_MIRROR_KEY)
-                except Exception as e:
-                    date = timezone.now().strftime("%Y-%m-%d %H:%M")
-                    with open(os.path.join(settings.BASE_DIR, 'logs/core.log'), 'a') as f:
-                        f.write("makeAssociations-mirrorHubspotCompanies {} --> Error: {}\n".format(date, str(e)))
-
-                return Response({'succes': 'The company has been update.'}, status=status.HTTP_200_OK)
-
-            simple_public_object_input_for_create = SimplePublicObjectInputForCreate(properties=properties)
-            client.crm.companies.basic_api.create(simple_public_object_input_for_create=simple_public_object_input_for_create)
-            return Response({'succes': 'The company has been created.'}, status=status.HTTP_201_CREATED)
-
-        except ApiException as e:
-            return Response({'error': 'Failed to update/created company.'}, status=status.HTTP_403_FORBIDDEN)
+        rejected = self.checkSecret(request)
+        if rejected is not None:
+            return rejected
+        return self.mirrorPayload('companies', request.data, 'mirrorHubspotCompanies')
 
 
 
@@ -506,14 +1339,26 @@ class sourceHubspotAssociations(requestRM):
     permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
+        """
+        Handles POST requests scheduling the associations as a background job.
+
+        Requests made before the job starts are folded into it, see app.jobs.schedule.
+        """
+        job = schedule('associations-source', settings.ASSOCIATIONS_DEBOUNCE, settings.ASSOCIATIONS_MAX_DELAY)
+        return Response({'succes': 'The associations have been queued.', 'job': job.id, 'scheduled': job.scheduled}, status=status.HTTP_202_ACCEPTED)
+
+    def migrate(self):
+        """
+        Creates the associations, run by the background job worker.
+        """
         try:
-            self.makeAssociations(access_token=HUBSOPT_SOURCE_KEY)
-            return Response({'succes': 'The company has been update.'}, status=status.HTTP_200_OK)
+            failed = self.makeAssociations(access_token=HUBSOPT_SOURCE_KEY)
+            if failed:
+                return Response({'error': 'Some batches of associations could not be created.', 'failed': failed}, status=status.HTTP_207_MULTI_STATUS)
+            return Response({'succes': 'The associations have been created.'}, status=status.HTTP_200_OK)
         except Exception as e:
-            date = timezone.now().strftime("%Y-%m-%d %H:%M")
-            with open(os.path.join(settings.BASE_DIR, 'logs/core.log'), 'a') as f:
-                f.write("makeAssociations-sourceHubspotAssociations {} --> Error: {}\n".format(date, str(e)))
-            return Response({'error': 'MirrorHubspot associations cannot be made.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            logger.error("Error: %s", e, extra={'event': 'makeAssociations-sourceHubspotAssociations'})
+            return Response({'error': 'SourceHubspot associations cannot be made.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class mirrorHubspotAssociations(requestRM):
     """
@@ -525,10 +1370,152 @@ class mirrorHubspotAssociations(requestRM):
     permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
+        """
+        Handles POST requests scheduling the associations as a background job.
+
+        Requests made before the job starts are folded into it, see app.jobs.schedule.
+        """
+        job = schedule('associations-mirror', settings.ASSOCIATIONS_DEBOUNCE, settings.ASSOCIATIONS_MAX_DELAY)
+        return Response({'succes': 'The associations have been queued.', 'job': job.id, 'scheduled': job.scheduled}, status=status.HTTP_202_ACCEPTED)
+
+    def migrate(self):
+        """
+        Creates the associations, run by the background job worker.
+        """
         try:
-            self.makeAssociations(access_token=HUBSOPT_MIRROR_KEY)
+            failed = self.makeAssociations(access_token=HUBSOPT_MIRROR_KEY)
+            if failed:
+                return Response({'error': 'Some batches of associations could not be created.', 'failed': failed}, status=status.HTTP_207_MULTI_STATUS)
+            return Response({'succes': 'The associations have been created.'}, status=status.HTTP_200_OK)
         except Exception as e:
-            date = timezone.now().strftime("%Y-%m-%d %H:%M")
-            with open(os.path.join(settings.BASE_DIR, 'logs/core.log'), 'a') as f:
-                f.write("makeAssociations-mirrorHubspotAssociations {} --> Error: {}\n".format(date, str(e)))
-            return Response({'error': 'MirrorHubspot associations cannot be made.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            logger.error("Error: %s", e, extra={'event': 'makeAssociations-mirrorHubspotAssociations'})
+            return Response({'error': 'MirrorHubspot associations cannot be made.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ingestHubspotEvents(requestRM):
+    """
+    API view queuing HubSpot webhook events for the mirror portal, see app.webhooks.
+
+    Takes one event or a list of them and answers as soon as they are queued; repeated
+    events of a record are coalesced and a background flusher mirrors them in batches.
+
+    Attributes:
+    - permission_classes: List of permission classes, allowing any user to access.
+    - object_type: 'contacts' or 'companies'.
+    - fields: Properties copied from each event.
+    """
+    permission_classes = [AllowAny]
+    object_type = None
+    fields = []
+
+    def post(self, request, *args, **kwargs):
+        """
+        Handles POST requests queuing webhook events.
+
+        :param request: HTTP request.
+        :type request: rest_framework.request.Request
+        :return: Response with the number of events received and records pending.
+        :rtype: rest_framework.response.Response
+        """
+        rejected = self.checkSecret(request)
+        if rejected is not None:
+            return rejected
+        return self.ingestEvents(self.object_type, request.data, self.fields, type(self).__name__)
+
+
+class ingestHubspotContacts(ingestHubspotEvents):
+    object_type = 'contacts'
+    fields = CONTACT_PROPERTIES
+
+
+class ingestHubspotCompanies(ingestHubspotEvents):
+    object_type = 'companies'
+    fields = COMPANY_PROPERTIES
+
+
+class ramapiCache(generics.GenericAPIView):
+    """
+    API view for the local RAM API cache.
+
+    Attributes:
+    - permission_classes: List of permission classes, allowing any user to access.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Handles GET requests returning the cache size and hit/miss counters.
+        """
+        return Response(ramcache.get_cache().stats(), status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        """
+        Handles DELETE requests invalidating the cache, optionally only the keys starting
+        with the 'prefix' query parameter (e.g. 'character:' or 'location:').
+        """
+        removed = ramcache.get_cache().invalidate(prefix=request.query_params.get('prefix', ''))
+        return Response({'succes': 'The cache has been invalidated.', 'removed': removed}, status=status.HTTP_200_OK)
+
+
+class hubspotPools(generics.GenericAPIView):
+    """
+    API view for the shared HubSpot clients and their connection pools.
+
+    Attributes:
+    - permission_classes: List of permission classes, allowing any user to access.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Handles GET requests returning the connection pool statistics per token.
+        """
+        return Response({'pool_maxsize': registry.pool_maxsize, 'clients': registry.stats()}, status=status.HTTP_200_OK)
+
+
+class jobStatus(generics.GenericAPIView):
+    """
+    API view reporting the progress of a background migration job.
+
+    Attributes:
+    - permission_classes: List of permission classes, allowing any user to access.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk, *args, **kwargs):
+        """
+        Handles GET requests returning the state, stage, processed records, throughput and errors of a job.
+        """
+        job = Job.objects.filter(pk=pk).first()
+        if job is None:
+            return Response({'error': 'Job not Found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'job': job.id,
+            'kind': job.kind,
+            'state': job.state,
+            'stage': job.stage,
+            'processed': job.processed,
+            'throughput': throughput(job),
+            'errors': job.errors,
+            'result': job.result,
+            'created': job.created,
+            'scheduled': job.scheduled,
+            'started': job.started,
+            'finished': job.finished,
+        }, status=status.HTTP_200_OK)
+
+
+class metricsView(generics.GenericAPIView):
+    """
+    API view exposing the stage timings and API call metrics in the Prometheus text format.
+
+    Attributes:
+    - permission_classes: List of permission classes, allowing any user to access.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Handles GET requests returning the metrics of every process sharing the database.
+        """
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,210 @@
+import logging, os, threading, uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from app.models import WebhookEvent
+from app.mapping import EXTERNAL_PROPERTIES
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Companies go first so the contacts flushed right after find the companies to be associated with.
+OBJECT_TYPES = ['companies', 'contacts']
+
+
+def ingest(object_type, events, fields):
+    """
+    Queues webhook events, keeping a single pending event per record.
+
+    Events of the same record are coalesced: the one with the latest occurredAt wins, the
+    last one received when they have none. An event older than the one already pending
+    for its record is dropped. Events without character_id / location_id are ignored. A
+    new event of a dead-lettered record (see flush) queues it again.
+
+    :param object_type: 'contacts' or 'companies'.
+    :type object_type: str
+    :param events: Webhook payloads, properties of the record and an optional occurredAt (epoch milliseconds).
+    :type events: list
+    :param fields: Properties copied from each payload.
+    :type fields: list
+    :return: Number of records pending for the object type once the events are queued.
+    :rtype: int
+    :raises ValueError: When an occurredAt is not an integer, before anything is queued.
+    """
+    prop = EXTERNAL_PROPERTIES[object_type]
+    latest, coalesced = {}, 0
+    for event in events:
+        properties = {name: event.get(name, '') for name in fields}
+        if properties[prop] in (None, ''):
+            continue
+        occurred = occurred_at(event)
+        key = str(properties[prop])
+        if key in latest:
+            coalesced += 1
+            if occurred < latest[key][1]:
+                continue
+        latest[key] = (properties, occurred)
+
+    with transaction.atomic():
+        pending = dict(WebhookEvent.objects.filter(object_type=object_type, external_id__in=list(latest)).values_list('external_id', 'occurred'))
+        stale = [key for key, (_, occurred) in latest.items() if occurred and occurred < pending.get(key, 0)]
+        for key in stale:
+            del latest[key]
+        WebhookEvent.objects.bulk_create(
+            [
+                WebhookEvent(object_type=object_type, external_id=key, properties=properties, occurred=occurred, received=timezone.now())
+                for key, (properties, occurred) in latest.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['object_type', 'external_id'],
+            update_fields=['properties', 'occurred', 'received', 'claimed', 'claimed_at', 'attempts'],
+        )
+    queued = sum(1 for key in latest if key not in pending)
+    coalesced += len(latest) - queued
+
+    metrics.inc('webhook_events_total', queued, object_type=object_type, outcome='queued')
+    metrics.inc('webhook_events_total', coalesced, object_type=object_type, outcome='coalesced')
+    metrics.inc('webhook_events_total', len(stale), object_type=object_type, outcome='stale')
+    return WebhookEvent.objects.filter(object_type=object_type, attempts__lt=settings.WEBHOOK_MAX_ATTEMPTS).count()
+
+
+def occurred_at(event):
+    """
+    occurredAt of a webhook event in epoch milliseconds, 0 when missing.
+
+    :raises ValueError: When it is not an integer.
+    """
+    value = event.get('occurredAt')
+    if value in (None, ''):
+        return 0
+    if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+        raise ValueError("Invalid occurredAt: {!r}".format(value))
+    return int(value)
+
+
+def claimable():
+    stale = timezone.now() - timedelta(seconds=settings.WEBHOOK_CLAIM_TIMEOUT)
+    return (Q(claimed='') | Q(claimed_at__lt=stale)) & Q(attempts__lt=settings.WEBHOOK_MAX_ATTEMPTS)
+
+
+def flush(object_type, full_only=False):
+    """
+    Claims up to WEBHOOK_BATCH_SIZE pending events of an object type and mirrors them in
+    bulk, see requestRM.mirrorBulk.
+
+    Claims are safe across processes; a claim not released within WEBHOOK_CLAIM_TIMEOUT
+    seconds (e.g. the process died) is taken over. Events are deleted once their record is
+    mirrored; an event received again while its batch was being pushed stays pending with
+    its new properties. The events of the records that could not be mirrored are released
+    for the next flush; after WEBHOOK_MAX_ATTEMPTS failures an event is dead-lettered: it
+    stays in the table (see the admin) but is no longer flushed.
+
+    :param object_type: 'contacts' or 'companies'.
+    :type object_type: str
+    :param full_only: Only flush when a whole batch is pending.
+    :type full_only: bool
+    :return: Number of events mirrored.
+    :rtype: int
+    """
+    size = settings.WEBHOOK_BATCH_SIZE
+    candidates = WebhookEvent.objects.filter(claimable(), object_type=object_type)
+    ids = list(candidates.order_by('received').values_list('pk', flat=True)[:size])
+    if not ids or (full_only and len(ids) < size):
+        return 0
+
+    token = uuid.uuid4().hex
+    WebhookEvent.objects.filter(claimable(), pk__in=ids).update(claimed=token, claimed_at=timezone.now())
+    claimed = WebhookEvent.objects.filter(claimed=token)
+    records = list(claimed.values_list('properties', flat=True))
+    if not records:
+        return 0
+
+    prop = EXTERNAL_PROPERTIES[object_type]
+    try:
+        with metrics.stage('webhook_flush'):
+            results, _, _ = import_string('app.views.requestRM')().mirrorRecords(object_type, records, 'flushWebhooks-{}'.format(object_type))
+        mirrored = {str(result['properties'].get(prop)) for result in results}
+    except Exception as e:
+        logger.error("Error: %s", e, extra={'event': 'flushWebhooks'})
+        mirrored = set()
+
+    claimed.filter(external_id__in=mirrored).delete()
+    failed = claimed.exclude(external_id__in=mirrored)
+    dead = list(failed.filter(attempts__gte=settings.WEBHOOK_MAX_ATTEMPTS - 1).values_list('external_id', flat=True))
+    failed.update(claimed='', claimed_at=None, attempts=F('attempts') + 1)
+    for external_id in dead:
+        logger.error("Event of %s %s dead-lettered after %s attempts.", object_type, external_id, settings.WEBHOOK_MAX_ATTEMPTS, extra={'event': 'flushWebhooks'})
+
+    outcome = 'done' if len(mirrored) == len(records) else 'partial' if mirrored else 'failed'
+    metrics.inc('webhook_flushes_total', object_type=object_type, outcome=outcome)
+    metrics.inc('webhook_events_total', len(dead), object_type=object_type, outcome='dead')
+    return len(mirrored)
+
+
+def flush_pending(full_only=False):
+    """
+    Flushes the pending events of every object type, batch after batch.
+
+    :param full_only: Stop at the first batch that is not full (size trigger).
+    :type full_only: bool
+    :return: Number of events mirrored.
+    :rtype: int
+    """
+    total = 0
+    for object_type in OBJECT_TYPES:
+        while True:
+            flushed = flush(object_type, full_only)
+            total += flushed
+            if not flushed:
+                break
+    return total
+
+
+class Flusher:
+    """
+    Background thread of a process flushing the webhook events.
+
+    It flushes everything pending every `interval` seconds, and right away when
+    notify() reports a full batch. It is started on the first notify(), again in a forked
+    child that did not inherit it.
+
+    :param interval: Seconds between two flushes of whatever is pending.
+    :type interval: float
+    """
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def notify(self, pending):
+        """
+        Starts the flusher when needed and wakes it up when `pending` fills a batch.
+        """
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.thread = threading.Thread(target=self._flush_forever, name='webhook-flush', daemon=True)
+                    self.thread.start()
+                    self.pid = os.getpid()
+        if pending >= settings.WEBHOOK_BATCH_SIZE:
+            self.wakeup.set()
+
+    def _flush_forever(self):
+        while True:
+            full_only = self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                flush_pending(full_only=full_only)
+            except Exception as e:
+                logger.error("Error: %s", e, extra={'event': 'flushWebhooks'})
+            close_old_connections()
+
+
+flusher = Flusher(interval=settings.WEBHOOK_FLUSH_INTERVAL)
@@ -0,0 +1,75 @@
+"""
+Micro-benchmark of the association join used by requestRM.makeAssociations.
+
+Compares the original nested loop against app.associations.join_associations on
+synthetic portals. The nested loop is quadratic, so for large sizes it is timed on a
+sample of contacts and extrapolated to the full set.
+
+    $ python benchmarks/bench_associations.py
+    $ python benchmarks/bench_associations.py --sizes 10000 100000
+"""
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.associations import join_associations
+
+
+def synthetic_portal(size, seed=0):
+    """
+    Builds a synthetic portal of contacts and companies.
+
+    One company exists for every ten contacts, a few companies share a location_id and
+    a few contacts have no location_id, like the records found on real portals.
+
+    :param size: Number of contacts.
+    :type size: int
+    :return: Tuple with contacts and companies as lists of (id, location_id) pairs.
+    :rtype: tuple
+    """
+    rng = random.Random(seed)
+    locations = max(size // 10, 1)
+    companies = [(str(100000 + i), str(i)) for i in range(locations)]
+    companies += [(str(900000 + i), str(rng.randrange(locations))) for i in range(locations // 100)]
+    contacts = [
+        (str(i), str(rng.randrange(locations)) if rng.random() > 0.02 else None)
+        for i in range(size)
+    ]
+    return contacts, companies
+
+
+def nested_loop(contacts, companies):
+    associations = {}
+    for contact_id, contact_location in contacts:
+        for company_id, company_location in companies:
+            if contact_location == company_location:
+                associations[contact_id] = company_id
+    return associations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--sample', type=int, default=1000, help='contacts timed on the nested loop')
+    args = parser.parse_args()
+
+    print("{:>10} {:>10} {:>14} {:>12} {:>10}".format('contacts', 'companies', 'nested (s)', 'hash (s)', 'speedup'))
+    for size in args.sizes:
+        contacts, companies = synthetic_portal(size)
+
+        start = time.perf_counter()
+        pairs = join_associations(contacts, companies)
+        hashed = time.perf_counter() - start
+
+        sample = contacts[:args.sample]
+        start = time.perf_counter()
+        nested_loop(sample, companies)
+        nested = (time.perf_counter() - start) * len(contacts) / len(sample)
+
+        print("{:>10} {:>10} {:>14.2f} {:>12.4f} {:>9.0f}x".format(
+            len(contacts), len(companies), nested, hashed, nested / hashed))
+        assert len(pairs) <= len(contacts)
+
+
+if __name__ == '__main__':
+    main()
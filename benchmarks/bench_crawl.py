@@ -0,0 +1,46 @@
+"""
+Wall-clock scaling of the RAM API character crawl against a local stub server.
+
+The page order and the retries are checked by the tests, see app/tests.py.
+
+    $ python benchmarks/bench_crawl.py
+    $ python benchmarks/bench_crawl.py --latency 0.2 --workers 1 4 16 --failure-rate 0.05
+"""
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django
+django.setup()
+
+import ramapi
+
+from app.crawler import fetch_results
+from benchmarks.stub_ramapi import StubRAMAPI, patch_ramapi
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--characters', type=int, default=826)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    with StubRAMAPI(characters=args.characters, latency=args.latency, failure_rate=args.failure_rate) as stub:
+        patch_ramapi(stub.base_url)
+
+        print("{:>8} {:>10} {:>10} {:>10}".format('workers', 'wall (s)', 'requests', 'speedup'))
+        baseline = None
+        for workers in args.workers:
+            requests_before = stub.requests
+            start = time.perf_counter()
+            fetch_results(ramapi.Character.get_page, workers=workers, retries=5, backoff=0.01)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print("{:>8} {:>10.2f} {:>10} {:>9.1f}x".format(workers, elapsed, stub.requests - requests_before, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
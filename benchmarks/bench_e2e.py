@@ -0,0 +1,248 @@
+"""
+End-to-end migration scenarios against local HubSpot and RAM API stand-ins.
+
+Every scenario drives the real views (requestContacts, requestCompanies, makeAssociations
+and the mirror webhooks) against a MockHubSpot and a StubRAMAPI started in process, and
+reports wall time, HubSpot and RAM API calls per endpoint, 429 answers and the peak of
+Python memory allocated while it ran. Results can be saved as JSON and compared with
+the results of another commit.
+
+    $ python benchmarks/bench_e2e.py
+    $ python benchmarks/bench_e2e.py --characters 5000 --locations 500 --hubspot-latency 0.1 --output after.json --compare before.json
+    $ python benchmarks/bench_e2e.py --scenarios contacts associations --repeat 5 --rate-limit 0
+    $ python benchmarks/bench_e2e.py --scenarios associations associations-disk --characters 50000 --locations 5000 --rate-limit 0
+"""
+import argparse, collections, json, os, platform, statistics, subprocess, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_hubspot import MockHubSpot
+from benchmarks.stub_ramapi import StubRAMAPI, patch_ramapi
+
+SOURCE_KEY, MIRROR_KEY = 'bench-source', 'bench-mirror'
+SCENARIOS = ['contacts', 'companies', 'associations', 'associations-disk', 'mirror-contacts', 'mirror-companies']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--characters', type=int, default=826)
+    parser.add_argument('--locations', type=int, default=126)
+    parser.add_argument('--webhooks', type=int, default=32, help='webhooks per mirror scenario, half of them updates')
+    parser.add_argument('--ram-latency', type=float, default=0.05)
+    parser.add_argument('--hubspot-latency', type=float, default=0.05)
+    parser.add_argument('--rate-limit', type=int, default=100, help='HubSpot calls per token and window, 0 disables it')
+    parser.add_argument('--window', type=float, default=10.0)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--warm-cache', action='store_true', help='keep the RAM API cache between runs')
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    return parser.parse_args()
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Bench:
+    """
+    Runs the scenarios against the stand-ins, resetting the portal, the local mapping
+    index, the CRM snapshots and the RAM API cache before each run.
+    """
+    def __init__(self, args, mock, stub):
+        from app.views import requestRM
+        self.args, self.mock, self.stub = args, mock, stub
+        self.primes = [c for c in stub.characters if requestRM().isPrime(c['id'])]
+        self.location_ids = sorted({c['id'] % args.locations + 1 for c in self.primes})
+
+    def reset(self):
+        from app.models import ObjectMapping
+        from app.snapshot import snapshots
+        self.mock.reset()
+        ObjectMapping.objects.all().delete()
+        snapshots.invalidate()
+        if not self.args.warm_cache:
+            self.clear_cache()
+
+    def clear_cache(self):
+        import app.cache as ramcache
+        ramcache.get_cache().invalidate()
+
+    def seed(self, object_type, records):
+        with self.mock.lock:
+            for properties in records:
+                self.mock._record(object_type, properties)
+
+    def seed_contacts(self):
+        from app.serializers import CharacterSerializer
+        self.seed('contacts', CharacterSerializer.transform(self.primes))
+
+    def seed_companies(self):
+        from app.serializers import LocationSerializer
+        self.seed('companies', LocationSerializer.transform([self.stub.locations[i] for i in self.location_ids]))
+
+    def webhooks(self, path, payloads):
+        from django.test import Client
+        client, statuses = Client(), collections.Counter()
+        for payload in payloads:
+            response = client.post(path, payload, content_type='application/json', headers={'HubSpotSecret': SOURCE_KEY})
+            statuses[response.status_code] += 1
+        return {'status': dict(statuses)}
+
+    # Each scenario returns (setup, run, check); setup is not measured, check validates the portal after the run.
+
+    def contacts(self):
+        from app.views import requestContacts
+        run = lambda: {'status': requestContacts().migrate().status_code}
+        check = lambda: len(self.mock.objects['contacts']) == len(self.primes)
+        return None, run, check
+
+    def companies(self):
+        from app.views import requestContacts, requestCompanies
+        run = lambda: {'status': requestCompanies().migrate().status_code}
+        check = lambda: len(self.mock.objects['companies']) == len(self.location_ids) and len(self.mock.associations) == len(self.primes)
+        return lambda: requestContacts().migrate(), run, check
+
+    def associations(self):
+        from app.views import requestRM
+        def setup():
+            self.seed_contacts()
+            self.seed_companies()
+        run = lambda: {'failed': len(requestRM().makeAssociations(access_token=SOURCE_KEY))}
+        check = lambda: len(self.mock.associations) == len(self.primes)
+        return setup, run, check
+
+    def associations_disk(self):
+        from django.test import override_settings
+        setup, run, check = self.associations()
+        def on_disk():
+            with override_settings(ASSOCIATIONS_OUT_OF_CORE=True):
+                return run()
+        return setup, on_disk, check
+
+    def mirror_contacts(self):
+        from app.serializers import CharacterSerializer
+        characters = CharacterSerializer.transform(self.primes[:max(1, self.args.webhooks // 2)])
+        payloads = [characters[i % len(characters)] for i in range(self.args.webhooks)]
+        run = lambda: self.webhooks('/app/mirror-hubspot-contacts/', payloads)
+        check = lambda: len(self.mock.objects['contacts']) == len(characters)
+        return self.seed_companies, run, check
+
+    def mirror_companies(self):
+        from app.serializers import LocationSerializer
+        locations = LocationSerializer.transform([self.stub.locations[i] for i in self.location_ids[:max(1, self.args.webhooks // 2)]])
+        payloads = [locations[i % len(locations)] for i in range(self.args.webhooks)]
+        run = lambda: self.webhooks('/app/mirror-hubspot-companies/', payloads)
+        check = lambda: len(self.mock.objects['companies']) == len(locations)
+        return self.seed_contacts, run, check
+
+    def run(self, name):
+        setup, run, check = getattr(self, name.replace('-', '_'))()
+        self.reset()
+        if setup is not None:
+            setup()
+            if not self.args.warm_cache:
+                self.clear_cache()
+        self.mock.calls.clear()
+        self.mock.throttled = 0
+        self.stub.reset()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        outcome = run()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return dict(
+            outcome,
+            wall=elapsed,
+            hubspot_calls=dict(self.mock.calls),
+            ram_calls=dict(self.stub.calls),
+            throttled=self.mock.throttled,
+            peak_kib=peak // 1024,
+            ok=check(),
+        )
+
+
+def summarize(runs):
+    last = dict(runs[-1])
+    last['wall'] = statistics.median(run['wall'] for run in runs)
+    last['walls'] = [round(run['wall'], 4) for run in runs]
+    last['peak_kib'] = max(run['peak_kib'] for run in runs)
+    last['ok'] = all(run['ok'] for run in runs)
+    return last
+
+
+def report(results, previous=None):
+    print("{:<18} {:>9} {:>8} {:>6} {:>6} {:>10} {:>4}  {}".format('scenario', 'wall (s)', 'hubspot', 'ram', '429s', 'peak KiB', 'ok', 'calls'))
+    for name, result in results.items():
+        calls = ' '.join('{}={}'.format(k, v) for k, v in sorted(result['hubspot_calls'].items()))
+        print("{:<18} {:>9.2f} {:>8} {:>6} {:>6} {:>10} {:>4}  {}".format(
+            name, result['wall'], sum(result['hubspot_calls'].values()), sum(result['ram_calls'].values()),
+            result['throttled'], result['peak_kib'], 'yes' if result['ok'] else 'NO', calls))
+
+    if previous:
+        print("\ncompared with {} ({})".format(previous.get('commit') or 'previous run', previous.get('created', '')))
+        print("{:<18} {:>12} {:>12} {:>14} {:>12}".format('scenario', 'wall', 'hubspot', 'ram', 'peak KiB'))
+        for name, result in results.items():
+            before = previous['scenarios'].get(name)
+            if before is None:
+                continue
+            delta = lambda after, prior: '{:+.1f}%'.format((after - prior) / prior * 100) if prior else 'n/a'
+            print("{:<18} {:>12} {:>12} {:>14} {:>12}".format(
+                name,
+                delta(result['wall'], before['wall']),
+                delta(sum(result['hubspot_calls'].values()), sum(before['hubspot_calls'].values())),
+                delta(sum(result['ram_calls'].values()), sum(before['ram_calls'].values())),
+                delta(result['peak_kib'], before['peak_kib'])))
+
+
+def main():
+    args = parse_args()
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    mock = MockHubSpot(rate_limit=args.rate_limit, window=args.window, latency=args.hubspot_latency).start()
+    stub = StubRAMAPI(characters=args.characters, locations=args.locations, latency=args.ram_latency).start()
+    os.environ.update(
+        DJANGO_SETTINGS_MODULE='benchmarks.settings', HUBSPOT_API_HOST=mock.url,
+        HUBSOPT_SOURCE_KEY=SOURCE_KEY, HUBSOPT_MIRROR_KEY=MIRROR_KEY,
+        HUBSPOT_RATE_LIMIT=str(args.rate_limit or 1000000), HUBSPOT_RATE_PERIOD=str(args.window),
+    )
+    patch_ramapi(stub.base_url)
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+
+    bench = Bench(args, mock, stub)
+    results = {name: summarize([bench.run(name) for _ in range(args.repeat)]) for name in args.scenarios}
+    mock.stop()
+    stub.stop()
+
+    report(results, previous)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'commit': commit(),
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'python': platform.python_version(),
+                'parameters': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+                'scenarios': results,
+            }, f, indent=2)
+    if not all(result['ok'] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
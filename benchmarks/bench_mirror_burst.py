@@ -0,0 +1,99 @@
+"""
+Bursts of mirror webhooks against the sync DRF view and the async view.
+
+The views run in process (the async one through Django's ASGI handler) against a local
+mock HubSpot with a fixed latency per call. The sync view is driven one request at a
+time, like a sync gunicorn worker; the async view with growing concurrency.
+
+    $ python benchmarks/bench_mirror_burst.py
+    $ python benchmarks/bench_mirror_burst.py --requests 256 --concurrency 1 16 64 --latency 0.1
+"""
+import argparse, asyncio, os, statistics, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_hubspot import MockHubSpot
+
+mock = MockHubSpot().start()
+os.environ.update(DJANGO_SETTINGS_MODULE='benchmarks.settings', HUBSPOT_API_HOST=mock.url,
+                  HUBSOPT_SOURCE_KEY='bench-source', HUBSOPT_MIRROR_KEY='bench-mirror', HUBSPOT_POOL_MAXSIZE='64')
+
+import django
+django.setup()
+
+from django.core.management import call_command
+from django.test import AsyncClient, Client
+
+from app.models import ObjectMapping
+
+
+def payload(i, companies):
+    return {'character_id': i, 'firstname': 'Character', 'lastname': str(i), 'status_character': 'Alive',
+            'character_species': 'Human', 'character_gender': 'Male', 'location_id': i % companies + 1}
+
+
+def reset(companies):
+    mock.objects['contacts'].clear()
+    mock.objects['companies'].clear()
+    mock.associations.clear()
+    mock.calls.clear()
+    ObjectMapping.objects.all().delete()
+    for location in range(1, companies + 1):
+        mock._record('companies', {'location_id': str(location), 'name': 'Location {}'.format(location)})
+
+
+def run_sync(requests, companies):
+    client, latencies = Client(), []
+    start = time.perf_counter()
+    for i in range(requests):
+        began = time.perf_counter()
+        response = client.post('/app/mirror-hubspot-contacts/', payload(i, companies), content_type='application/json', headers={'HubSpotSecret': 'bench-source'})
+        assert response.status_code in (200, 201), response.content
+        latencies.append(time.perf_counter() - began)
+    return time.perf_counter() - start, latencies
+
+
+async def run_async(requests, companies, concurrency):
+    client, latencies, slots = AsyncClient(), [], asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with slots:
+            began = time.perf_counter()
+            response = await client.post('/app/async/mirror-hubspot-contacts/', payload(i, companies), content_type='application/json', headers={'HubSpotSecret': 'bench-source'})
+            assert response.status_code in (200, 201), response.content
+            latencies.append(time.perf_counter() - began)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=128)
+    parser.add_argument('--companies', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64])
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    mock.latency = args.latency
+
+    print("{:<8} {:>12} {:>9} {:>9} {:>10} {:>10}".format('view', 'concurrency', 'wall (s)', 'req/s', 'p50 (ms)', 'p95 (ms)'))
+
+    def report(name, concurrency, elapsed, latencies):
+        latencies = sorted(latencies)
+        print("{:<8} {:>12} {:>9.2f} {:>9.1f} {:>10.0f} {:>10.0f}".format(
+            name, concurrency, elapsed, len(latencies) / elapsed,
+            statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95) - 1] * 1000))
+
+    reset(args.companies)
+    report('sync', 1, *run_sync(args.requests, args.companies))
+    for concurrency in args.concurrency:
+        reset(args.companies)
+        report('async', concurrency, *asyncio.run(run_async(args.requests, args.companies, concurrency)))
+    mock.stop()
+
+
+if __name__ == '__main__':
+    main()
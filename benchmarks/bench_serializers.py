@@ -0,0 +1,42 @@
+"""
+Rows/sec of the serializer fast paths against the DRF serializers.
+
+Their parity is checked by the tests, see app/tests.py.
+
+    $ python benchmarks/bench_serializers.py
+    $ python benchmarks/bench_serializers.py --rows 200000
+"""
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+django.setup()
+
+from app.serializers import CharacterSerializer, LocationSerializer
+from benchmarks.stub_ramapi import synthetic_characters, synthetic_locations
+
+
+def rate(function, records):
+    start = time.perf_counter()
+    function(records)
+    return len(records) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    args = parser.parse_args()
+
+    characters = synthetic_characters(args.rows, 126)
+    locations = list(synthetic_locations(args.rows).values())
+    print("{:<20} {:>14} {:>14} {:>9}".format('serializer', 'drf rows/s', 'fast rows/s', 'speedup'))
+    for serializer_class, records in ((CharacterSerializer, characters), (LocationSerializer, locations)):
+        drf = rate(lambda batch: serializer_class(batch, many=True).data, records)
+        fast = rate(serializer_class.transform, records)
+        print("{:<20} {:>14,.0f} {:>14,.0f} {:>8.1f}x".format(serializer_class.__name__, drf, fast, fast / drf))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""
+Local stand-in for the HubSpot CRM API.
+
+Keeps contacts, companies and contact -> company associations in memory and enforces
+a rolling rate limit per access token, answering 429 with a Retry-After header like
+HubSpot does once the limit of the window is reached.
+"""
+import collections, json, math, re, threading, time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def now_iso():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+class MockHubSpot:
+    """
+    Threaded HTTP server with the HubSpot CRM endpoints used by the app.
+
+    :param rate_limit: Calls allowed per token and window, 0 disables the limit.
+    :param window: Length of the rolling window in seconds (HubSpot uses 10).
+    :param latency: Seconds added to every response.
+    :param input_latency: Seconds added per input of a batch call.
+
+    Batch creates holding a property value listed in `rejected` fail as a whole with 400,
+    like HubSpot does for an invalid value; batch updates and upserts leave such records out with a 207.
+    """
+    def __init__(self, rate_limit=0, window=10.0, latency=0.0, input_latency=0.0):
+        self.rate_limit = rate_limit
+        self.window = window
+        self.latency = latency
+        self.input_latency = input_latency
+        self.rejected = set()
+        self.lock = threading.Lock()
+        self.objects = {'contacts': {}, 'companies': {}}
+        self.associations = {}
+        self.next_id = 1000
+        self.calls = collections.Counter()
+        self.throttled = 0
+        self.history = collections.defaultdict(collections.deque)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                payload = json.dumps(body).encode() if body is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _dispatch(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'null') if length else None
+                token = (self.headers.get('Authorization') or '').replace('Bearer ', '')
+                time.sleep(mock.latency + mock.input_latency * len((body or {}).get('inputs', []) if isinstance(body, dict) else []))
+                wait = mock.throttle(token)
+                if wait:
+                    return self._send(429, {
+                        'status': 'error', 'message': 'You have reached your ten_secondly_rolling limit.',
+                        'errorType': 'RATE_LIMIT', 'policyName': 'TEN_SECONDLY_ROLLING',
+                    }, {'Retry-After': str(wait)})
+                status, data = mock.route(method, urlparse(self.path), body, token)
+                self._send(status, data)
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def do_PATCH(self):
+                self._dispatch('PATCH')
+
+            def do_PUT(self):
+                self._dispatch('PUT')
+
+        return Handler
+
+    def throttle(self, token):
+        """
+        Records a call of `token`, returns the seconds to wait when it is over the limit.
+        """
+        if not self.rate_limit:
+            return 0
+        with self.lock:
+            now, calls = time.monotonic(), self.history[token]
+            while calls and calls[0] <= now - self.window:
+                calls.popleft()
+            if len(calls) >= self.rate_limit:
+                self.throttled += 1
+                return max(1, math.ceil(calls[0] + self.window - now))
+            calls.append(now)
+            return 0
+
+    def _record(self, object_type, properties):
+        self.next_id += 1
+        stamp = now_iso()
+        record = {'id': str(self.next_id), 'properties': dict(properties, hs_object_id=str(self.next_id)),
+                  'createdAt': stamp, 'updatedAt': stamp, 'archived': False}
+        self.objects[object_type][record['id']] = record
+        return record
+
+    def _batch_response(self, results):
+        stamp = now_iso()
+        return {'status': 'COMPLETE', 'results': results, 'startedAt': stamp, 'completedAt': stamp}
+
+    def route(self, method, url, body, token):
+        path, query = url.path.rstrip('/'), parse_qs(url.query)
+
+        match = re.match(r'^/crm/v3/objects/(contacts|companies)/batch/create$', path)
+        if match and method == 'POST':
+            object_type = match.group(1)
+            with self.lock:
+                self.calls['batch/create'] += 1
+                invalid = [value for item in body['inputs'] for value in item.get('properties', {}).values() if str(value) in self.rejected]
+                if invalid:
+                    return 400, {'status': 'error', 'category': 'VALIDATION_ERROR', 'message': 'Property values were not valid: {}'.format(invalid[0])}
+                results = [self._record(object_type, item.get('properties', {})) for item in body['inputs']]
+            return 201, self._batch_response(results)
+
+        match = re.match(r'^/crm/v3/objects/(contacts|companies)/batch/upsert$', path)
+        if match and method == 'POST':
+            object_type, results, errors = match.group(1), [], []
+            with self.lock:
+                self.calls['batch/upsert'] += 1
+                for item in body['inputs']:
+                    if any(str(value) in self.rejected for value in item.get('properties', {}).values()):
+                        errors.append({'status': 'error', 'category': 'VALIDATION_ERROR', 'message': 'Property values were not valid', 'context': {'ids': [str(item['id'])]}})
+                        continue
+                    record = next((r for r in self.objects[object_type].values() if str(r['properties'].get(item['idProperty'])) == str(item['id'])), None)
+                    if record is None:
+                        record = dict(self._record(object_type, item.get('properties', {})), new=True)
+                    else:
+                        record['properties'].update(item.get('properties', {}))
+                        record['updatedAt'] = now_iso()
+                        record = dict(record, new=False)
+                    results.append(record)
+            if errors:
+                return 207, dict(self._batch_response(results), errors=errors, numErrors=len(errors))
+            return 200, self._batch_response(results)
+
+        match = re.match(r'^/crm/v3/objects/(contacts|companies)/batch/update$', path)
+        if match and method == 'POST':
+            with self.lock:
+                self.calls['batch/update'] += 1
+                results, errors = [], []
+                for item in body['inputs']:
+                    record = self.objects[match.group(1)].get(str(item['id']))
+                    if record is None:
+                        errors.append({'status': 'error', 'category': 'OBJECT_NOT_FOUND', 'message': 'Object not found', 'context': {'ids': [str(item['id'])]}})
+                        continue
+                    if any(str(value) in self.rejected for value in item.get('properties', {}).values()):
+                        errors.append({'status': 'error', 'category': 'VALIDATION_ERROR', 'message': 'Property values were not valid', 'context': {'ids': [str(item['id'])]}})
+                        continue
+                    record['properties'].update(item.get('properties', {}))
+                    record['updatedAt'] = now_iso()
+                    results.append(record)
+            data = self._batch_response(results)
+            if errors:
+                data.update(errors=errors, numErrors=len(errors))
+            return (207 if errors else 200), data
+
+        match = re.match(r'^/crm/v3/objects/(contacts|companies)$', path)
+        if match and method == 'GET':
+            object_type = match.group(1)
+            limit, after = int(query.get('limit', ['10'])[0]), int(query.get('after', ['0'])[0])
+            wanted = [name for value in query.get('properties', []) for name in value.split(',')]
+            with self.lock:
+                self.calls['get_page'] += 1
+                records = sorted(self.objects[object_type].values(), key=lambda r: int(r['id']))[after:after + limit]
+                results = [dict(r, properties={k: v for k, v in r['properties'].items() if k in wanted or k == 'hs_object_id'}) for r in records]
+                total = len(self.objects[object_type])
+            data = {'results': results}
+            if after + limit < total:
+                data['paging'] = {'next': {'after': str(after + limit), 'link': ''}}
+            return 200, data
+
+        match = re.match(r'^/crm/v4/associations/(contacts)/(companies)/batch/associate/default$', path)
+        if match and method == 'POST':
+            with self.lock:
+                self.calls['associate/default'] += 1
+                for item in body['inputs']:
+                    self.associations.setdefault(item['from']['id'], set()).add(item['to']['id'])
+            results = [{'fromObjectTypeId': '0-1', 'fromObjectId': int(i['from']['id']), 'toObjectTypeId': '0-2',
+                        'toObjectId': int(i['to']['id']), 'labels': []} for i in body['inputs']]
+            return 201, self._batch_response(results)
+
+        match = re.match(r'^/crm/v4/associations/(contacts)/(companies)/batch/read$', path)
+        if match and method == 'POST':
+            with self.lock:
+                self.calls['associations/read'] += 1
+                results, errors = [], []
+                for item in body['inputs']:
+                    companies = self.associations.get(str(item['id']))
+                    if not companies:
+                        errors.append({'status': 'error', 'category': 'OBJECT_NOT_FOUND', 'message': 'No contacts is associated with company {}'.format(item['id']), 'context': {'fromObjectId': [str(item['id'])]}})
+                        continue
+                    results.append({'from': {'id': str(item['id'])}, 'to': [
+                        {'toObjectId': int(company_id), 'associationTypes': [{'category': 'HUBSPOT_DEFINED', 'typeId': 279, 'label': None}]}
+                        for company_id in sorted(companies, key=int)
+                    ]})
+            data = self._batch_response(results)
+            if errors:
+                data.update(errors=errors, numErrors=len(errors))
+            return (207 if errors else 200), data
+
+        match = re.match(r'^/crm/v4/associations/(contacts)/(companies)/batch/archive$', path)
+        if match and method == 'POST':
+            with self.lock:
+                self.calls['associations/archive'] += 1
+                for item in body['inputs']:
+                    companies = self.associations.get(str(item['from']['id']), set())
+                    companies.difference_update(str(to['id']) for to in item['to'])
+            return 204, None
+
+        match = re.match(r'^/crm/v3/objects/(contacts|companies)/search$', path)
+        if match and method == 'POST':
+            return self.search(match.group(1), body)
+
+        match = re.match(r'^/crm/v3/objects/(contacts|companies)$', path)
+        if match and method == 'POST':
+            with self.lock:
+                self.calls['create'] += 1
+                return 201, self._record(match.group(1), body.get('properties', {}))
+
+        match = re.match(r'^/crm/v3/objects/(contacts|companies)/(\d+)$', path)
+        if match and method == 'PATCH':
+            with self.lock:
+                self.calls['update'] += 1
+                record = self.objects[match.group(1)].get(match.group(2))
+                if record is None:
+                    return 404, {'status': 'error', 'message': 'Object not found', 'category': 'OBJECT_NOT_FOUND'}
+                record['properties'].update(body.get('properties', {}))
+                record['updatedAt'] = now_iso()
+                return 200, record
+
+        match = re.match(r'^/crm/v4/objects/contacts/(\d+)/associations/default/companies/(\d+)$', path)
+        if match and method == 'PUT':
+            with self.lock:
+                self.calls['associate/single'] += 1
+                self.associations.setdefault(match.group(1), set()).add(match.group(2))
+            return 200, self._batch_response([{'associationSpec': {'associationCategory': 'HUBSPOT_DEFINED', 'associationTypeId': 279}}])
+
+        return 404, {'status': 'error', 'message': 'Not found: {} {}'.format(method, path), 'category': 'OBJECT_NOT_FOUND'}
+
+    def search(self, object_type, body):
+        def matches(record, item):
+            value = record['properties'].get(item['propertyName'])
+            if item['propertyName'] in ('lastmodifieddate', 'hs_lastmodifieddate'):
+                value = datetime.strptime(record['updatedAt'], '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc).timestamp() * 1000
+            if value in (None, ''):
+                return False
+            if item['operator'] == 'EQ':
+                return str(value) == str(item['value'])
+            if item['operator'] == 'GTE':
+                return float(value) >= float(item['value'])
+            raise ValueError(item['operator'])
+
+        with self.lock:
+            self.calls['search'] += 1
+            groups = body.get('filterGroups') or [{'filters': []}]
+            found = [
+                record for record in self.objects[object_type].values()
+                if any(all(matches(record, item) for item in group['filters']) for group in groups)
+            ]
+        found.sort(key=lambda r: int(r['id']))
+        after, limit = int(body.get('after') or 0), int(body.get('limit') or 10)
+        wanted = set(body.get('properties') or []) | {'hs_object_id'}
+        page = [dict(r, properties={k: v for k, v in r['properties'].items() if k in wanted}) for r in found[after:after + limit]]
+        data = {'total': len(found), 'results': page}
+        if after + limit < len(found):
+            data['paging'] = {'next': {'after': str(after + limit), 'link': ''}}
+        return 200, data
+
+    def reset(self):
+        """
+        Empties the portal and the counters, keeping the server running.
+        """
+        with self.lock:
+            for records in self.objects.values():
+                records.clear()
+            self.associations.clear()
+            self.calls.clear()
+            self.history.clear()
+            self.throttled = 0
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
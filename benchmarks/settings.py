@@ -0,0 +1,20 @@
+"""
+Settings for the benchmarks, core.settings with a throwaway database and cache.
+"""
+import os, tempfile
+
+from core.settings import *
+
+BENCH_DIR = os.path.join(tempfile.gettempdir(), 'hubspot-bench')
+os.makedirs(BENCH_DIR, exist_ok=True)
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BENCH_DIR, 'db.sqlite3'),
+        'OPTIONS': {'timeout': 30},
+    }
+}
+
+RAMAPI_CACHE_PATH = os.path.join(BENCH_DIR, 'ramapi_cache.sqlite3')
+LOGGING['handlers']['core']['filename'] = LOG_FILE = os.path.join(BENCH_DIR, 'core.log')
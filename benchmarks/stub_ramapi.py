@@ -0,0 +1,140 @@
+"""
+Local stand-in for the Rick & Morty API.
+
+Serves /api/character/?page=N and /api/location/<id or [ids]> from a synthetic dataset
+with a configurable per-request latency and failure rate.
+"""
+import collections, json, random, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+PAGE_SIZE = 20
+
+
+def synthetic_characters(count, locations):
+    return [
+        {
+            'id': i,
+            'name': 'Character {} Smith'.format(i),
+            'status': random.Random(i).choice(['Alive', 'Dead', 'unknown']),
+            'species': 'Human',
+            'gender': 'Male' if i % 2 else 'Female',
+            'location': {'name': 'Location {}'.format(i % locations + 1), 'url': '/api/location/{}'.format(i % locations + 1)},
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def synthetic_locations(count):
+    return {
+        i: {'id': i, 'name': 'Location {}'.format(i), 'type': 'Planet', 'dimension': 'C-137', 'created': '2017-11-10T12:42:04.162Z'}
+        for i in range(1, count + 1)
+    }
+
+
+class StubRAMAPI:
+    """
+    Threaded HTTP server with the RAM API character and location endpoints.
+
+    :param characters: Number of characters in the dataset.
+    :param locations: Number of locations in the dataset.
+    :param latency: Seconds added to every response.
+    :param failure_rate: Fraction of requests answered with a 500.
+    """
+    def __init__(self, characters=826, locations=126, latency=0.05, failure_rate=0.0, seed=0):
+        self.characters = synthetic_characters(characters, locations)
+        self.locations = synthetic_locations(locations)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:{}/api/'.format(self.server.server_address[1])
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                    stub.calls['location' if '/location' in self.path else 'character'] += 1
+                    fail = stub.random.random() < stub.failure_rate
+                time.sleep(stub.latency)
+                status, body = (500, {'error': 'stub failure'}) if fail else stub.route(self.path)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+    def route(self, path):
+        url = urlparse(path)
+        if url.path.rstrip('/') == '/api/character':
+            page = int(parse_qs(url.query).get('page', ['1'])[0])
+            pages = (len(self.characters) + PAGE_SIZE - 1) // PAGE_SIZE
+            if not 1 <= page <= pages:
+                return 404, {'error': 'There is nothing here'}
+            base = self.base_url + 'character/?page={}'
+            return 200, {
+                'info': {
+                    'count': len(self.characters),
+                    'pages': pages,
+                    'next': base.format(page + 1) if page < pages else None,
+                    'prev': base.format(page - 1) if page > 1 else None,
+                },
+                'results': self.characters[(page - 1) * PAGE_SIZE:page * PAGE_SIZE],
+            }
+        match = re.match(r'^/api/location/(.+)$', unquote(url.path))
+        if match:
+            ids = [int(i) for i in re.findall(r'\d+', match.group(1))]
+            found = [self.locations[i] for i in ids if i in self.locations]
+            return 200, found if '[' in match.group(1) else (found[0] if found else {})
+        return 404, {'error': 'There is nothing here'}
+
+    def reset(self):
+        """
+        Resets the request counters.
+        """
+        with self.lock:
+            self.requests = 0
+            self.calls.clear()
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def patch_ramapi(base_url):
+    """
+    Points the ramapi package at another base url, returns the previous one.
+    """
+    import ramapi.ramapi as module
+    previous = module.base_url
+    module.base_url = base_url
+    module.character_url = base_url + 'character/'
+    module.location_url = base_url + 'location/'
+    module.episode_url = base_url + 'episode/'
+    return previous
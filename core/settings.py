@@ -34,6 +34,77 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 HUBSOPT_SOURCE_KEY = os.getenv('HUBSOPT_SOURCE_KEY')
 HUBSOPT_MIRROR_KEY = os.getenv('HUBSOPT_MIRROR_KEY')
 
+# RAM API crawl, pages fetched at once and retries per page (1 worker = sequential).
+RAMAPI_FETCH_WORKERS = int(os.getenv('RAMAPI_FETCH_WORKERS', 8))
+RAMAPI_FETCH_RETRIES = int(os.getenv('RAMAPI_FETCH_RETRIES', 3))
+
+# RAM API local cache, TTL in seconds (0 disables it) and maximum number of entries.
+RAMAPI_CACHE_PATH = os.getenv('RAMAPI_CACHE_PATH', BASE_DIR / 'ramapi_cache.sqlite3')
+RAMAPI_CACHE_TTL = int(os.getenv('RAMAPI_CACHE_TTL', 86400))
+RAMAPI_CACHE_MAX_ENTRIES = int(os.getenv('RAMAPI_CACHE_MAX_ENTRIES', 10000))
+
+# HubSpot batch inputs (API maximum 100) and batches buffered on top of the ones uploading.
+HUBSPOT_BATCH_SIZE = int(os.getenv('HUBSPOT_BATCH_SIZE', 100))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 2))
+
+# HubSpot keep-alive connections per host and token, shared by every thread.
+HUBSPOT_POOL_MAXSIZE = int(os.getenv('HUBSPOT_POOL_MAXSIZE', 10))
+HUBSPOT_API_HOST = os.getenv('HUBSPOT_API_HOST')
+
+# HubSpot batch uploads, calls allowed per period (seconds) and token, concurrency and retries.
+HUBSPOT_RATE_LIMIT = int(os.getenv('HUBSPOT_RATE_LIMIT', 100))
+HUBSPOT_RATE_PERIOD = float(os.getenv('HUBSPOT_RATE_PERIOD', 10))
+HUBSPOT_UPLOAD_WORKERS = int(os.getenv('HUBSPOT_UPLOAD_WORKERS', 4))
+HUBSPOT_UPLOAD_RETRIES = int(os.getenv('HUBSPOT_UPLOAD_RETRIES', 5))
+
+# Batch writes adapt their size per endpoint (HUBSPOT_BATCH_SIZE at most) to keep calls under the target seconds and payloads under the max bytes.
+HUBSPOT_ADAPTIVE_BATCHES = os.getenv('HUBSPOT_ADAPTIVE_BATCHES', '1') not in ('0', 'false', 'False')
+HUBSPOT_BATCH_TARGET_SECONDS = float(os.getenv('HUBSPOT_BATCH_TARGET_SECONDS', 5))
+HUBSPOT_BATCH_MAX_BYTES = int(os.getenv('HUBSPOT_BATCH_MAX_BYTES', 1000000))
+
+# Mirror webhooks create or update through batch upsert keyed on character_id / location_id (needs both properties with unique values), 0 searches first.
+HUBSPOT_MIRROR_UPSERT = os.getenv('HUBSPOT_MIRROR_UPSERT', '1') not in ('0', 'false', 'False')
+
+# Webhook ingestion (app/webhooks.py), events mirrored per batch, seconds between flushes and before the claim of a batch is taken over, failed flushes before an event is dead-lettered.
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', 100))
+WEBHOOK_FLUSH_INTERVAL = float(os.getenv('WEBHOOK_FLUSH_INTERVAL', 2))
+WEBHOOK_CLAIM_TIMEOUT = int(os.getenv('WEBHOOK_CLAIM_TIMEOUT', 300))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', 5))
+
+# CRM snapshots read by the association runs (app/snapshot.py), seconds between full reads (0 disables them), records kept per process and seconds searched again before the watermark.
+HUBSPOT_SNAPSHOT_TTL = int(os.getenv('HUBSPOT_SNAPSHOT_TTL', 3600))
+HUBSPOT_SNAPSHOT_MAX_RECORDS = int(os.getenv('HUBSPOT_SNAPSHOT_MAX_RECORDS', 200000))
+HUBSPOT_SNAPSHOT_OVERLAP = int(os.getenv('HUBSPOT_SNAPSHOT_OVERLAP', 60))
+
+# Background jobs, seconds without heartbeat before a running job is taken over by another worker.
+JOBS_STALE_AFTER = int(os.getenv('JOBS_STALE_AFTER', 900))
+
+# Migrations and delta syncs, seconds a silent run keeps the lock of its object type.
+MIGRATION_LOCK_TIMEOUT = int(os.getenv('MIGRATION_LOCK_TIMEOUT', 900))
+
+# Association runs, quiet seconds before a scheduled run starts, latest start after the first request and seconds a silent run keeps its portal lock.
+ASSOCIATIONS_DEBOUNCE = float(os.getenv('ASSOCIATIONS_DEBOUNCE', 30))
+ASSOCIATIONS_MAX_DELAY = float(os.getenv('ASSOCIATIONS_MAX_DELAY', 300))
+ASSOCIATIONS_LOCK_TIMEOUT = int(os.getenv('ASSOCIATIONS_LOCK_TIMEOUT', 900))
+# Read the existing associations and only create the missing ones and archive the stale ones, 0 posts every pair.
+ASSOCIATIONS_DIFF = os.getenv('ASSOCIATIONS_DIFF', '1') not in ('0', 'false', 'False')
+# Join on disk in constant memory (app/spill.py) for portals that do not fit in memory, and directory of its temporary files (system default when empty).
+ASSOCIATIONS_OUT_OF_CORE = os.getenv('ASSOCIATIONS_OUT_OF_CORE', '0') not in ('0', 'false', 'False')
+ASSOCIATIONS_SPILL_DIR = os.getenv('ASSOCIATIONS_SPILL_DIR', '')
+
+# Metrics (app/metrics.py), seconds between the snapshots of a process and before the snapshot of a dead one is dropped.
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 15))
+METRICS_RETENTION = int(os.getenv('METRICS_RETENTION', 86400))
+
+# Log file of the app (app/logs.py), rotated at LOG_MAX_BYTES keeping LOG_BACKUP_COUNT files, at most LOG_QUEUE_SIZE records waiting in memory.
+LOG_FILE = os.getenv('LOG_FILE', os.path.join(BASE_DIR, 'logs', 'core.log'))
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 5242880))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+# Async views (app/async_views.py), threads running the blocking HubSpot and ORM calls.
+ASYNC_IO_WORKERS = int(os.getenv('ASYNC_IO_WORKERS', 32))
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG=False
 
@@ -73,7 +144,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "app.middleware.WhiteNoiseMiddleware",
 ]
 
 
@@ -98,15 +169,35 @@ TEMPLATES = [
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'app.logs.JsonFormatter',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        'core': {
+            'class': 'app.logs.QueueFileHandler',
+            'formatter': 'json',
+            'filename': LOG_FILE,
+            'max_bytes': LOG_MAX_BYTES,
+            'backup_count': LOG_BACKUP_COUNT,
+            'capacity': LOG_QUEUE_SIZE,
+        },
     },
     'root': {
         'handlers': ['console'],
         'level': 'INFO',
     },
+    'loggers': {
+        'app': {
+            'handlers': ['core'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 WSGI_APPLICATION = "core.wsgi.application"
@@ -116,11 +207,16 @@ WSGI_APPLICATION = "core.wsgi.application"
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
 
+# The web, worker and release processes share the database given by DATABASE_URL (Heroku Postgres);
+# the local SQLite file is only for runs on a single machine.
+import dj_database_url
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': dj_database_url.config(
+        default='sqlite:///{}'.format(BASE_DIR / 'db.sqlite3'),
+        conn_max_age=int(os.getenv('DATABASE_CONN_MAX_AGE', 60)),
+        conn_health_checks=True,
+    )
 }
 
 